@@ -5,5 +5,9 @@ source /mower/telemetry/install/setup.bash
 export ROS_DISCOVERY_SERVER=localhost:11811
 export ROS2_DOMAIN_ID=142
 #ros2 topic echo top_nmea
+# collector.py logs the NMEA streams instead when MOWER_NMEA_COLLECTOR is set, so don't log them twice
+if [ -n "$MOWER_NMEA_COLLECTOR" ]; then
+    exec sleep infinity
+fi
 ros2 run telemetry nmea_logger
 
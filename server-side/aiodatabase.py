@@ -0,0 +1,296 @@
+import datetime
+import database
+import asyncio
+import secrets
+import aiomysql
+import models
+import os
+
+async def create_pool(host = "db", user = "root", passwd = None, db = "mower", port = 3306, size = 10, recycle = 3600):
+    """Creates the ``aiomysql`` connection pool used by :class:`AsyncMowerDatabase`. Its size is
+    what limits how many requests the async API serves at once. The database is built and
+    upgraded first with :meth:`database.MowerDatabase.connect`, if needed, in a thread so it
+    doesn't hold up the event loop.
+
+    Arguments:
+        host (str): The database host
+        user (str): The database user
+        passwd (str): The database password, defaults to the ``MYSQL_ROOT_PASSWORD`` environment variable
+        db (str): The database name
+        port (int): The database port
+        size (int): The maximum number of open connections
+        recycle (int): Maximum age of a connection in seconds before it is replaced
+
+    Returns:
+        aiomysql.Pool: A connection pool
+    """
+    if passwd is None:
+        passwd = os.environ["MYSQL_ROOT_PASSWORD"]
+    # blocking, and can take a while if there are upgrades to do
+    await asyncio.to_thread(lambda: database.MowerDatabase(host = host, user = user, passwd = passwd, db = db, port = port).connect().close())
+
+    return await aiomysql.create_pool(
+        host = host,
+        port = port,
+        user = user,
+        password = passwd,
+        db = db,
+        charset = "utf8mb4",
+        minsize = 1,
+        maxsize = size,
+        pool_recycle = recycle
+    )
+
+class AsyncMowerDatabase:
+    """The parts of :class:`database.MowerDatabase` which the API needs, using the ``aiomysql``
+    async driver so that waiting on the database doesn't hold up a thread. Methods do the
+    same queries as their :class:`database.MowerDatabase` counterparts. Expected to be used with
+    an ``async with`` block, which checks a connection out of the pool:
+
+    .. code-block:: python
+
+        pool = await aiodatabase.create_pool(host = "db")
+        async with aiodatabase.AsyncMowerDatabase(pool) as db:
+            user, expire_at = await db.get_session(session_id)
+
+    Arguments:
+        pool (aiomysql.Pool): A pool from :func:`create_pool`
+        coord_storage (str): ``"rows"`` or ``"blob"``, see :class:`database.MowerDatabase`
+    """
+    def __init__(self, pool, coord_storage = "rows"):
+        if coord_storage not in database.COORD_STORAGE_MODES:
+            raise ValueError("coord_storage must be one of %s" % ", ".join(database.COORD_STORAGE_MODES))
+        self.pool = pool
+        self.coord_storage = coord_storage
+
+    async def __aenter__(self):
+        self.__connection = await self.pool.acquire()
+        return self
+
+    async def __aexit__(self, type, value, traceback):
+        try:
+            # aiomysql closes connections given back mid-transaction, rather than reusing them
+            if not isinstance(value, database.CONNECTION_ERRORS) and self.__connection.get_transaction_status():
+                await self.__connection.rollback()
+        finally:
+            self.pool.release(self.__connection)
+
+    async def create_user(self, email, fname, sname, pw_hashed):
+        """See :meth:`database.MowerDatabase.create_user`."""
+        async with self.__connection.cursor() as cursor:
+            await cursor.execute("""
+            INSERT INTO users (email, fname, sname, pw_hash)
+            VALUES (%s, %s, %s, %s);
+            """, (email, fname, sname, pw_hashed, ))
+            user_no = cursor.lastrowid
+        await self.__connection.commit()
+
+        return await self.create_session(user_no)
+
+    async def get_password_hash(self, email):
+        """See :meth:`database.MowerDatabase.get_password_hash`."""
+        async with self.__connection.cursor() as cursor:
+            await cursor.execute("SELECT user_no, pw_hash FROM users WHERE email = %s;", (email, ))
+            row = await cursor.fetchone()
+            if row is None:
+                raise database.UnauthenticatedUserException("User not found, or incorrect password")
+
+        return int(row[0]), row[1]
+
+    async def set_password_hash(self, user_no, pw_hashed):
+        """See :meth:`database.MowerDatabase.set_password_hash`."""
+        async with self.__connection.cursor() as cursor:
+            await cursor.execute("UPDATE users SET pw_hash = %s WHERE user_no = %s;", (pw_hashed, user_no))
+        await self.__connection.commit()
+
+    async def create_session(self, user_no, client_info = 'API Client'):
+        """See :meth:`database.MowerDatabase.create_session`."""
+        session_id = secrets.token_hex(16)
+        expiration_dt = datetime.datetime.now() + database.SESSION_LENGTH
+        async with self.__connection.cursor() as cursor:
+            await cursor.execute("INSERT INTO sessions (cookie_bytes, user_no, expire_at, client_info) VALUES (%s, %s, %s, %s);",
+                (session_id, user_no, expiration_dt, client_info),
+            )
+
+        await self.__connection.commit()
+        return session_id, expiration_dt
+
+    async def get_session(self, session_id):
+        """See :meth:`database.MowerDatabase.get_session`."""
+        async with self.__connection.cursor() as cursor:
+            await cursor.execute("""
+            SELECT users.user_no, email, fname, sname, expire_at FROM users
+            INNER JOIN sessions ON sessions.user_no = users.user_no
+            WHERE cookie_bytes = %s AND expire_at > NOW();
+            """, (session_id, ))
+            row = await cursor.fetchone()
+            if row is None:
+                raise database.InvalidSessionException("The session id '%s' was not found in the database." % session_id)
+
+        id_, email, fname, sname, expire_at = row
+        return models.User(id_, email, fname, sname), expire_at
+
+    async def revoke_session(self, session_id):
+        """See :meth:`database.MowerDatabase.revoke_session`."""
+        async with self.__connection.cursor() as cursor:
+            await cursor.execute("DELETE FROM sessions WHERE cookie_bytes = %s;", (session_id, ))
+        await self.__connection.commit()
+
+    async def create_area(self, area: models.Area):
+        """See :meth:`database.MowerDatabase.create_area`."""
+        try:
+            async with self.__connection.cursor() as cursor:
+                await cursor.execute(database.AUTOINC_STEP_SQL)
+                id_step = database.autoinc_step_of(*await cursor.fetchone())
+
+                await cursor.execute(database.INSERT_AREA_SQL, database.area_row(area))
+                area_id = cursor.lastrowid
+                await cursor.execute(database.BUMP_AREA_VERSION_SQL, (area.owner.id_, ))
+                await cursor.execute(database.SELECT_AREA_VERSION_SQL, (area.owner.id_, ))
+                version = int((await cursor.fetchone())[0])
+
+                nogo_ids = await bulk_insert(cursor, database.INSERT_NOGO_ZONES_SQL, database.nogo_zone_rows(area_id, area), id_step)
+                if self.coord_storage == "blob":
+                    inserts = database.geometry_inserts(area_id, area, nogo_ids)
+                else:
+                    coord_ids = await bulk_insert(cursor, database.INSERT_COORDS_SQL, database.coord_rows(area), id_step)
+                    inserts = database.coord_link_inserts(area_id, area, nogo_ids, coord_ids)
+                for statement, rows in inserts:
+                    await bulk_insert(cursor, statement, rows)
+        except:
+            await self.__connection.rollback()
+            raise
+
+        await self.__connection.commit()
+        area.id_ = area_id
+        return version
+
+    async def get_area_version(self, user: models.User):
+        """See :meth:`database.MowerDatabase.get_area_version`."""
+        async with self.__connection.cursor() as cursor:
+            await cursor.execute(database.AREA_VERSION_SQL, (user.id_, ))
+            row = await cursor.fetchone()
+        return database.area_version_of(row)
+
+    async def get_areas(self, user: models.User):
+        """See :meth:`database.MowerDatabase.get_areas`."""
+        async with self.__connection.cursor() as cursor:
+            await cursor.execute("SELECT area_id, area_name, area_notes FROM mower_areas WHERE user_no = %s ORDER BY area_id;", (user.id_, ))
+            area_rows = await cursor.fetchall()
+            area_coords, nogo_zones = await self.__get_coords(
+                cursor, "mower_areas.user_no = %s", (user.id_, ), [area_id for area_id, _, _ in area_rows]
+            )
+
+        return [
+            models.Area(user, area_name, area_notes, area_coords.get(area_id, []), list(nogo_zones.get(area_id, {}).values()), area_id)
+            for area_id, area_name, area_notes in area_rows
+        ]
+
+    async def get_area(self, user: models.User, area_id):
+        """See :meth:`database.MowerDatabase.get_area`."""
+        async with self.__connection.cursor() as cursor:
+            await cursor.execute(
+                "SELECT area_name, area_notes FROM mower_areas WHERE area_id = %s AND user_no = %s;", (area_id, user.id_)
+            )
+            row = await cursor.fetchone()
+            if row is None:
+                raise database.AreaNotFoundException("Area %s was not found" % area_id)
+            area_coords, nogo_zones = await self.__get_coords(cursor, "mower_areas.area_id = %s", (area_id, ), [area_id])
+
+        return models.Area(user, row[0], row[1], area_coords.get(area_id, []), list(nogo_zones.get(area_id, {}).values()), area_id)
+
+    async def list_areas(self, user: models.User, after = None, limit = 100):
+        """See :meth:`database.MowerDatabase.list_areas`."""
+        limit = max(1, min(limit, database.MAX_LIST_AREAS))
+        async with self.__connection.cursor() as cursor:
+            await cursor.execute("""
+            SELECT area_id, area_name, area_notes, vertex_count, nogo_count, min_x, min_z, max_x, max_z
+            FROM mower_areas WHERE user_no = %s AND area_id > %s
+            ORDER BY area_id LIMIT %s;
+            """, (user.id_, -1 if after is None else after, limit + 1))
+            rows = list(await cursor.fetchall())
+
+        more = len(rows) > limit
+        rows = rows[:limit]
+        missing = [row[0] for row in rows if row[3] is None]
+        if missing:
+            summaries = await self.__fill_area_summaries(missing)
+            rows = [row[:3] + summaries[row[0]] if row[0] in summaries else row for row in rows]
+
+        return [
+            models.AreaSummary(area_id, area_name, area_notes, vertex_count, nogo_count, None if min_x is None else [min_x, min_z, max_x, max_z])
+            for area_id, area_name, area_notes, vertex_count, nogo_count, min_x, min_z, max_x, max_z in rows
+        ], rows[-1][0] if more else None
+
+    async def get_mower(self, user: models.User, iqn: str):
+        """See :meth:`database.MowerDatabase.get_mower`."""
+        async with self.__connection.cursor() as cursor:
+            await cursor.execute("SELECT 1 FROM mowers WHERE iqn = %s AND owner = %s;", (iqn, user.id_))
+            if await cursor.fetchone() is None:
+                raise database.MowerNotFoundException("Mower '%s' was not found" % iqn)
+
+    async def get_telemetry(self, iqn: str, start, end, bucket_seconds = 0):
+        """Like :meth:`database.MowerDatabase.iter_telemetry`, but returns a list. Only use with
+        a ``bucket_seconds`` which bounds how many fixes there can be, see :func:`tracks.bucket_seconds`."""
+        fixes = []
+        async with self.__connection.cursor() as cursor:
+            for query, args in database.telemetry_queries(iqn, start, end, bucket_seconds):
+                await cursor.execute(query, args)
+                fixes.extend(await cursor.fetchall())
+        return fixes
+
+    async def __fill_area_summaries(self, area_ids):
+        try:
+            async with self.__connection.cursor() as cursor:
+                area_coords, nogo_zones = await self.__get_coords(cursor, "mower_areas.area_id IN %s", (area_ids, ), area_ids)
+                summaries = {
+                    area_id: database.area_summary(area_coords.get(area_id, []), list(nogo_zones.get(area_id, {}).values()))
+                    for area_id in area_ids
+                }
+                for area_id, summary in summaries.items():
+                    await cursor.execute("""
+                    UPDATE mower_areas SET vertex_count = %s, nogo_count = %s, min_x = %s, min_z = %s, max_x = %s, max_z = %s
+                    WHERE area_id = %s;
+                    """, summary + (area_id, ))
+        except:
+            await self.__connection.rollback()
+            raise
+        await self.__connection.commit()
+        return summaries
+
+    async def __get_coords(self, cursor, where, args, area_ids):
+        if self.coord_storage != "blob":
+            return await self.__query_coords(
+                cursor, database.AREA_COORD_ROWS_SQL, database.NOGO_COORD_ROWS_SQL, database.group_coord_rows, where, args
+            )
+
+        area_coords, nogo_zones = await self.__query_coords(
+            cursor, database.AREA_COORD_BLOBS_SQL, database.NOGO_COORD_BLOBS_SQL, database.group_coord_blobs, where, args
+        )
+        unmigrated = [area_id for area_id in area_ids if area_id not in area_coords]
+        if unmigrated:
+            old_area_coords, old_nogo_zones = await self.__query_coords(
+                cursor, database.AREA_COORD_ROWS_SQL, database.NOGO_COORD_ROWS_SQL,
+                database.group_coord_rows, "mower_areas.area_id IN %s", (unmigrated, )
+            )
+            area_coords.update(old_area_coords)
+            nogo_zones.update(old_nogo_zones)
+        return area_coords, nogo_zones
+
+    async def __query_coords(self, cursor, area_sql, nogo_sql, group, where, args):
+        await cursor.execute(area_sql % where, args)
+        area_rows = await cursor.fetchall()
+        await cursor.execute(nogo_sql % where, args)
+        return group(area_rows, await cursor.fetchall())
+
+async def bulk_insert(cursor, statement, rows, id_step = None, chunk_size = database.BULK_INSERT_ROWS):
+    """The async version of :func:`database.bulk_insert`."""
+    if id_step == 0:
+        chunk_size, id_step = 1, 1
+
+    ids = []
+    for query, args, count in database.multirow_statements(statement, rows, chunk_size):
+        await cursor.execute(query, args)
+        if id_step is not None:
+            ids.extend(range(cursor.lastrowid, cursor.lastrowid + count * id_step, id_step))
+    return ids
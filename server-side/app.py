@@ -1,32 +1,75 @@
 from paste.translogger import TransLogger
+import endpoints
 import database
 import waitress
-import hashlib
+import wireformat
+import tracks
+import passwords
+import sessions
+import retention
+import datetime
 import models
 import flask
+import json
 import sys
 import os
 
 app = flask.Flask(__name__)
-if not os.path.exists(".docker"):
-    print("Not in docker... Using external database server...")
-    import dotenv
-    dotenv.load_dotenv(dotenv_path = os.path.join("..", "db.env"))
-    db_host = "192.168.1.5"
-else:
-    db_host = "db"
+db_host = endpoints.database_host()
 
-def hash_pw(pw):
-    return hashlib.sha256(pw.encode()).hexdigest()
+# the pool is sized to the number of waitress threads so a request never waits on a connection,
+# plus one for each background thread: the session sweeper and telemetry retention
+WAITRESS_THREADS = 4
+db_pool = database.ConnectionPool(size = WAITRESS_THREADS + 2, host = db_host)
+
+# this process's own, so sessions revoked through asgi_app are only dropped from it after its ttl
+session_cache = endpoints.session_cache()
+area_simplifier = endpoints.simplification_cache()
+area_indexes = endpoints.area_index_cache()
+TRACK_CHUNK_POINTS = 500
+
+# "rows" or "blob", see database.MowerDatabase
+coord_storage = database.coord_storage_from_env()
+
+def get_db():
+    return database.MowerDatabase(host = db_host, pool = db_pool, coord_storage = coord_storage)
+
+session_sweeper = sessions.SessionSweeper(get_db)
+session_sweeper.start()
+
+# keep every telemetry fix for MOWER_TELEMETRY_RAW_DAYS, and a fix a minute for MOWER_TELEMETRY_ROLLUP_DAYS, or forever if unset
+telemetry_retention = retention.TelemetryRetention(
+    get_db,
+    raw_days = int(os.environ.get("MOWER_TELEMETRY_RAW_DAYS", 90)),
+    rollup_days = int(os.environ["MOWER_TELEMETRY_ROLLUP_DAYS"]) if os.environ.get("MOWER_TELEMETRY_ROLLUP_DAYS") else None
+)
+telemetry_retention.start()
+
+# at most MOWER_PW_WORKERS + MOWER_PW_QUEUE waitress threads are ever waiting on a password hash,
+# so keep it below WAITRESS_THREADS to leave threads for the other endpoints during signin bursts
+password_hasher = endpoints.password_hasher()
 
 def authenticate():
-    if flask.request.cookies.get("session") is None:
+    session_id = flask.request.cookies.get("session")
+    if session_id is None:
         return flask.abort(401)
-    with database.MowerDatabase(host = db_host) as db:
+
+    user = session_cache.get(session_id)
+    if user is not None:
+        return user
+
+    with get_db() as db:
         try:
-            return db.authenticate_session(flask.request.cookies.get("session"))
+            user, expire_at = db.get_session(session_id)
         except database.InvalidSessionException as e:
             return flask.abort(401)
+    session_cache.put(session_id, user, expire_at)
+    return user
+
+@app.errorhandler(database.PoolExhaustedException)
+@app.errorhandler(passwords.PasswordHasherBusyException)
+def server_busy(e):
+    return flask.jsonify({"error": str(e)}), 503
 
 @app.route("/api/signin", methods = ["POST"])
 def signin():
@@ -44,7 +87,9 @@ def signin():
     Signin api endpoint. POST request at ``/api/signin``, must be a
     JSON object with exactly the keys ``'pass', 'sname', 'fname', 'email'``.
     Returns a session cookie which can be used for subsequent requests.
-    The password is unhashed at this stage.
+    The password is unhashed at this stage. It is checked with :class:`passwords.PasswordHasher`,
+    and if it was stored with an old style hash that is upgraded. Returns 503 if too many
+    passwords are already being hashed.
 
     Example curl request:
 
@@ -66,12 +111,22 @@ def signin():
     if set(req.keys()) != {'pass', 'sname', 'fname', 'email'}:
         return flask.abort(400, "The JSON keys {'pass', 'sname', 'fname', 'email'} are required")
 
-    with database.MowerDatabase(host = db_host) as db:
+    with get_db() as db:
         try:
-            session_id, expires_at = db.authenticate_user(req["email"], hash_pw(req["pass"]))
+            user_no, pw_hash = db.get_password_hash(req["email"])
         except database.UnauthenticatedUserException as e:
             return flask.abort(401)
 
+    # don't hold a database connection while the password is hashed
+    ok, new_hash = password_hasher.verify(req["pass"], pw_hash)
+    if not ok:
+        return flask.abort(401)
+
+    with get_db() as db:
+        if new_hash is not None:
+            db.set_password_hash(user_no, new_hash)
+        session_id, expires_at = db.create_session(user_no)
+
     resp = flask.make_response(flask.jsonify({"success": "authentication successful"}))
     resp.set_cookie("session", value = session_id, expires = expires_at)
 
@@ -114,14 +169,113 @@ def adduser():
     if set(req.keys()) != {'pass', 'sname', 'fname', 'email'}:
         return flask.abort(400, "The JSON keys {'pass', 'sname', 'fname', 'email'} are required")
 
-    with database.MowerDatabase(host = db_host) as db:
-        session_id, expires_at = db.create_user(req["email"], req["fname"], req["sname"], hash_pw(req["pass"]))
+    pw_hash = password_hasher.hash(req["pass"])
+    with get_db() as db:
+        session_id, expires_at = db.create_user(req["email"], req["fname"], req["sname"], pw_hash)
 
     resp = flask.make_response(flask.jsonify({"success": "a new user was created and the session cookie returned"}))
     resp.set_cookie("session", value = session_id, expires = expires_at)
 
     return resp
 
+@app.route("/api/signout", methods = ["POST"])
+def signout():
+    """
+    +----------+------------------+
+    |          | API Endpoint     |
+    +==========+==================+
+    | Endpoint | ``/api/signout`` |
+    +----------+------------------+
+    | Method   | POST             |
+    +----------+------------------+
+    | Cookie   | **Yes**          |
+    +----------+------------------+
+
+    Revokes the given session cookie, so it can't be used again.
+
+    Example curl request:
+
+    .. code-block:: bash
+
+        curl --cookie "session=b98071db4e4ff3e33b92d77647ec9d59" --request POST http://127.0.0.1:2004/api/signout
+
+    Example valid result JSON:
+
+    .. code-block:: json
+
+        {
+            "success": "signed out"
+        }
+
+    """
+    authenticate()
+    session_id = flask.request.cookies.get("session")
+    with get_db() as db:
+        db.revoke_session(session_id)
+    session_cache.invalidate(session_id)
+
+    resp = flask.make_response(flask.jsonify({"success": "signed out"}))
+    resp.delete_cookie("session")
+    return resp
+
+@app.route("/api/stats")
+def stats():
+    """
+    +----------+------------------+
+    |          | API Endpoint     |
+    +==========+==================+
+    | Endpoint | ``/api/stats``   |
+    +----------+------------------+
+    | Method   | GET              |
+    +----------+------------------+
+    | Cookie   | **No**           |
+    +----------+------------------+
+
+    Counters for checking that caching is working under load. They are per server process.
+
+    Example valid result JSON:
+
+    .. code-block:: json
+
+        {
+            "session_cache": {
+                "hit_ratio": 0.9975,
+                "hits": 3990,
+                "maxsize": 10000,
+                "misses": 10,
+                "size": 10
+            },
+            "expired_sessions_deleted": 120,
+            "simplification_cache": {
+                "hit_ratio": 0.75,
+                "hits": 30,
+                "maxsize": 1000,
+                "misses": 10,
+                "size": 10
+            },
+            "area_index_cache": {
+                "hit_ratio": 0.9,
+                "hits": 9,
+                "maxsize": 100,
+                "misses": 1,
+                "size": 1
+            },
+            "telemetry_retention": {
+                "minutes_rolled_up": 8640,
+                "partitions_added": 8,
+                "partitions_dropped": 1
+            }
+        }
+
+    """
+    return {
+        "session_cache": session_cache.stats(),
+        "expired_sessions_deleted": session_sweeper.deleted,
+        "simplification_cache": area_simplifier.stats(),
+        "area_index_cache": area_indexes.stats(),
+        "telemetry_retention": telemetry_retention.stats()
+    }
+
 @app.route("/api/getuser")
 def getuser():
     """
@@ -202,6 +356,9 @@ def addarea():
     A nice way to get this JSON is to use :func:`models.Area.serialize`. See
     :class:`models.Area` for an example model class instantiation.
 
+    The area can also be sent as MessagePack with ``Content-Type: application/msgpack``, and
+    either can be compressed with ``Content-Encoding: gzip`` or ``deflate``, see :mod:`wireformat`.
+
     Example curl request:
 
     .. code-block:: bash
@@ -217,14 +374,16 @@ def addarea():
         }
 
     """
-    req = flask.request.json
     user = authenticate()
     try:
+        body = wireformat.decompress(flask.request.get_data(), flask.request.headers.get("Content-Encoding"))
+        req = wireformat.decode_area(body, flask.request.mimetype)
         area = models.deserialize(req, models.Area, owner = user)
     except Exception as e:
         return flask.abort(400, e.args)
-    with database.MowerDatabase(host = db_host) as db:
-        db.create_area(area)
+    with get_db() as db:
+        version = db.create_area(area)
+    area_indexes.add_area(area, version)
     return {"success": "Area '%s' added" % area.name}
 
 @app.route("/api/getareas")
@@ -241,7 +400,37 @@ def getareas():
     +----------+------------------+
 
     Get a list of the areas associated with the current user. The areas
-    are serialized to JSON (see :func:`models.Area.serialize`).
+    are serialized to JSON (see :func:`models.Area.serialize`). If only some of the
+    areas are needed, :func:`listareas` and :func:`getarea` are much cheaper.
+
+    For overview maps, add ``?tolerance=`` with a distance in metres to get simplified areas,
+    where no vertex is removed that is further than that from the simplified polygon (see
+    :mod:`simplify`), or ``?zoom=`` with a web map zoom level to hide detail smaller than a
+    pixel. Tolerances are rounded down to a power of two, and simplified areas are cached.
+
+    For users with a lot of big areas, add ``?stream=1`` to get the same JSON streamed
+    back an area at a time as it is read from the database (see :meth:`database.MowerDatabase.iter_areas`),
+    so the server never holds more than one area in memory and the first bytes come back sooner.
+
+    Large areas are much smaller and quicker to decode as MessagePack, sent with
+    ``Accept: application/msgpack``, and responses are compressed if the client sends
+    ``Accept-Encoding: gzip`` or ``deflate`` (see :mod:`wireformat`). ``?stream=1`` only
+    applies to JSON:
+
+    .. code-block:: bash
+
+        curl --compressed -H "Accept: application/msgpack" --cookie "session=53b5b4baaeb3d5ab8ce4a3dcfd346945" http://127.0.0.1:2004/api/getareas
+
+    Responses have ``ETag`` and ``Last-Modified`` headers, which change whenever one of the
+    user's areas changes (see :meth:`database.MowerDatabase.get_area_version`). Send them back
+    in ``If-None-Match`` or ``If-Modified-Since`` to get an empty ``304 Not Modified`` response if
+    nothing has changed, which is much cheaper than fetching the areas again. ``If-Modified-Since``
+    is ignored if there is an ``If-None-Match``, and ``Last-Modified`` is only sent once the second
+    the areas changed in is over, as it can't tell apart changes in the same second:
+
+    .. code-block:: bash
+
+        curl -i --cookie "session=53b5b4baaeb3d5ab8ce4a3dcfd346945" -H 'If-None-Match: "1-12"' http://127.0.0.1:2004/api/getareas
 
     Example curl request:
 
@@ -257,6 +446,7 @@ def getareas():
         {
             "areas": [
                 {
+                    "id_": 12,
                     "area_coords": [
                         [52.619274360887445, 24.0, 1.2393361009732562],
                         [52.619274360423944, 24.0, 1.2393361009734234],
@@ -282,13 +472,352 @@ def getareas():
 
     """
     user = authenticate()
-    with database.MowerDatabase(host = db_host) as db:
-        return {"areas": [area.serialize() for area in db.get_areas(user)]}
+    try:
+        tolerance = endpoints.parse_tolerance(flask.request.args.get)
+    except ValueError as e:
+        return flask.abort(400, e.args)
+    media_type, encoding = negotiate_representation()
+
+    with get_db() as db:
+        # read before the areas, so the version can only ever be older than what is sent
+        version, updated_at = db.get_area_version(user)
+        etag = endpoints.representation_etag("%d-%d" % (user.id_, version), media_type, encoding)
+        if is_not_modified(etag, updated_at):
+            return conditional_response(flask.Response(status = 304), etag, updated_at)
+
+        if media_type != wireformat.JSON or flask.request.args.get("stream") not in ("1", "true"):
+            areas = [area_simplifier.simplify(area, tolerance, version) for area in db.get_areas(user)]
+            resp = encoded_response(wireformat.encode_areas(areas, media_type), media_type, encoding)
+            return conditional_response(resp, etag, updated_at)
+
+    resp = flask.Response(
+        flask.stream_with_context(wireformat.compress_iter(stream_areas(user, tolerance, version), encoding)), mimetype = media_type
+    )
+    if encoding != "identity":
+        resp.content_encoding = encoding
+    return conditional_response(resp, etag, updated_at)
+
+@app.route("/api/listareas")
+def listareas():
+    """
+    +----------+-------------------+
+    |          | API Endpoint      |
+    +==========+===================+
+    | Endpoint | ``/api/listareas``|
+    +----------+-------------------+
+    | Method   | GET               |
+    +----------+-------------------+
+    | Cookie   | **Yes**           |
+    +----------+-------------------+
+
+    A lightweight list of the current user's areas, without any coordinates, for when the
+    coordinates aren't needed or are to be fetched one area at a time with :func:`getarea`
+    (see :meth:`database.MowerDatabase.list_areas`). ``vertex_count`` counts the vertices of the
+    area and its no-go zones, and ``bbox`` is ``[min_x, min_z, max_x, max_z]``.
+
+    Optional query parameters:
+
+    * ``limit``: The most areas to return, defaults to 100, at most 500
+    * ``after``: The ``next`` cursor from the previous page
+    * ``fields``: A comma separated list of the fields to include, ``id_`` is always included
+
+    Like :func:`getareas`, responses have an ``ETag`` for conditional requests.
+
+    Example curl request:
+
+    .. code-block:: bash
+
+        curl --cookie "session=53b5b4baaeb3d5ab8ce4a3dcfd346945" "http://127.0.0.1:2004/api/listareas?limit=2&fields=name,vertex_count"
+
+    Example return JSON data, fetch the next page with ``?after=13``:
+
+    .. code-block:: json
+        :linenos:
+
+        {
+            "areas": [
+                {"id_": 12, "name": "Besides the lake", "vertex_count": 9},
+                {"id_": 13, "name": "Front lawn", "vertex_count": 1204}
+            ],
+            "next": 13
+        }
+
+    """
+    user = authenticate()
+    try:
+        after, limit, fields = endpoints.parse_list_args(flask.request.args.get)
+    except ValueError as e:
+        return flask.abort(400, e.args)
+    _, encoding = negotiate_representation()
+
+    with get_db() as db:
+        version, updated_at = db.get_area_version(user)
+        etag = endpoints.representation_etag("%d-%d" % (user.id_, version), wireformat.JSON, encoding)
+        if is_not_modified(etag, updated_at):
+            return conditional_response(flask.Response(status = 304), etag, updated_at)
+        summaries, next_after = db.list_areas(user, after, limit)
+
+    body = json.dumps({"areas": [summary.serialize(fields) for summary in summaries], "next": next_after}).encode()
+    return conditional_response(encoded_response(body, wireformat.JSON, encoding), etag, updated_at)
+
+@app.route("/api/getarea/<int:area_id>")
+def getarea(area_id):
+    """
+    +----------+-----------------------------+
+    |          | API Endpoint                |
+    +==========+=============================+
+    | Endpoint | ``/api/getarea/<area_id>``  |
+    +----------+-----------------------------+
+    | Method   | GET                         |
+    +----------+-----------------------------+
+    | Cookie   | **Yes**                     |
+    +----------+-----------------------------+
+
+    Get one of the current user's areas, with all its coordinates, by the ``id_`` from
+    :func:`listareas` or :func:`getareas`. The area is in the same format as each of the
+    areas from :func:`getareas`, and supports the same conditional requests, simplification,
+    MessagePack and compression. Returns 404 if the area doesn't exist or belongs to someone else.
+
+    Example curl request:
+
+    .. code-block:: bash
+
+        curl --cookie "session=53b5b4baaeb3d5ab8ce4a3dcfd346945" http://127.0.0.1:2004/api/getarea/12
+
+    """
+    user = authenticate()
+    try:
+        tolerance = endpoints.parse_tolerance(flask.request.args.get)
+    except ValueError as e:
+        return flask.abort(400, e.args)
+    media_type, encoding = negotiate_representation()
+
+    with get_db() as db:
+        version, updated_at = db.get_area_version(user)
+        etag = endpoints.representation_etag("%d-%d-%d" % (user.id_, version, area_id), media_type, encoding)
+        if is_not_modified(etag, updated_at):
+            return conditional_response(flask.Response(status = 304), etag, updated_at)
+        # a cached simplified area doesn't need loading at all
+        area = area_simplifier.get(area_id, version, tolerance, owner = user) if tolerance else None
+        if area is None:
+            area = area_simplifier.simplify(db.get_area(user, area_id), tolerance, version)
+
+    return conditional_response(encoded_response(wireformat.encode_area(area, media_type), media_type, encoding), etag, updated_at)
+
+@app.route("/api/classify", methods = ["POST"])
+def classify():
+    """
+    +----------+------------------+
+    |          | API Endpoint     |
+    +==========+==================+
+    | Endpoint | ``/api/classify``|
+    +----------+------------------+
+    | Method   | POST             |
+    +----------+------------------+
+    | Cookie   | **Yes**          |
+    +----------+------------------+
+
+    Works out which of the current user's areas each of a batch of points is in, and whether
+    it is in one of that area's no-go zones, on the horizontal ``(x, z)`` plane. Up to 10000 points
+    can be classified per request. A point is ``mowable`` if it is in an area and not in a no-go
+    zone. Add ``"area_id"`` to only check one area. The user's areas are kept in an in-memory
+    spatial index (see :mod:`spatial`), so this doesn't fetch any coordinates from the database
+    unless they have changed. Example POST JSON:
+
+    .. code-block:: json
+
+        {
+            "points": [
+                [52.619274360887445, 24.0, 1.2393361009732562],
+                [52.62345423452346, 24.0, 1.2334523452345234]
+            ]
+        }
+
+    Example curl request:
+
+    .. code-block:: bash
+
+        curl --cookie "session=53b5b4baaeb3d5ab8ce4a3dcfd346945" -H "Content-Type: application/json" --request POST --data '{"points": [[52.6192, 24.0, 1.2393]]}' http://127.0.0.1:2004/api/classify
+
+    Example return JSON data, with one entry per point:
+
+    .. code-block:: json
+
+        {
+            "area_ids": [12, null],
+            "in_nogo": [false, false],
+            "mowable": [true, false]
+        }
+
+    """
+    user = authenticate()
+    try:
+        points, area_id = endpoints.parse_classify_request(flask.request.json)
+    except ValueError as e:
+        return flask.abort(400, e.args)
+
+    with get_db() as db:
+        version, _ = db.get_area_version(user)
+        index = area_indexes.get(user, version, lambda: db.get_areas(user))
+
+    area_ids, in_nogo = index.classify(points, area_id)
+    return {
+        "area_ids": area_ids,
+        "in_nogo": in_nogo,
+        "mowable": [i is not None and not nogo for i, nogo in zip(area_ids, in_nogo)]
+    }
+
+@app.route("/api/telemetry")
+def telemetry():
+    """
+    +----------+-------------------+
+    |          | API Endpoint      |
+    +==========+===================+
+    | Endpoint | ``/api/telemetry``|
+    +----------+-------------------+
+    | Method   | GET               |
+    +----------+-------------------+
+    | Cookie   | **Yes**           |
+    +----------+-------------------+
+
+    Get the track of one of the current user's mowers over a window of time, downsampled by
+    the server to a bounded number of points however long the window is (see :mod:`tracks`).
+    Each point is ``[unix time, x, y, z]``, oldest first. Telemetry older than the retention
+    period (see :mod:`retention`) only has a point a minute.
+
+    Query parameters:
+
+    * ``mower``: The mower's iqn, required
+    * ``start``: The start of the window as an ISO 8601 time, defaults to a day before ``end``
+    * ``end``: The end of the window as an ISO 8601 time, defaults to now
+    * ``max_points``: The most points to return, defaults to 2000, at most 10000. The window is
+      split into ``bucket_seconds`` long buckets, and the first fix in each is returned
+    * ``tolerance``: Also simplify the track, in metres, keeping the fixes where the mower turns
+    * ``stream``: ``1`` to stream the points back as they are read from the database, so the
+      server never holds the whole track in memory. Can't be used with ``tolerance``
+
+    Responses are compressed if the client sends ``Accept-Encoding: gzip`` or ``deflate``.
+    Returns 404 if the mower doesn't exist or isn't the user's.
+
+    Example curl request:
+
+    .. code-block:: bash
+
+        curl --compressed --cookie "session=53b5b4baaeb3d5ab8ce4a3dcfd346945" "http://127.0.0.1:2004/api/telemetry?mower=iqn.2004-10.com.ubuntu:01:bb98777ca2f4&start=2023-03-14T09:00:00&end=2023-03-14T17:00:00&max_points=1000"
+
+    Example return JSON data:
+
+    .. code-block:: json
+        :linenos:
+
+        {
+            "mower": "iqn.2004-10.com.ubuntu:01:bb98777ca2f4",
+            "start": "2023-03-14T09:00:00",
+            "end": "2023-03-14T17:00:00",
+            "bucket_seconds": 14.408,
+            "points": [
+                [1678784400.0, 52.619274360887445, 24.0, 1.2393361009732562],
+                [1678784414.41, 52.619274360423944, 24.0, 1.2393361009734234]
+            ]
+        }
+
+    """
+    user = authenticate()
+    iqn = flask.request.args.get("mower")
+    try:
+        if not iqn:
+            raise ValueError("mower is required")
+        start, end, max_points = tracks.parse_window(flask.request.args.get)
+        tolerance = endpoints.parse_tolerance(flask.request.args.get)
+    except ValueError as e:
+        return flask.abort(400, e.args)
+    bucket = tracks.bucket_seconds(start, end, max_points)
+    stream = flask.request.args.get("stream") in ("1", "true")
+    if stream and tolerance > 0:
+        return flask.abort(400, "stream can't be used with tolerance")
+    _, encoding = negotiate_representation()
+
+    with get_db() as db:
+        db.get_mower(user, iqn)
+        if not stream:
+            fixes = tracks.decimate(list(db.iter_telemetry(iqn, start, end, bucket)), tolerance)
+            body = json.dumps({
+                "mower": iqn, "start": start.isoformat(), "end": end.isoformat(), "bucket_seconds": bucket,
+                "points": [tracks.serialize_fix(*fix) for fix in fixes]
+            }).encode()
+            return encoded_response(body, wireformat.JSON, encoding)
+
+    resp = flask.Response(
+        flask.stream_with_context(wireformat.compress_iter(stream_track(iqn, start, end, bucket), encoding)), mimetype = wireformat.JSON
+    )
+    if encoding != "identity":
+        resp.content_encoding = encoding
+    return resp
+
+@app.errorhandler(database.AreaNotFoundException)
+@app.errorhandler(database.MowerNotFoundException)
+def area_not_found(e):
+    return flask.jsonify({"error": str(e)}), 404
+
+def negotiate_representation():
+    # fall back to uncompressed JSON rather than refusing clients which ask for something else
+    media_type = wireformat.negotiate(flask.request.headers.get("Accept"), wireformat.MEDIA_TYPES) or wireformat.JSON
+    return media_type, wireformat.negotiate_encoding(flask.request.headers.get("Accept-Encoding"))
+
+def encoded_response(body, media_type, encoding):
+    resp = flask.Response(body, mimetype = media_type)
+    if encoding != "identity" and len(body) >= wireformat.MIN_COMPRESS_SIZE:
+        resp.set_data(wireformat.compress(body, encoding))
+        resp.content_encoding = encoding
+    return resp
+
+def is_not_modified(etag, last_modified):
+    # If-None-Match takes precedence over If-Modified-Since, as in RFC 9110
+    if flask.request.if_none_match:
+        return flask.request.if_none_match.contains_weak(etag)
+    if last_modified is not None and flask.request.if_modified_since is not None:
+        return last_modified.astimezone(datetime.timezone.utc) <= flask.request.if_modified_since
+    return False
+
+def conditional_response(resp, etag, last_modified):
+    resp.set_etag(etag)
+    if last_modified is not None:
+        resp.last_modified = last_modified.astimezone(datetime.timezone.utc)
+    # clients may keep it, but must check it is still up to date each time
+    resp.cache_control.private = True
+    resp.cache_control.no_cache = True
+    resp.vary.update(("Accept", "Accept-Encoding"))
+    return resp
+
+def stream_areas(user, tolerance = 0, version = None):
+    # the connection is held until the client has read everything
+    with get_db() as db:
+        yield '{"areas": ['
+        for i, area in enumerate(db.iter_areas(user)):
+            yield ("," if i else "") + json.dumps(area_simplifier.simplify(area, tolerance, version).serialize())
+        yield ']}'
+
+def stream_track(iqn, start, end, bucket):
+    # like stream_areas, the connection is held until the client has read everything
+    with get_db() as db:
+        yield '{"mower": %s, "start": "%s", "end": "%s", "bucket_seconds": %s, "points": [' % (
+            json.dumps(iqn), start.isoformat(), end.isoformat(), json.dumps(bucket)
+        )
+        # a chunk per fix would be mostly overhead, so send them a few hundred at a time
+        chunk, separator = [], ""
+        for fix in db.iter_telemetry(iqn, start, end, bucket):
+            chunk.append(json.dumps(tracks.serialize_fix(*fix)))
+            if len(chunk) == TRACK_CHUNK_POINTS:
+                yield separator + ",".join(chunk)
+                chunk, separator = [], ","
+        if chunk:
+            yield separator + ",".join(chunk)
+        yield ']}'
 
 if __name__ == "__main__":
     try:
         if sys.argv[1] == "--production":
-            waitress.serve(TransLogger(app), host = "0.0.0.0", port = 2005, threads = 4)
+            waitress.serve(TransLogger(app), host = "0.0.0.0", port = 2005, threads = WAITRESS_THREADS)
         else:
             app.run(host = "0.0.0.0", port = 2004, debug = True)
     except IndexError:
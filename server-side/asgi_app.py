@@ -0,0 +1,329 @@
+"""An asyncio version of the API in :mod:`app`, with the same endpoints and behaviour except
+that nothing is streamed (``?stream=1``), served by ``uvicorn`` and using :class:`aiodatabase.AsyncMowerDatabase`. Waiting on the database doesn't
+hold a thread, so how many requests are served at once is limited by the size of the connection
+pool (``MOWER_ASGI_POOL_SIZE``, default 16) rather than by the number of threads. Run with:
+
+.. code-block:: bash
+
+    python3 asgi_app.py
+
+It doesn't import :mod:`app`, so it doesn't start the session sweeper or telemetry retention
+threads; run those with a waitress server, or on their own. Like every server process it has
+its own session cache (see :func:`endpoints.session_cache`), so a session revoked through
+another process, e.g. by signing out of the waitress server, is still accepted here until it
+drops out of this cache, for up to a minute.
+"""
+from starlette.responses import JSONResponse, Response
+from starlette.exceptions import HTTPException
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.routing import Route
+import email.utils
+import contextlib
+import datetime
+import aiodatabase
+import endpoints
+import wireformat
+import passwords
+import database
+import tracks
+import asyncio
+import json
+import models
+import os
+
+POOL_SIZE = int(os.environ.get("MOWER_ASGI_POOL_SIZE", 16))
+
+db_host = endpoints.database_host()
+# "rows" or "blob", see database.MowerDatabase
+coord_storage = database.coord_storage_from_env()
+
+session_cache = endpoints.session_cache()
+area_simplifier = endpoints.simplification_cache()
+area_indexes = endpoints.area_index_cache()
+password_hasher = endpoints.password_hasher()
+db_pool = None
+
+def get_db():
+    return aiodatabase.AsyncMowerDatabase(db_pool, coord_storage = coord_storage)
+
+async def get_json(request, keys = None):
+    try:
+        req = await request.json()
+    except ValueError:
+        raise HTTPException(400, "The request body must be JSON")
+    if keys is not None and (not isinstance(req, dict) or set(req.keys()) != keys):
+        raise HTTPException(400, "The JSON keys %s are required" % keys)
+    return req
+
+async def authenticate(request):
+    session_id = request.cookies.get("session")
+    if session_id is None:
+        raise HTTPException(401)
+
+    user = session_cache.get(session_id)
+    if user is not None:
+        return user
+
+    async with get_db() as db:
+        try:
+            user, expire_at = await db.get_session(session_id)
+        except database.InvalidSessionException:
+            raise HTTPException(401)
+    session_cache.put(session_id, user, expire_at)
+    return user
+
+def session_response(content, session_id, expires_at):
+    resp = JSONResponse(content)
+    resp.set_cookie("session", value = session_id, expires = expires_at)
+    return resp
+
+async def signin(request):
+    """See :func:`app.signin`."""
+    req = await get_json(request, {'pass', 'sname', 'fname', 'email'})
+    async with get_db() as db:
+        try:
+            user_no, pw_hash = await db.get_password_hash(req["email"])
+        except database.UnauthenticatedUserException:
+            raise HTTPException(401)
+
+    ok, new_hash = await asyncio.wrap_future(password_hasher.submit_verify(req["pass"], pw_hash, wait = 0))
+    if not ok:
+        raise HTTPException(401)
+
+    async with get_db() as db:
+        if new_hash is not None:
+            await db.set_password_hash(user_no, new_hash)
+        session_id, expires_at = await db.create_session(user_no)
+
+    return session_response({"success": "authentication successful"}, session_id, expires_at)
+
+async def adduser(request):
+    """See :func:`app.adduser`."""
+    req = await get_json(request, {'pass', 'sname', 'fname', 'email'})
+    pw_hash = await asyncio.wrap_future(password_hasher.submit_hash(req["pass"], wait = 0))
+    async with get_db() as db:
+        session_id, expires_at = await db.create_user(req["email"], req["fname"], req["sname"], pw_hash)
+
+    return session_response({"success": "a new user was created and the session cookie returned"}, session_id, expires_at)
+
+async def signout(request):
+    """See :func:`app.signout`."""
+    await authenticate(request)
+    session_id = request.cookies.get("session")
+    async with get_db() as db:
+        await db.revoke_session(session_id)
+    session_cache.invalidate(session_id)
+
+    resp = JSONResponse({"success": "signed out"})
+    resp.delete_cookie("session")
+    return resp
+
+async def getuser(request):
+    """See :func:`app.getuser`."""
+    user = await authenticate(request)
+    return JSONResponse(user.serialize())
+
+async def addarea(request):
+    """See :func:`app.addarea`."""
+    user = await authenticate(request)
+    try:
+        body = wireformat.decompress(await request.body(), request.headers.get("content-encoding"))
+        req = wireformat.decode_area(body, request.headers.get("content-type", "").split(";")[0].strip().lower())
+        area = models.deserialize(req, models.Area, owner = user)
+    except Exception as e:
+        raise HTTPException(400, str(e.args))
+    async with get_db() as db:
+        version = await db.create_area(area)
+    area_indexes.add_area(area, version)
+    return JSONResponse({"success": "Area '%s' added" % area.name})
+
+async def getareas(request):
+    """See :func:`app.getareas`. Streamed JSON (``?stream=1``) isn't supported, and is a 400
+    rather than sending the whole response at once to clients which can't cope with that.
+    """
+    user = await authenticate(request)
+    tolerance = parse_tolerance(request)
+    media_type, encoding = negotiate_representation(request)
+    if media_type == wireformat.JSON and request.query_params.get("stream") in ("1", "true"):
+        raise HTTPException(400, "stream isn't supported by this server")
+
+    async with get_db() as db:
+        version, updated_at = await db.get_area_version(user)
+        etag = '"%s"' % endpoints.representation_etag("%d-%d" % (user.id_, version), media_type, encoding)
+        if is_not_modified(request, etag, updated_at):
+            return conditional_response(Response(status_code = 304), etag, updated_at)
+        areas = await db.get_areas(user)
+
+    if tolerance:
+        # simplifying big areas takes a while, so not on the event loop
+        areas = await run_in_threadpool(lambda: [area_simplifier.simplify(area, tolerance, version) for area in areas])
+
+    return conditional_response(encoded_response(wireformat.encode_areas(areas, media_type), media_type, encoding), etag, updated_at)
+
+async def listareas(request):
+    """See :func:`app.listareas`."""
+    user = await authenticate(request)
+    try:
+        after, limit, fields = endpoints.parse_list_args(request.query_params.get)
+    except ValueError as e:
+        raise HTTPException(400, str(e.args))
+    _, encoding = negotiate_representation(request)
+
+    async with get_db() as db:
+        version, updated_at = await db.get_area_version(user)
+        etag = '"%s"' % endpoints.representation_etag("%d-%d" % (user.id_, version), wireformat.JSON, encoding)
+        if is_not_modified(request, etag, updated_at):
+            return conditional_response(Response(status_code = 304), etag, updated_at)
+        summaries, next_after = await db.list_areas(user, after, limit)
+
+    body = json.dumps({"areas": [summary.serialize(fields) for summary in summaries], "next": next_after}).encode()
+    return conditional_response(encoded_response(body, wireformat.JSON, encoding), etag, updated_at)
+
+async def getarea(request):
+    """See :func:`app.getarea`."""
+    user = await authenticate(request)
+    area_id = request.path_params["area_id"]
+    tolerance = parse_tolerance(request)
+    media_type, encoding = negotiate_representation(request)
+
+    async with get_db() as db:
+        version, updated_at = await db.get_area_version(user)
+        etag = '"%s"' % endpoints.representation_etag("%d-%d-%d" % (user.id_, version, area_id), media_type, encoding)
+        if is_not_modified(request, etag, updated_at):
+            return conditional_response(Response(status_code = 304), etag, updated_at)
+        area = area_simplifier.get(area_id, version, tolerance, owner = user) if tolerance else None
+        if area is None:
+            area = await db.get_area(user, area_id)
+            if tolerance:
+                area = await run_in_threadpool(area_simplifier.simplify, area, tolerance, version)
+
+    return conditional_response(encoded_response(wireformat.encode_area(area, media_type), media_type, encoding), etag, updated_at)
+
+def parse_tolerance(request):
+    try:
+        return endpoints.parse_tolerance(request.query_params.get)
+    except ValueError as e:
+        raise HTTPException(400, str(e.args))
+
+async def classify(request):
+    """See :func:`app.classify`."""
+    user = await authenticate(request)
+    try:
+        points, area_id = endpoints.parse_classify_request(await get_json(request))
+    except ValueError as e:
+        raise HTTPException(400, str(e.args))
+
+    async with get_db() as db:
+        version, _ = await db.get_area_version(user)
+        index = area_indexes.lookup(user, version)
+        if index is None:
+            areas = await db.get_areas(user)
+            index = await run_in_threadpool(area_indexes.build, user, version, areas)
+
+    area_ids, in_nogo = await run_in_threadpool(index.classify, points, area_id)
+    return JSONResponse({
+        "area_ids": area_ids,
+        "in_nogo": in_nogo,
+        "mowable": [i is not None and not nogo for i, nogo in zip(area_ids, in_nogo)]
+    })
+
+async def telemetry(request):
+    """See :func:`app.telemetry`. ``?stream=1`` isn't supported, as the number of points is bounded anyway."""
+    user = await authenticate(request)
+    iqn = request.query_params.get("mower")
+    try:
+        if not iqn:
+            raise ValueError("mower is required")
+        start, end, max_points = tracks.parse_window(request.query_params.get)
+    except ValueError as e:
+        raise HTTPException(400, str(e.args))
+    tolerance = parse_tolerance(request)
+    bucket = tracks.bucket_seconds(start, end, max_points)
+    _, encoding = negotiate_representation(request)
+
+    async with get_db() as db:
+        await db.get_mower(user, iqn)
+        fixes = await db.get_telemetry(iqn, start, end, bucket)
+
+    if tolerance:
+        fixes = await run_in_threadpool(tracks.decimate, fixes, tolerance)
+    body = json.dumps({
+        "mower": iqn, "start": start.isoformat(), "end": end.isoformat(), "bucket_seconds": bucket,
+        "points": [tracks.serialize_fix(*fix) for fix in fixes]
+    }).encode()
+    return encoded_response(body, wireformat.JSON, encoding)
+
+def negotiate_representation(request):
+    media_type = wireformat.negotiate(request.headers.get("accept"), wireformat.MEDIA_TYPES) or wireformat.JSON
+    return media_type, wireformat.negotiate_encoding(request.headers.get("accept-encoding"))
+
+def encoded_response(body, media_type, encoding):
+    headers = {}
+    if encoding != "identity" and len(body) >= wireformat.MIN_COMPRESS_SIZE:
+        body = wireformat.compress(body, encoding)
+        headers["content-encoding"] = encoding
+    return Response(body, media_type = media_type, headers = headers)
+
+def is_not_modified(request, etag, last_modified):
+    """See :func:`app.is_not_modified`."""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in tags or etag in tags
+    if_modified_since = request.headers.get("if-modified-since")
+    if last_modified is not None and if_modified_since is not None:
+        try:
+            return last_modified.astimezone(datetime.timezone.utc) <= email.utils.parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+def conditional_response(resp, etag, last_modified):
+    resp.headers["etag"] = etag
+    if last_modified is not None:
+        resp.headers["last-modified"] = email.utils.format_datetime(last_modified.astimezone(datetime.timezone.utc), usegmt = True)
+    resp.headers["cache-control"] = "private, no-cache"
+    resp.headers["vary"] = "Accept, Accept-Encoding"
+    return resp
+
+async def server_busy(request, e):
+    return JSONResponse({"error": str(e)}, status_code = 503)
+
+async def area_not_found(request, e):
+    return JSONResponse({"error": str(e)}, status_code = 404)
+
+@contextlib.asynccontextmanager
+async def lifespan(starlette_app):
+    global db_pool
+    db_pool = await aiodatabase.create_pool(host = db_host, size = POOL_SIZE)
+    try:
+        yield
+    finally:
+        db_pool.close()
+        await db_pool.wait_closed()
+
+asgi_app = Starlette(
+    routes = [
+        Route("/api/signin", signin, methods = ["POST"]),
+        Route("/api/adduser", adduser, methods = ["POST"]),
+        Route("/api/signout", signout, methods = ["POST"]),
+        Route("/api/getuser", getuser),
+        Route("/api/addarea", addarea, methods = ["POST"]),
+        Route("/api/getareas", getareas),
+        Route("/api/listareas", listareas),
+        Route("/api/getarea/{area_id:int}", getarea),
+        Route("/api/classify", classify, methods = ["POST"]),
+        Route("/api/telemetry", telemetry),
+    ],
+    exception_handlers = {
+        passwords.PasswordHasherBusyException: server_busy,
+        database.AreaNotFoundException: area_not_found,
+        database.MowerNotFoundException: area_not_found
+    },
+    lifespan = lifespan
+)
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(asgi_app, host = "0.0.0.0", port = 2005)
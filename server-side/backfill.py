@@ -0,0 +1,270 @@
+"""Parses the NMEA log files in ``nmea_logs`` back into telemetry, e.g. after telemetry was lost.
+Log files are split into chunks of a few megabytes which are parsed in parallel in a process
+pool, one process per core by default, so one big all-day log is spread across every core as
+well as many small ones. Only ``GGA`` and ``RMC`` sentences are parsed, with ``pynmeagps``:
+
+* ``GGA`` sentences with a fix give the position and altitude, at a time of day
+* ``RMC`` sentences give the date, and a position without an altitude for times with no ``GGA``
+
+Fixes are written with :meth:`database.MowerDatabase.append_telemetry_many`, but only where the
+mower has no telemetry within a second of them already, so running it again, or over a time when
+telemetry was only partly lost, never duplicates fixes. The second either side is for telemetry
+stamped with when it was received rather than with its GPS time, as :mod:`collector` used to,
+which lags the GPS time by a fraction of a second, and so is often in the next second. Safe to run while the API is up:
+
+.. code-block:: bash
+
+    python3 backfill.py --host 192.168.1.9 --mower iqn.2004-10.com.ubuntu:01:bb98777ca2f4 --since 2023-03-14
+"""
+from concurrent.futures import ProcessPoolExecutor
+import collections
+import pynmeagps
+import argparse
+import datetime
+import database
+import nmealog
+import time
+import os
+
+# the size of the byte ranges log files are split into for parsing
+CHUNK_SIZE = 8 * 1024 * 1024
+# the sentences we want, straight after the two letter talker id, so others can be skipped without parsing them
+FIX_SENTENCES = (b"GGA", b"RMC")
+# a time of day this much earlier than the previous fix's means the date has gone past midnight
+MIDNIGHT_ROLLOVER = datetime.timedelta(hours = 12)
+# a fix is already in the telemetry if the mower has one in its second or the ones this far either side,
+# as some were stamped when received
+DUPLICATE_TOLERANCE = datetime.timedelta(seconds = 1)
+
+Fix = collections.namedtuple("Fix", ["date", "time", "x", "y", "z"])
+
+def split_file(path, chunk_size = CHUNK_SIZE):
+    """Splits a file into byte ranges to parse separately with :func:`parse_chunk`.
+
+    Arguments:
+        path (str): The file
+        chunk_size (int): The size of each range, in bytes
+
+    Returns:
+        list: ``(start, end)`` byte offsets
+    """
+    with nmealog.open_log(path) as log:
+        size = log.size
+    return [(start, min(start + chunk_size, size)) for start in range(0, size, chunk_size)]
+
+def parse_chunk(path, start, end):
+    """Parses the fixes from the lines of a NMEA log file which start in a byte range. Run in
+    the worker processes.
+
+    Each fix has the date of the last ``RMC`` sentence before it in the range. Fixes before the
+    first ``RMC`` sentence have a ``date`` of ``None``, for the caller to fill in from the end
+    of the previous range (see :func:`date_fixes`).
+
+    Compressed log files are decompressed transparently (see :func:`nmealog.open_log`), and
+    ranges are of the uncompressed text.
+
+    Arguments:
+        path (str): The log file
+        start (int): The start of the range, in bytes
+        end (int): The end of the range, in bytes
+
+    Returns:
+        (list, int, int): The :class:`Fix` es, in order, how many sentences there were, and how many couldn't be parsed
+    """
+    with nmealog.open_log(path) as log:
+        # the line running over the start belongs to the previous range, and the one
+        # running over the end to this one
+        if start > 0:
+            start = log.find(b"\n", start - 1) + 1 or log.size
+        end = log.find(b"\n", end - 1) + 1 or log.size
+        data = log[start:end]
+
+    fixes = []
+    sentences = errors = 0
+    date = None
+    # the last RMC sentence, unparsed until we know whether there is a GGA for the same time,
+    # as most of the time it is only needed for the date, and pynmeagps is slow
+    rmc = None
+
+    def parse(line):
+        nonlocal errors
+        try:
+            return pynmeagps.NMEAReader.parse(line)
+        except Exception:
+            errors += 1
+
+    def add_rmc(line):
+        # a fix from an RMC sentence, for a time with no GGA
+        nonlocal date
+        message = parse(line)
+        if message is None:
+            return
+        if message.date != "":
+            date = message.date
+        if message.status == "A" and message.lat != "" and message.lon != "":
+            # RMC has no altitude, use the last GGA's
+            fixes.append(Fix(date, message.time, message.lat, fixes[-1].y if fixes else 0.0, message.lon))
+
+    for line in data.splitlines():
+        sentences += 1
+        kind = line[3:6]
+        if kind not in FIX_SENTENCES:
+            continue
+        fields = line.split(b",", 2)
+        if len(fields) < 3:
+            errors += 1
+            continue
+        if rmc is not None and rmc[1] != fields[1]:
+            add_rmc(rmc[0])
+            rmc = None
+        if kind == b"RMC":
+            rmc = (line, fields[1])
+            continue
+
+        message = parse(line)
+        if message is None or message.quality in ("", 0) or message.lat == "" or message.lon == "":
+            continue
+        wrapped = bool(fixes) and message.time < fixes[-1].time
+        if date is None or wrapped:
+            # the RMC for this time has the date, or it has gone past midnight
+            dated = rmc is not None and parse(rmc[0])
+            if dated and dated.date != "":
+                date = dated.date
+            elif wrapped and date is not None:
+                date += datetime.timedelta(days = 1)
+        rmc = None
+        if not fixes or fixes[-1].time != message.time:
+            fixes.append(Fix(date, message.time, message.lat, float(message.alt or 0.0), message.lon))
+    if rmc is not None:
+        add_rmc(rmc[0])
+    return fixes, sentences, errors
+
+def date_fixes(fixes, date, previous = None):
+    """Fills in the dates of the fixes from the start of a chunk, before its first ``RMC`` sentence,
+    and works out when each fix was in the server's local time, like ``telemetry_points.recv_at``.
+
+    Arguments:
+        fixes (list): :class:`Fix` es from :func:`parse_chunk`
+        date (datetime.date): The UTC date at the end of the previous chunk
+        previous (datetime.time): The time of day of the last fix of the previous chunk
+
+    Returns:
+        (list, datetime.date, datetime.time): ``(timestamp, x, y, z)`` tuples, and the date and time of day to carry on to the next chunk
+    """
+    timestamped = []
+    for fix in fixes:
+        if fix.time == previous:
+            # an RMC fix at the end of the previous chunk, whose GGA was at the start of this one
+            continue
+        if fix.date is not None:
+            date = fix.date
+        elif previous is not None and datetime.datetime.combine(date, fix.time) < datetime.datetime.combine(date, previous) - MIDNIGHT_ROLLOVER:
+            date += datetime.timedelta(days = 1)
+        previous = fix.time
+        utc = datetime.datetime.combine(date, fix.time, tzinfo = datetime.timezone.utc)
+        timestamped.append((utc.astimezone().replace(tzinfo = None), fix.x, fix.y, fix.z))
+    return timestamped, date, previous
+
+def backfill(db_factory, logs, workers = None, chunk_size = CHUNK_SIZE, progress = print):
+    """Parses NMEA log files into telemetry, filling in seconds which have none.
+
+    Arguments:
+        db_factory (callable): Returns a new :class:`database.MowerDatabase`
+        logs (list): ``(iqn, created_at, last_updated, path)`` tuples, from :meth:`database.MowerDatabase.get_nmea_logs`
+        workers (int): How many processes to parse with, one per core by default
+        chunk_size (int): The size of the byte ranges log files are split into, in bytes
+        progress (callable): Called with a line of progress for each log file
+
+    Returns:
+        dict: Totals of ``sentences``, ``errors``, ``fixes`` parsed and fixes ``written``, the ``seconds`` taken and ``sentences_per_second``
+    """
+    totals = {"files": 0, "sentences": 0, "errors": 0, "fixes": 0, "written": 0}
+    began = time.perf_counter()
+    workers = workers or os.cpu_count()
+    current = None
+    with ProcessPoolExecutor(max_workers = workers) as executor:
+        # chunks are read back in order, with a few queued per process so they are never idle,
+        # but not so many that parsed chunks pile up in memory waiting for the database
+        queued = collections.deque()
+        for task in chunk_tasks(logs, chunk_size, progress):
+            queued.append((task, executor.submit(parse_chunk, *task[2:])))
+            if len(queued) >= workers * 2:
+                current = load_chunk(db_factory, current, *queued.popleft(), totals, progress)
+        while queued:
+            current = load_chunk(db_factory, current, *queued.popleft(), totals, progress)
+    if current is not None:
+        finish_file(current, totals, progress)
+
+    totals["seconds"] = time.perf_counter() - began
+    totals["sentences_per_second"] = totals["sentences"] / max(totals["seconds"], 1e-9)
+    return totals
+
+def chunk_tasks(logs, chunk_size, progress):
+    for iqn, created_at, _, path in logs:
+        if not os.path.exists(path):
+            progress("%s: missing, skipped" % path)
+            continue
+        for start, end in split_file(path, chunk_size):
+            yield iqn, created_at, path, start, end
+
+def load_chunk(db_factory, current, task, future, totals, progress):
+    # write a parsed chunk's fixes. current is the state of the file being loaded
+    iqn, created_at, path, start, _ = task
+    if start == 0:
+        if current is not None:
+            finish_file(current, totals, progress)
+        # the date the file was started, in UTC, until its first RMC sentence
+        current = {
+            "path": path, "began": time.perf_counter(), "counts": collections.Counter(),
+            "date": created_at.astimezone(datetime.timezone.utc).date(), "previous": None
+        }
+
+    fixes, sentences, errors = future.result()
+    fixes, current["date"], current["previous"] = date_fixes(fixes, current["date"], current["previous"])
+    current["counts"].update(sentences = sentences, errors = errors, fixes = len(fixes))
+    if fixes:
+        with db_factory() as db:
+            existing = db.get_telemetry_seconds(iqn, fixes[0][0] - DUPLICATE_TOLERANCE, fixes[-1][0] + DUPLICATE_TOLERANCE)
+            current["counts"]["written"] += db.append_telemetry_many([
+                (iqn, *fix) for fix in fixes if not has_nearby(existing, fix[0])
+            ])
+    return current
+
+def has_nearby(seconds, timestamp):
+    # whether the second of the timestamp, or the one either side of it, is in the set of whole seconds
+    second = timestamp.replace(microsecond = 0)
+    return any(second + offset in seconds for offset in (-DUPLICATE_TOLERANCE, datetime.timedelta(0), DUPLICATE_TOLERANCE))
+
+def finish_file(current, totals, progress):
+    counts = current["counts"]
+    totals["files"] += 1
+    for key in ("sentences", "errors", "fixes", "written"):
+        totals[key] += counts[key]
+    progress("%s: %d sentences, %d fixes, %d written, %d unparseable, %.0f sentences/s" % (
+        current["path"], counts["sentences"], counts["fixes"], counts["written"], counts["errors"],
+        counts["sentences"] / max(time.perf_counter() - current["began"], 1e-9)
+    ))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = __doc__.split("\n\n")[0])
+    parser.add_argument("--host", default = "db")
+    parser.add_argument("--mower", help = "Only this mower's log files")
+    parser.add_argument("--since", type = datetime.datetime.fromisoformat, help = "Only log files updated since this ISO 8601 time")
+    parser.add_argument("--until", type = datetime.datetime.fromisoformat, help = "Only log files started before this ISO 8601 time")
+    parser.add_argument("--workers", type = int, default = None, help = "Parsing processes, defaults to one per core")
+    parser.add_argument("--chunk-size", type = int, default = CHUNK_SIZE, help = "Bytes of log file parsed per task")
+    args = parser.parse_args()
+
+    if not os.path.exists(".docker"):
+        import dotenv
+        dotenv.load_dotenv(dotenv_path = os.path.join("..", "db.env"))
+
+    db_factory = lambda: database.MowerDatabase(host = args.host)
+    with db_factory() as db:
+        logs = db.get_nmea_logs(args.mower, args.since, args.until)
+    print("Backfilling from %d log files" % len(logs))
+
+    totals = backfill(db_factory, logs, args.workers, args.chunk_size)
+    print("%d sentences in %.1fs, %.0f sentences/s, %d fixes written" % (
+        totals["sentences"], totals["seconds"], totals["sentences_per_second"], totals["written"]
+    ))
@@ -0,0 +1,107 @@
+"""Compares :meth:`database.MowerDatabase.get_areas` against the old one-query-per-area
+implementation, :func:`get_areas_unbatched`, over synthetic users with a growing number of
+areas. Run from the ``server-side`` directory:
+
+.. code-block:: bash
+
+    python3 benchmarks/bench_get_areas.py --host 192.168.1.9 --sizes 1 10 50 100
+
+A separate, throwaway database (``mower_bench`` by default) is built and dropped afterwards.
+"""
+import argparse
+import pymysql
+import random
+import time
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import database
+import models
+
+def synthetic_area(owner, n, vertices, zones, zone_vertices):
+    def ring(count):
+        return [(52.6 + random.random() / 100, 24.0, 1.2 + random.random() / 100) for _ in range(count)]
+
+    return models.Area(owner, "Area %d" % n, "Synthetic benchmark area", ring(vertices), [ring(zone_vertices) for _ in range(zones)])
+
+def get_areas_unbatched(connection, user):
+    """The old implementation of :meth:`database.MowerDatabase.get_areas`, which runs one query per
+    area and per no-go zone.
+
+    Arguments:
+        connection (pymysql.connections.Connection): A connection to the benchmark database
+        user (models.User): A user to get the :class:`models.Area` s for
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT area_id, area_name, area_notes FROM mower_areas WHERE user_no = %s ORDER BY area_id;", (user.id_, ))
+
+        areas = []
+        for area_id, area_name, area_notes in cursor.fetchall():
+            cursor.execute("""
+            SELECT x, y, z FROM area_coords 
+            INNER JOIN coords ON coords.coord_id = area_coords.coord_id 
+            WHERE area_coords.area_id = %s
+            ORDER BY area_coords.coord_id;
+            """, (area_id, ))
+            coords = database.str_coords_to_float(cursor.fetchall())
+
+            nogo_zones = []
+            cursor.execute("SELECT nogo_id FROM nogo_zones WHERE area_id = %s ORDER BY nogo_id;", (area_id, ))
+            for nogo_id in [i[0] for i in cursor.fetchall()]:
+                cursor.execute("""
+                SELECT x, y, z FROM nogo_coords 
+                INNER JOIN coords ON nogo_coords.coord_id = coords.coord_id 
+                WHERE nogo_id = %s
+                ORDER BY nogo_coords.coord_id;
+                """, (nogo_id, ))
+                nogo_zones.append(database.str_coords_to_float(cursor.fetchall()))
+
+            areas.append(models.Area(user, area_name, area_notes, coords, nogo_zones, area_id))
+
+    return areas
+
+def best_of(repeat, func, *args):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = __doc__.split("\n\n")[0])
+    parser.add_argument("--host", default = "db")
+    parser.add_argument("--db", default = "mower_bench", help = "A database which will be created and dropped")
+    parser.add_argument("--sizes", type = int, nargs = "+", default = [1, 5, 10, 25, 50, 100], help = "Numbers of areas per user")
+    parser.add_argument("--vertices", type = int, default = 100, help = "Vertices per area")
+    parser.add_argument("--zones", type = int, default = 3, help = "No-go zones per area")
+    parser.add_argument("--zone-vertices", type = int, default = 20, help = "Vertices per no-go zone")
+    parser.add_argument("--repeat", type = int, default = 5)
+    args = parser.parse_args()
+
+    if not os.path.exists(".docker"):
+        import dotenv
+        dotenv.load_dotenv(dotenv_path = os.path.join("..", "db.env"))
+
+    print("%8s %14s %14s %9s" % ("areas", "unbatched (s)", "batched (s)", "speedup"))
+    with database.MowerDatabase(host = args.host, db = args.db) as db:
+        # autocommit, so that every query sees the areas db has committed since the last
+        connection = pymysql.connect(host = args.host, user = db.user, passwd = db.passwd, db = args.db, autocommit = True)
+        try:
+            for size in args.sizes:
+                email = "bench%d@example.com" % size
+                session_id, _ = db.create_user(email, "Bench", "Mark", "0" * 64)
+                user = db.authenticate_session(session_id)
+                for n in range(size):
+                    db.create_area(synthetic_area(user, n, args.vertices, args.zones, args.zone_vertices))
+
+                old_time, old = best_of(args.repeat, get_areas_unbatched, connection, user)
+                new_time, new = best_of(args.repeat, db.get_areas, user)
+                assert old == new, "get_areas and get_areas_unbatched disagree"
+
+                print("%8d %14.4f %14.4f %8.1fx" % (size, old_time, new_time, old_time / new_time))
+        finally:
+            with connection.cursor() as cursor:
+                cursor.execute("DROP DATABASE %s;" % args.db)
+            connection.close()
@@ -0,0 +1,59 @@
+"""Measures how much memory a :class:`models.Area` takes, against the lists of coordinates it is
+made from, and how long serializing it takes, with and without copying the coordinates. Doesn't
+need a database. Run from the ``server-side`` directory:
+
+.. code-block:: bash
+
+    python3 benchmarks/bench_models.py --sizes 100 10000 100000
+"""
+import tracemalloc
+import argparse
+import random
+import time
+import json
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import models
+
+def synthetic_rings(vertices, zones):
+    def ring(count):
+        return [[52.6 + random.random() / 100, 24.0, 1.2 + random.random() / 100] for _ in range(count)]
+
+    return ring(vertices), [ring(vertices // 10) for _ in range(zones)]
+
+def allocated(func):
+    # bytes still allocated by what func returns
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = func()
+    size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return size, result
+
+def best_of(repeat, func, *args):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = __doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", type = int, nargs = "+", default = [100, 1000, 10000, 100000], help = "Vertices in the boundary")
+    parser.add_argument("--zones", type = int, default = 5, help = "No-go zones per area, each a tenth the size of the boundary")
+    parser.add_argument("--repeat", type = int, default = 5)
+    args = parser.parse_args()
+
+    print("%9s %14s %14s %10s %14s %14s" % ("vertices", "list bytes/v", "area bytes/v", "smaller", "arrays us", "json ms"))
+    for size in args.sizes:
+        vertices = size + args.zones * (size // 10)
+        list_bytes, (area_coords, nogo_zones) = allocated(lambda: synthetic_rings(size, args.zones))
+        area_bytes, area = allocated(lambda: models.Area(None, "Benchmark", "Synthetic benchmark area", area_coords, nogo_zones, 1))
+        serialize_time, _ = best_of(args.repeat, area.serialize_arrays)
+        json_time, _ = best_of(args.repeat, lambda: json.dumps(area.serialize()))
+        print("%9d %14.1f %14.1f %9.1fx %14.1f %14.2f" % (
+            size, list_bytes / vertices, area_bytes / vertices, list_bytes / area_bytes, serialize_time * 1e6, json_time * 1000
+        ))
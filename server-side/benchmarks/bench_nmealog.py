@@ -0,0 +1,104 @@
+"""Measures how long :meth:`nmealog.NMEALogReader.read` takes to read a one minute window out of
+NMEA log files of a growing length, plain and compressed, against scanning the whole file. Also
+checks that every window it reads has the same sentences as the scan, including windows starting
+exactly on the time of an index entry. Doesn't need a database. Run from the ``server-side``
+directory:
+
+.. code-block:: bash
+
+    python3 benchmarks/bench_nmealog.py --hours 1 6 24
+"""
+import tempfile
+import argparse
+import datetime
+import random
+import time
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import nmealog
+
+def checksum(body):
+    total = 0
+    for c in body.encode():
+        total ^= c
+    return "$%s*%02X\r\n" % (body, total)
+
+def synthetic_log(path, start, seconds):
+    # a fix a second, with untimed sentences before and after the RMC, as a receiver sends them
+    with open(path, "w", newline = "") as f:
+        for second in range(seconds):
+            when = start + datetime.timedelta(seconds = second)
+            stamp, date = when.strftime("%H%M%S.00"), when.strftime("%d%m%y")
+            lat = "5236.%05d" % random.randrange(100000)
+            f.write(checksum("GPGGA,%s,%s,N,00114.00000,E,4,12,0.8,30.0,M,45.0,M,," % (stamp, lat)))
+            f.write(checksum("GPGSA,A,3,01,02,03,04,05,06,07,08,09,10,11,12,1.5,0.8,1.2"))
+            for i in range(3):
+                f.write(checksum("GPGSV,3,%d,12,01,40,083,46,02,17,308,41,03,07,344,39,04,22,228,45" % (i + 1)))
+            f.write(checksum("GPRMC,%s,A,%s,N,00114.00000,E,0.1,0.0,%s,,,D" % (stamp, lat, date)))
+            f.write(checksum("GPVTG,0.0,T,,M,0.1,N,0.2,K,D"))
+
+def scan(path, created_at, start, end):
+    # the window read from the start of the file, timing sentences the way NMEALogReader does
+    start, end = start.timestamp(), end.timestamp()
+    anchor, current, window = created_at.timestamp(), None, []
+    with open(path, "rb") as f:
+        for line in f:
+            timed = nmealog.sentence_time(line, anchor)
+            if timed is not None and timed != current:
+                anchor = current = timed
+            if current is not None and start <= current < end:
+                window.append(line)
+    return window
+
+def best_of(repeat, func, *args):
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func(*args)
+        times.append(time.perf_counter() - started)
+    return min(times), result
+
+def read_window(path, created_at, start, end):
+    with nmealog.NMEALogReader(path, created_at) as reader:
+        return [line for _, line in reader.read(start, end)]
+
+def check_windows(path, text_path, created_at, starts):
+    # text_path is the uncompressed log, to scan
+    for start in starts:
+        end = start + datetime.timedelta(minutes = 1)
+        assert read_window(path, created_at, start, end) == scan(text_path, created_at, start, end), "the window from %s is wrong" % start
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = __doc__.split("\n\n")[0])
+    parser.add_argument("--hours", type = float, nargs = "+", default = [0.5, 2, 8], help = "Lengths of log file")
+    parser.add_argument("--repeat", type = int, default = 5)
+    args = parser.parse_args()
+
+    created_at = datetime.datetime(2023, 3, 14, 9, 0, 0)
+    print("%6s %10s %12s %14s %12s" % ("hours", "MiB", "scan (ms)", "plain (ms)", "gzip (ms)"))
+    with tempfile.TemporaryDirectory() as tmp:
+        for hours in args.hours:
+            seconds = int(hours * 3600)
+            path = os.path.join(tmp, "%g.log" % hours)
+            synthetic_log(path, created_at.astimezone(datetime.timezone.utc), seconds)
+            # old enough that the reader saves the index it builds
+            os.utime(path, (time.time() - 2 * nmealog.INDEX_SETTLE_TIME, ) * 2)
+            compressed, _, _ = nmealog.compress_log(path)
+
+            # every index entry, as they can be partway through their second
+            read_window(path, created_at, created_at, created_at)
+            starts = [datetime.datetime.fromtimestamp(t) for t, _ in nmealog.read_index(nmealog.index_path_for(path))]
+            starts += [created_at + datetime.timedelta(seconds = random.randrange(seconds)) for _ in range(20)]
+            check_windows(path, path, created_at, starts)
+            check_windows(compressed, path, created_at, starts)
+
+            start = created_at + datetime.timedelta(seconds = seconds // 2)
+            end = start + datetime.timedelta(minutes = 1)
+            scan_time, _ = best_of(args.repeat, scan, path, created_at, start, end)
+            plain_time, _ = best_of(args.repeat, read_window, path, created_at, start, end)
+            gzip_time, _ = best_of(args.repeat, read_window, compressed, created_at, start, end)
+            print("%6g %10.1f %12.2f %14.2f %12.2f" % (
+                hours, os.path.getsize(path) / 2 ** 20, scan_time * 1000, plain_time * 1000, gzip_time * 1000
+            ))
@@ -0,0 +1,57 @@
+"""Measures signin password checking throughput of :class:`passwords.PasswordHasher` at different
+scrypt costs, with many clients verifying at once as in a signin burst. Doesn't need a database.
+Run from the ``server-side`` directory:
+
+.. code-block:: bash
+
+    python3 benchmarks/bench_passwords.py --costs 12 14 16 --workers 1 2 4
+"""
+import concurrent.futures
+import argparse
+import hashlib
+import time
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import passwords
+
+def burst(hasher, pw_hash, clients, duration):
+    deadline = time.monotonic() + duration
+
+    def client():
+        verified, refused = 0, 0
+        while time.monotonic() < deadline:
+            try:
+                hasher.verify("password", pw_hash)
+                verified += 1
+            except passwords.PasswordHasherBusyException:
+                refused += 1
+        return verified, refused
+
+    with concurrent.futures.ThreadPoolExecutor(clients) as executor:
+        results = [f.result() for f in [executor.submit(client) for _ in range(clients)]]
+    return sum(v for v, _ in results), sum(r for _, r in results)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = __doc__.split("\n\n")[0])
+    parser.add_argument("--costs", type = int, nargs = "+", default = [12, 13, 14, 15, 16], help = "log2 of scrypt n")
+    parser.add_argument("--workers", type = int, nargs = "+", default = [1, 2, 4])
+    parser.add_argument("--clients", type = int, default = 16, help = "Concurrent signins")
+    parser.add_argument("--duration", type = float, default = 5, help = "Seconds per setting")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    for _ in range(10000):
+        hashlib.sha256(b"password").hexdigest()
+    print("legacy sha256: %.0f signins/s on one thread" % (10000 / (time.perf_counter() - start)))
+
+    print("%6s %8s %12s %12s %14s" % ("log2 n", "workers", "signins/s", "ms/signin", "refused (503)"))
+    for cost in args.costs:
+        for workers in args.workers:
+            hasher = passwords.PasswordHasher(n = 2 ** cost, workers = workers, max_pending = workers)
+            pw_hash = hasher.hash("password")
+            verified, refused = burst(hasher, pw_hash, args.clients, args.duration)
+            print("%6d %8d %12.1f %12.1f %14d" % (
+                cost, workers, verified / args.duration, args.duration * workers * 1000 / max(verified, 1), refused
+            ))
@@ -0,0 +1,54 @@
+"""Measures how much :mod:`simplify` shrinks a big RTK-surveyed field, and how long it takes,
+at different tolerances. Doesn't need a database. Run from the ``server-side`` directory:
+
+.. code-block:: bash
+
+    python3 benchmarks/bench_simplify.py --vertices 100000 --tolerances 0.1 1 5 25
+"""
+import argparse
+import numpy
+import json
+import time
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import simplify
+import models
+
+def synthetic_field(vertices):
+    # a wobbly field about 400m across, surveyed every few centimetres with millimetre noise
+    t = numpy.linspace(0, 2 * numpy.pi, vertices, endpoint = False)
+    r = (1 + 0.1 * numpy.sin(7 * t)) * 0.002
+    coords = numpy.stack((
+        52.6 + r * numpy.cos(t) + numpy.random.normal(0, 1e-8, vertices),
+        numpy.full(vertices, 24.0),
+        1.2 + r * numpy.sin(t) * 1.6
+    ), 1)
+    return coords.tolist()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = __doc__.split("\n\n")[0])
+    parser.add_argument("--vertices", type = int, default = 100000)
+    parser.add_argument("--tolerances", type = float, nargs = "+", default = [0.05, 0.25, 1, 5, 25], help = "In metres")
+    args = parser.parse_args()
+
+    field = synthetic_field(args.vertices)
+    area = models.Area(None, "Benchmark", "Synthetic benchmark field", field, [field[:args.vertices // 10]], 1)
+    print("full resolution: %d vertices, %d bytes of JSON" % (args.vertices, len(json.dumps(field))))
+
+    print("%12s %10s %12s %14s %14s" % ("tolerance m", "vertices", "JSON bytes", "simplify ms", "cached ms"))
+    cache = simplify.SimplificationCache()
+    for tolerance in args.tolerances:
+        start = time.perf_counter()
+        simplified = cache.simplify(area, tolerance, 1)
+        simplify_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        cache.simplify(area, tolerance, 1)
+        cached_time = time.perf_counter() - start
+
+        print("%12g %10d %12d %14.1f %14.3f" % (
+            simplify.tolerance_bucket(tolerance), len(simplified.area_coords), len(json.dumps(simplified.area_coords.tolist())),
+            simplify_time * 1000, cached_time * 1000
+        ))
@@ -0,0 +1,65 @@
+"""Compares the size and encode/decode time of the :mod:`wireformat` encodings of areas, for
+areas with a growing number of vertices. Doesn't need a database. Run from the ``server-side``
+directory:
+
+.. code-block:: bash
+
+    python3 benchmarks/bench_wireformat.py --sizes 100 10000 100000
+"""
+import argparse
+import random
+import json
+import time
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import wireformat
+import geometry
+import msgpack
+import models
+
+def synthetic_area(vertices, zones):
+    def ring(count):
+        return [(52.6 + random.random() / 100, 24.0, 1.2 + random.random() / 100) for _ in range(count)]
+
+    return models.Area(None, "Benchmark", "Synthetic benchmark area", ring(vertices), [ring(vertices // 10) for _ in range(zones)])
+
+def best_of(repeat, func, *args):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+def decode_json(body):
+    return json.loads(body)["areas"]
+
+def decode_msgpack(body):
+    # what a client does to get at the coordinates
+    areas = msgpack.unpackb(body)["areas"]
+    for area in areas:
+        area["area_coords"] = geometry.unpack_coords(area["area_coords"])
+        area["nogo_zones"] = [geometry.unpack_coords(ring) for ring in area["nogo_zones"]]
+    return areas
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = __doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", type = int, nargs = "+", default = [100, 1000, 10000, 100000], help = "Vertices in the boundary")
+    parser.add_argument("--zones", type = int, default = 5, help = "No-go zones per area, each a tenth the size of the boundary")
+    parser.add_argument("--repeat", type = int, default = 5)
+    args = parser.parse_args()
+
+    print("%9s %-24s %12s %12s %12s" % ("vertices", "format", "bytes", "encode ms", "decode ms"))
+    for size in args.sizes:
+        area = synthetic_area(size, args.zones)
+        for media_type in wireformat.MEDIA_TYPES:
+            for encoding in ("identity", "gzip"):
+                encode_time, body = best_of(args.repeat, lambda: wireformat.compress(wireformat.encode_areas([area], media_type), encoding))
+                decode = decode_json if media_type == wireformat.JSON else decode_msgpack
+                decode_time, _ = best_of(args.repeat, lambda: decode(wireformat.decompress(body, encoding)))
+                print("%9d %-24s %12d %12.2f %12.2f" % (
+                    size, media_type.split("/")[1] + ("+" + encoding if encoding != "identity" else ""),
+                    len(body), encode_time * 1000, decode_time * 1000
+                ))
@@ -0,0 +1,84 @@
+"""Load test harness comparing requests per second and latency of API servers, e.g. the
+waitress (``app.py --production``) and asyncio (``asgi_app.py``) modes running side by side
+against the same database:
+
+.. code-block:: bash
+
+    python3 benchmarks/loadtest.py --email gae19jtu@uea.ac.uk --password password \\
+        --target waitress=http://127.0.0.1:2005 --target asgi=http://127.0.0.1:2008 \\
+        --concurrency 32 --duration 20 --endpoints /api/getuser /api/getareas
+
+Each target is signed in to once, then ``concurrency`` client threads request the endpoints in turn
+for ``duration`` seconds. Only 2xx responses count as successes.
+"""
+import concurrent.futures
+import statistics
+import argparse
+import requests
+import time
+
+def sign_in(url, email, password):
+    r = requests.post(url + "/api/signin", json = {"email": email, "pass": password, "fname": "", "sname": ""})
+    r.raise_for_status()
+    return r.cookies.get_dict()
+
+def client(url, cookies, endpoints, deadline, offset):
+    latencies, errors = [], 0
+    session = requests.Session()
+    i = offset
+    while time.monotonic() < deadline:
+        start = time.perf_counter()
+        try:
+            r = session.get(url + endpoints[i % len(endpoints)], cookies = cookies)
+            ok = r.ok
+        except requests.RequestException:
+            ok = False
+        if ok:
+            latencies.append(time.perf_counter() - start)
+        else:
+            errors += 1
+        i += 1
+    return latencies, errors
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return float("nan")
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * p / 100))]
+
+def run(url, cookies, endpoints, concurrency, duration):
+    deadline = time.monotonic() + duration
+    with concurrent.futures.ThreadPoolExecutor(concurrency) as executor:
+        futures = [executor.submit(client, url, cookies, endpoints, deadline, i) for i in range(concurrency)]
+        results = [f.result() for f in futures]
+
+    latencies = sorted(l for latencies, _ in results for l in latencies)
+    return {
+        "requests": len(latencies),
+        "errors": sum(errors for _, errors in results),
+        "rps": len(latencies) / duration,
+        "mean_ms": statistics.mean(latencies) * 1000 if latencies else float("nan"),
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = __doc__.split("\n\n")[0])
+    parser.add_argument("--target", action = "append", required = True, help = "name=url, can be given more than once")
+    parser.add_argument("--email", required = True)
+    parser.add_argument("--password", required = True)
+    parser.add_argument("--endpoints", nargs = "+", default = ["/api/getuser", "/api/getareas"])
+    parser.add_argument("--concurrency", type = int, default = 32)
+    parser.add_argument("--duration", type = float, default = 20, help = "Seconds per target")
+    parser.add_argument("--warmup", type = float, default = 2, help = "Seconds of unmeasured requests before each run")
+    args = parser.parse_args()
+
+    print("%-12s %9s %8s %9s %9s %9s %9s" % ("target", "requests", "errors", "req/s", "mean ms", "p50 ms", "p99 ms"))
+    for target in args.target:
+        name, url = target.split("=", 1)
+        url = url.rstrip("/")
+        cookies = sign_in(url, args.email, args.password)
+        run(url, cookies, args.endpoints, args.concurrency, args.warmup)
+        result = run(url, cookies, args.endpoints, args.concurrency, args.duration)
+        print("%-12s %9d %8d %9.1f %9.2f %9.2f %9.2f" % (
+            name, result["requests"], result["errors"], result["rps"], result["mean_ms"], result["p50_ms"], result["p99_ms"]
+        ))
@@ -0,0 +1,347 @@
+"""Collects the NMEA streams of every registered mower in one process, in place of a logger per
+mower. It connects to each mower's NMEA port over the VPN, at its ``mowers.vpn_ip``, as
+``str2str tcpcli://10.13.13.3:2121`` does, and writes what it receives to the mower's NMEA log
+files (see :class:`nmealog.NMEALogWriter`) and every ``GGA`` fix to the telemetry (see
+:class:`ingest.TelemetryIngestQueue`), at the GPS time of the fix rather than when it was received,
+as :mod:`backfill` does. Run it where the VPN and the log directory are:
+
+.. code-block:: bash
+
+    python3 collector.py --basedir /logs --archive
+
+It replaces the ROS ``nmea_logger`` node, which must not run at the same time, or every
+sentence is logged twice, to two sets of log files and ``nmea_logs`` rows. The ``ros``
+container's entrypoint doesn't start the node when ``MOWER_NMEA_COLLECTOR`` is set, as
+``docker-compose.yml`` does alongside the ``collector`` service.
+"""
+import argparse
+import datetime
+import resource
+import asyncio
+import database
+import geofence
+import pynmeagps
+import threading
+import logarchive
+import nmealog
+import ingest
+import random
+import signal
+import queue
+import zlib
+import os
+
+# the port mowers serve their NMEA stream on
+NMEA_PORT = 2121
+# longer lines than this can't be NMEA, and are dropped
+MAX_SENTENCE = 4096
+# sentences waiting for each worker thread, before reading from the mowers stops
+QUEUE_SIZE = 10000
+
+class NMEACollector:
+    """Holds a TCP connection to every mower in the ``mowers`` table, on one asyncio event loop.
+    Example usage:
+
+    .. code-block:: python
+
+        collector = collector.NMEACollector(lambda: database.MowerDatabase(pool = pool), "/logs", telemetry)
+        asyncio.run(collector.run())
+
+    Sentences are framed as they arrive, one line at a time, so a mower's sentences are written
+    as soon as each one is complete, and nothing waits for a buffer to fill. Writing them to log
+    files and to the telemetry queue can block, e.g. on the database when a log file is started,
+    so it happens on ``workers`` threads rather than on the event loop. Each mower's sentences
+    always go to the same thread, so they stay in order. If the threads fall behind, the
+    collector stops reading from the mowers until they catch up, and TCP slows the mowers down.
+
+    Lost connections, and mowers which can't be reached, are retried with exponential backoff,
+    randomised so that mowers which dropped out together, e.g. when the VPN restarted, don't all
+    reconnect at once. Connections which are silent for ``idle_timeout`` seconds are taken to be
+    dead. The ``mowers`` table is read again every ``refresh_interval`` seconds, to connect to
+    newly registered mowers and to ones whose address has changed.
+
+    Arguments:
+        db_factory (callable): Returns a new :class:`database.MowerDatabase`, ideally one using a :class:`database.ConnectionPool`
+        basedir (str): The directory to put log files in
+        telemetry (ingest.TelemetryIngestQueue): Where to send fixes, or ``None`` to only write log files
+        port (int): The port to connect to mowers on
+        workers (int): How many threads write sentences
+        max_age (int): Seconds without a sentence after which a mower's next sentence starts a new log file
+        refresh_interval (float): How often to read the ``mowers`` table, in seconds
+        connect_timeout (float): How long to wait for a mower to accept a connection, in seconds
+        idle_timeout (float): How long a connection can go without a sentence before reconnecting, in seconds
+        max_backoff (float): The longest wait between attempts to connect to a mower, in seconds
+    """
+    def __init__(self, db_factory, basedir, telemetry = None, port = NMEA_PORT, workers = 4, max_age = 60,
+            refresh_interval = 60, connect_timeout = 10, idle_timeout = 30, max_backoff = 60):
+        self.db_factory = db_factory
+        self.basedir = basedir
+        self.telemetry = telemetry
+        self.port = port
+        self.max_age = max_age
+        self.refresh_interval = refresh_interval
+        self.connect_timeout = connect_timeout
+        self.idle_timeout = idle_timeout
+        self.max_backoff = max_backoff
+
+        self.connected = 0
+        self.connections = 0
+        self.connect_failures = 0
+        self.sentences = 0
+        self.bad_lines = 0
+        self.fixes = 0
+        self.dropped_fixes = 0
+
+        # iqn -> (vpn ip, task reading from it)
+        self.__streams = {}
+        self.__stopping = None
+        self.__queues = [queue.Queue(maxsize = QUEUE_SIZE) for _ in range(workers)]
+        self.__threads = [
+            threading.Thread(target = self.__work, args = (q, ), name = "nmea-collector-%d" % i, daemon = True)
+            for i, q in enumerate(self.__queues)
+        ]
+
+    async def run(self):
+        """Collect from every mower until :meth:`stop` is called, then flush and close the log files."""
+        self.__stopping = asyncio.Event()
+        for thread in self.__threads:
+            thread.start()
+        loop = asyncio.get_running_loop()
+        try:
+            while not self.__stopping.is_set():
+                try:
+                    self.__update_streams(await loop.run_in_executor(None, self.__get_mowers))
+                except Exception as e:
+                    print("Failed to read the mowers table: %s" % e)
+                try:
+                    await asyncio.wait_for(self.__stopping.wait(), self.refresh_interval)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            tasks = {task for _, task in self.__streams.values()}
+            while tasks:
+                # before python 3.12, wait_for can swallow a cancellation which arrives just as
+                # what it is waiting for finishes, so keep cancelling until they have all stopped
+                for task in tasks:
+                    task.cancel()
+                _, tasks = await asyncio.wait(tasks, timeout = 1)
+            self.__streams.clear()
+            for q in self.__queues:
+                await loop.run_in_executor(None, q.put, None)
+            await loop.run_in_executor(None, self.__join)
+
+    def stop(self):
+        """Stop collecting. Must be called on the event loop :meth:`run` is running on."""
+        if self.__stopping is not None:
+            self.__stopping.set()
+
+    def stats(self):
+        """Returns counters, so we can check it is keeping up.
+
+        Returns:
+            dict: JSON-serializable dictionary
+        """
+        stats = {
+            "mowers": len(self.__streams),
+            "connected": self.connected,
+            "connections": self.connections,
+            "connect_failures": self.connect_failures,
+            "sentences": self.sentences,
+            "bad_lines": self.bad_lines,
+            "pending": sum(q.qsize() for q in self.__queues),
+            "fixes": self.fixes,
+            "dropped_fixes": self.dropped_fixes
+        }
+        if self.telemetry is not None:
+            stats["telemetry"] = self.telemetry.stats()
+        return stats
+
+    def __get_mowers(self):
+        with self.db_factory() as db:
+            return db.get_mowers()
+
+    def __update_streams(self, mowers):
+        mowers = dict(mowers)
+        for iqn, (host, task) in list(self.__streams.items()):
+            if mowers.get(iqn) != host:
+                task.cancel()
+                del self.__streams[iqn]
+        for iqn, host in mowers.items():
+            if iqn not in self.__streams:
+                self.__streams[iqn] = (host, asyncio.create_task(self.__stream(iqn, host)))
+
+    async def __stream(self, iqn, host):
+        # keep a connection to one mower open, until cancelled
+        backoff = 1
+        # only say a mower can't be reached once, rather than every retry
+        reachable = True
+        # the same mower always goes to the same worker, so its sentences stay in order
+        sentences = self.__queues[zlib.crc32(iqn.encode()) % len(self.__queues)]
+        while True:
+            reason = None
+            try:
+                reader, writer = await asyncio.wait_for(
+                    asyncio.open_connection(host, self.port, limit = MAX_SENTENCE), self.connect_timeout
+                )
+            except (OSError, asyncio.TimeoutError) as e:
+                self.connect_failures += 1
+                if reachable:
+                    reason = "can't connect: %s" % (e or "timed out")
+                reachable = False
+            else:
+                self.connected += 1
+                self.connections += 1
+                reachable = True
+                try:
+                    if await self.__read(iqn, reader, sentences):
+                        backoff = 1
+                    reason = "no sentences for %ds" % self.idle_timeout
+                except asyncio.IncompleteReadError:
+                    reason = "disconnected"
+                except OSError as e:
+                    reason = e
+                finally:
+                    self.connected -= 1
+                    writer.close()
+
+            delay = backoff * random.uniform(0.5, 1)
+            if reason is not None:
+                print("Lost the NMEA stream of %s (%s:%d), retrying in %.1fs: %s" % (iqn, host, self.port, delay, reason))
+            await asyncio.sleep(delay)
+            backoff = min(backoff * 2, self.max_backoff)
+
+    async def __read(self, iqn, reader, sentences):
+        # queue sentences until the connection is lost or goes quiet. returns if any were read
+        read = False
+        while True:
+            try:
+                line = await asyncio.wait_for(reader.readuntil(b"\n"), self.idle_timeout)
+            except asyncio.TimeoutError:
+                return read
+            except asyncio.LimitOverrunError as e:
+                # skip it, and the rest of it after is counted as a bad line
+                await reader.readexactly(e.consumed)
+                continue
+            if line[:1] not in (b"$", b"!"):
+                self.bad_lines += 1
+                continue
+
+            item = (iqn, datetime.datetime.now(), line)
+            while True:
+                try:
+                    sentences.put_nowait(item)
+                    break
+                except queue.Full:
+                    # let the workers catch up, and the mowers' TCP buffers fill up meanwhile
+                    await asyncio.sleep(0.05)
+            self.sentences += 1
+            read = True
+
+    def __work(self, sentences):
+        # write the sentences of the mowers given to this thread, and keep their log files ticking over
+        writers = {}
+        while True:
+            try:
+                item = sentences.get(timeout = 1)
+            except queue.Empty:
+                item = ()
+            if item is None:
+                break
+            if item:
+                iqn, received_at, line = item
+                try:
+                    self.__write(writers, iqn, received_at, line)
+                except Exception as e:
+                    print("Failed to write a NMEA sentence from %s: %s" % (iqn, e))
+            if not item or sentences.empty():
+                for writer in writers.values():
+                    try:
+                        writer.tick()
+                    except Exception as e:
+                        print("Failed to flush the NMEA log file of %s: %s" % (writer.iqn, e))
+
+        for writer in writers.values():
+            writer.close()
+
+    def __write(self, writers, iqn, received_at, line):
+        writer = writers.get(iqn)
+        if writer is None:
+            writer = writers[iqn] = nmealog.NMEALogWriter(iqn, self.basedir, self.db_factory, max_age = self.max_age)
+        writer.write(line)
+
+        if self.telemetry is None or line[3:6] != b"GGA":
+            return
+        try:
+            message = pynmeagps.NMEAReader.parse(line)
+        except Exception:
+            self.bad_lines += 1
+            return
+        if message.quality in ("", 0) or message.lat == "" or message.lon == "":
+            return
+        # the same time backfill.py would give it, so refilling from the log doesn't duplicate it
+        timed = nmealog.sentence_time(line, received_at.timestamp())
+        fixed_at = received_at if timed is None else datetime.datetime.fromtimestamp(timed)
+        try:
+            self.telemetry.submit(iqn, fixed_at, message.lat, float(message.alt or 0.0), message.lon)
+            self.fixes += 1
+        except ingest.TelemetryBacklogException:
+            self.dropped_fixes += 1
+
+    def __join(self):
+        for thread in self.__threads:
+            thread.join()
+
+def raise_file_limit():
+    """Raises the soft limit on open files to the hard limit, as each mower needs a socket, a
+    log file and its index open at once, which passes the usual default of 1024 at a few hundred mowers.
+
+    Returns:
+        int: The new limit
+    """
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if hard != resource.RLIM_INFINITY and soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+        return hard
+    return soft
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = __doc__.split("\n\n")[0])
+    parser.add_argument("--host", default = None, help = "The database host, defaults to HOST_IP so it can be found from the VPN's network")
+    parser.add_argument("--basedir", default = "/logs", help = "Directory to put log files in")
+    parser.add_argument("--port", type = int, default = NMEA_PORT, help = "The mowers' NMEA port")
+    parser.add_argument("--workers", type = int, default = 4, help = "Threads writing sentences")
+    parser.add_argument("--no-telemetry", action = "store_true", help = "Only write log files")
+    parser.add_argument("--archive", action = "store_true", help = "Also compress finished log files, see logarchive.py")
+    parser.add_argument("--archive-dir", help = "Directory to put compressed log files in, defaults to next to the originals")
+    args = parser.parse_args()
+
+    if not os.path.exists(".docker"):
+        import dotenv
+        dotenv.load_dotenv(dotenv_path = os.path.join("..", "db.env"))
+
+    print("Open file limit: %d" % raise_file_limit())
+    pool = database.ConnectionPool(size = args.workers + 3, host = args.host or os.environ.get("HOST_IP", "db"))
+    # the geofence reads areas, so must look for them where the API puts them
+    get_db = lambda: database.MowerDatabase(pool = pool, coord_storage = database.coord_storage_from_env())
+
+    telemetry = None
+    if not args.no_telemetry:
+        telemetry = ingest.TelemetryIngestQueue(get_db, geofence = geofence.Geofence(get_db))
+    if args.archive:
+        if args.archive_dir is not None:
+            os.makedirs(args.archive_dir, exist_ok = True)
+        logarchive.NMEALogArchiver(get_db, archive_dir = args.archive_dir).start()
+
+    nmea_collector = NMEACollector(get_db, args.basedir, telemetry, args.port, args.workers)
+
+    async def main():
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, nmea_collector.stop)
+        await nmea_collector.run()
+
+    asyncio.run(main())
+    if telemetry is not None:
+        telemetry.close()
+        telemetry.geofence.close()
+    print(nmea_collector.stats())
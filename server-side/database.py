@@ -1,11 +1,176 @@
-from dataclasses import dataclass
+from pymysql.constants import SERVER_STATUS
+from dataclasses import dataclass, field
+import collections
+import threading
 import datetime
+import geometry
 import pymysql
 import secrets
 import models
+import time
 import os
 
 SESSION_LENGTH = datetime.timedelta(days = 7)
+# the most rows sent in one multi-row INSERT, keeps us well below max_allowed_packet
+BULK_INSERT_ROWS = 5000
+
+# errors after which a connection can't be trusted to go back into the pool
+CONNECTION_ERRORS = (pymysql.err.OperationalError, pymysql.err.InterfaceError)
+
+# how area coordinates are stored, see MowerDatabase.coord_storage
+COORD_STORAGE_MODES = ("rows", "blob")
+
+# run (once per process) every time we connect, so that databases built by an older
+# version of __build_db get new tables and indexes. must all be idempotent
+SCHEMA_UPGRADES = [
+    """
+    CREATE TABLE IF NOT EXISTS area_geometry (
+        area_id INT UNSIGNED NOT NULL PRIMARY KEY,
+        coords LONGBLOB NOT NULL,
+        FOREIGN KEY (area_id) REFERENCES mower_areas (area_id)
+    );
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS nogo_geometry (
+        nogo_id INT UNSIGNED NOT NULL PRIMARY KEY,
+        coords LONGBLOB NOT NULL,
+        FOREIGN KEY (nogo_id) REFERENCES nogo_zones (nogo_id)
+    );
+    """,
+    "CREATE INDEX IF NOT EXISTS nmea_logs_current ON nmea_logs (mower, last_updated);",
+    "CREATE INDEX IF NOT EXISTS nmea_logs_path ON nmea_logs (path);",
+    "CREATE INDEX IF NOT EXISTS sessions_expire_at ON sessions (expire_at);",
+    "CREATE INDEX IF NOT EXISTS sessions_user_no ON sessions (user_no, expire_at);",
+    # room for salted, cost-tunable hashes, see passwords.py
+    "ALTER TABLE users MODIFY pw_hash VARCHAR(255) NOT NULL;",
+    "CREATE INDEX IF NOT EXISTS users_email ON users (email);",
+    """
+    CREATE TABLE IF NOT EXISTS area_versions (
+        user_no INT UNSIGNED NOT NULL PRIMARY KEY,
+        version INT UNSIGNED NOT NULL,
+        updated_at DATETIME NOT NULL,
+        FOREIGN KEY (user_no) REFERENCES users (user_no)
+    );
+    """,
+    # summaries of each area for list_areas, so listing doesn't need the coordinates.
+    # NULL for areas from before they existed, until list_areas fills them in
+    """
+    ALTER TABLE mower_areas
+        ADD COLUMN IF NOT EXISTS vertex_count INT UNSIGNED NULL,
+        ADD COLUMN IF NOT EXISTS nogo_count INT UNSIGNED NULL,
+        ADD COLUMN IF NOT EXISTS min_x DOUBLE NULL,
+        ADD COLUMN IF NOT EXISTS min_z DOUBLE NULL,
+        ADD COLUMN IF NOT EXISTS max_x DOUBLE NULL,
+        ADD COLUMN IF NOT EXISTS max_z DOUBLE NULL;
+    """,
+    "CREATE INDEX IF NOT EXISTS mower_areas_user ON mower_areas (user_no, area_id);",
+    # mowers entering no-go zones, see geofence.py
+    """
+    CREATE TABLE IF NOT EXISTS geofence_violations (
+        mower VARCHAR(50) NOT NULL,
+        entered_at DATETIME(3) NOT NULL,
+        area_id INT UNSIGNED NOT NULL,
+        x DOUBLE NOT NULL,
+        y DOUBLE NOT NULL,
+        z DOUBLE NOT NULL,
+        PRIMARY KEY (mower, entered_at),
+        FOREIGN KEY (mower) REFERENCES mowers (iqn),
+        FOREIGN KEY (area_id) REFERENCES mower_areas (area_id)
+    );
+    """,
+    # telemetry with the coordinates inline and millisecond timestamps, split into a partition
+    # per day so that old days are dropped whole rather than DELETEd, see retention.py. starts
+    # with only the catch-all partition, which TelemetryRetention splits up. partitioned tables
+    # can't have foreign keys
+    """
+    CREATE TABLE IF NOT EXISTS telemetry_points (
+        mower VARCHAR(50) NOT NULL,
+        recv_at DATETIME(3) NOT NULL,
+        x DOUBLE NOT NULL,
+        y DOUBLE NOT NULL,
+        z DOUBLE NOT NULL,
+        PRIMARY KEY (mower, recv_at)
+    ) PARTITION BY RANGE COLUMNS (recv_at) (
+        PARTITION pmax VALUES LESS THAN (MAXVALUE)
+    );
+    """,
+    # the first fix of each minute, and the bounding box of the minute's fixes, kept after the
+    # day's telemetry_points partition is dropped. partitioned by month
+    """
+    CREATE TABLE IF NOT EXISTS telemetry_minutes (
+        mower VARCHAR(50) NOT NULL,
+        first_at DATETIME(3) NOT NULL,
+        fixes INT UNSIGNED NOT NULL,
+        x DOUBLE NOT NULL,
+        y DOUBLE NOT NULL,
+        z DOUBLE NOT NULL,
+        min_x DOUBLE NOT NULL,
+        min_z DOUBLE NOT NULL,
+        max_x DOUBLE NOT NULL,
+        max_z DOUBLE NOT NULL,
+        PRIMARY KEY (mower, first_at)
+    ) PARTITION BY RANGE COLUMNS (first_at) (
+        PARTITION pmax VALUES LESS THAN (MAXVALUE)
+    );
+    """,
+    # room for log files moved to an archive directory, see logarchive.py
+    "ALTER TABLE nmea_logs MODIFY path VARCHAR(255) NOT NULL;",
+    "CREATE INDEX IF NOT EXISTS nmea_logs_last_updated ON nmea_logs (last_updated);",
+]
+# the tables split into partitions by time, and the column they are split on
+PARTITIONED_TABLES = {"telemetry_points": "recv_at", "telemetry_minutes": "first_at"}
+# the largest page list_areas returns
+MAX_LIST_AREAS = 500
+# the queries get_areas uses to fetch coordinates, with a WHERE clause on mower_areas to fill in.
+# the no-go zone one left joins so that a no-go zone with no vertices still turns up
+AREA_COORD_ROWS_SQL = """
+SELECT area_coords.area_id, x, y, z FROM mower_areas
+INNER JOIN area_coords ON area_coords.area_id = mower_areas.area_id
+INNER JOIN coords ON coords.coord_id = area_coords.coord_id
+WHERE %s
+ORDER BY area_coords.area_id, area_coords.coord_id;
+"""
+NOGO_COORD_ROWS_SQL = """
+SELECT nogo_zones.area_id, nogo_zones.nogo_id, x, y, z FROM mower_areas
+INNER JOIN nogo_zones ON nogo_zones.area_id = mower_areas.area_id
+LEFT JOIN nogo_coords ON nogo_coords.nogo_id = nogo_zones.nogo_id
+LEFT JOIN coords ON coords.coord_id = nogo_coords.coord_id
+WHERE %s
+ORDER BY nogo_zones.area_id, nogo_zones.nogo_id, nogo_coords.coord_id;
+"""
+AREA_COORD_BLOBS_SQL = """
+SELECT area_geometry.area_id, coords FROM mower_areas
+INNER JOIN area_geometry ON area_geometry.area_id = mower_areas.area_id
+WHERE %s;
+"""
+NOGO_COORD_BLOBS_SQL = """
+SELECT nogo_zones.area_id, nogo_zones.nogo_id, coords FROM mower_areas
+INNER JOIN nogo_zones ON nogo_zones.area_id = mower_areas.area_id
+INNER JOIN nogo_geometry ON nogo_geometry.nogo_id = nogo_zones.nogo_id
+WHERE %s
+ORDER BY nogo_zones.area_id, nogo_zones.nogo_id;
+"""
+
+# the statements create_area runs, shared with aiodatabase.AsyncMowerDatabase.create_area
+AUTOINC_STEP_SQL = "SELECT @@innodb_autoinc_lock_mode, @@auto_increment_increment;"
+INSERT_AREA_SQL = """
+INSERT INTO mower_areas (user_no, area_name, area_notes, vertex_count, nogo_count, min_x, min_z, max_x, max_z)
+VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s);
+"""
+BUMP_AREA_VERSION_SQL = """
+INSERT INTO area_versions (user_no, version, updated_at) VALUES (%s, 1, NOW())
+ON DUPLICATE KEY UPDATE version = version + 1, updated_at = NOW();
+"""
+SELECT_AREA_VERSION_SQL = "SELECT version FROM area_versions WHERE user_no = %s;"
+# what get_area_version returns, see area_version_of. UNIX_TIMESTAMP reads updated_at in the
+# time zone NOW() wrote it in, so it doesn't matter which one the API server is in
+AREA_VERSION_SQL = "SELECT version, UNIX_TIMESTAMP(updated_at), updated_at < NOW() FROM area_versions WHERE user_no = %s;"
+# statements for bulk_insert, which adds the placeholders
+INSERT_NOGO_ZONES_SQL = "INSERT INTO nogo_zones (area_id) VALUES"
+INSERT_COORDS_SQL = "INSERT INTO coords (x, y, z) VALUES"
+
+_upgraded_dbs = set()
+_upgrade_lock = threading.Lock()
 
 @dataclass
 class MowerDatabase:
@@ -13,6 +178,16 @@ class MowerDatabase:
     configs are appropriate for the docker config. Expected to be used with a ``with``
     block. Database will be built if it doesn't exist.
 
+    ``coord_storage`` picks how area and no-go zone vertices are stored. ``"rows"`` is one
+    ``coords`` row per vertex, with x, y and z as strings. ``"blob"`` is one packed binary
+    blob per polygon (see :mod:`geometry`) in the ``area_geometry`` and ``nogo_geometry`` tables,
+    which is much smaller and doesn't need any string parsing. Areas written in ``"rows"`` mode
+    can still be read in ``"blob"`` mode, and can be moved over with :meth:`migrate_coords_to_blobs`.
+
+    If a :class:`ConnectionPool` is given, the connection is checked out of the pool
+    on entering the ``with`` block and given back on exit, instead of opening and closing
+    a new connection every time.
+
     Returns:
         MowerDatabase: database object
     """
@@ -21,21 +196,57 @@ class MowerDatabase:
     passwd: str = None
     db: str = "mower"
     port: int = 3306
+    pool: "ConnectionPool" = field(default = None, repr = False)
+    coord_storage: str = "rows"
+
+    def __post_init__(self):
+        if self.coord_storage not in COORD_STORAGE_MODES:
+            raise ValueError("coord_storage must be one of %s" % ", ".join(COORD_STORAGE_MODES))
 
     def __enter__(self):
+        if self.pool is not None:
+            self.__connection = self.pool.acquire()
+        else:
+            self.__connection = self.connect()
+        return self
+
+    def __exit__(self, type, value, traceback):
+        if self.pool is not None:
+            self.pool.release(self.__connection, discard = isinstance(value, CONNECTION_ERRORS))
+        else:
+            self.__connection.close()
+
+    def connect(self):
+        """Opens a new connection to the database, building the database first if
+        it doesn't exist yet.
+
+        Returns:
+            pymysql.connections.Connection: A new connection
+        """
         if self.passwd is None:
             self.passwd = os.environ["MYSQL_ROOT_PASSWORD"]
-            
+
         try:
-            self.__connection = self.__get_connection()
+            connection = self.__get_connection()
         except Exception as e:
             print(e)
-            if e.args[0] == 1049:
-                self.__connection = self.__build_db()
-        return self
+            if e.args[0] != 1049:
+                raise
+            connection = self.__build_db()
 
-    def __exit__(self, type, value, traceback):
-        self.__connection.close()
+        self.__upgrade_db(connection)
+        return connection
+
+    def __upgrade_db(self, connection):
+        key = (self.host, self.port, self.db)
+        with _upgrade_lock:
+            if key in _upgraded_dbs:
+                return
+            with connection.cursor() as cursor:
+                for statement in SCHEMA_UPGRADES:
+                    cursor.execute(statement)
+            connection.commit()
+            _upgraded_dbs.add(key)
 
     def __get_connection(self):
         return pymysql.connect(
@@ -167,47 +378,69 @@ class MowerDatabase:
             email (str): The user's email
             fname (str): The user's first name
             sname (str): The user's surname
-            pw_hashed (str): The user's password, already hashed as SHA256
+            pw_hashed (str): The user's password, already hashed with :meth:`passwords.PasswordHasher.hash`
 
         Returns:
-            (str, datetime.datetime): A session id for this new user, with an expiration datetime (see :meth:`database.MowerDatabase.authenticate_user`)
+            (str, datetime.datetime): A session id for this new user, with an expiration datetime (see :meth:`database.MowerDatabase.create_session`)
         """
         with self.__connection.cursor() as cursor:
             cursor.execute("""
             INSERT INTO users (email, fname, sname, pw_hash)
             VALUES (%s, %s, %s, %s);
             """, (email, fname, sname, pw_hashed, ))
+            user_no = cursor.lastrowid
         self.__connection.commit()
 
-        return self.authenticate_user(email, pw_hashed)
+        return self.create_session(user_no)
 
-    def authenticate_user(self, email, pw_hashed, client_info = 'API Client'):
-        """Returns a new session id for a given username and password.
+    def get_password_hash(self, email):
+        """Returns a user's stored password hash, to be checked with :meth:`passwords.PasswordHasher.verify`.
+        Passwords are checked outside of the database so that they can be salted and slow to hash.
 
         Arguments:
             email (str): The user's email
-            pw_hashed (str): A user's password associated with that email, hashed as SHA256
 
         Raises:
-            UnauthenticatedUserException: If the username isn't found or the password is wrong
+            UnauthenticatedUserException: If the email isn't found
 
         Returns:
-            (str, datetime): A tuple consisting of a session id, and its associated expiry datetime
+            (int, str): The user's number and password hash
         """
         with self.__connection.cursor() as cursor:
-            cursor.execute("""
-            SELECT user_no FROM users WHERE email = %s AND pw_hash = %s;
-            """, (email, pw_hashed, ))
+            cursor.execute("SELECT user_no, pw_hash FROM users WHERE email = %s;", (email, ))
             try:
-                user_id = int(cursor.fetchone()[0])
+                user_no, pw_hash = cursor.fetchone()
             except:
                 raise UnauthenticatedUserException("User not found, or incorrect password")
 
-            session_id = secrets.token_hex(16)
-            expiration_dt = datetime.datetime.now() + SESSION_LENGTH
-            # print(session_id, expiration_dt)
+        return int(user_no), pw_hash
+
+    def set_password_hash(self, user_no, pw_hashed):
+        """Replaces a user's password hash, e.g. to upgrade an old style hash after a successful signin.
+
+        Arguments:
+            user_no (int): The user's number
+            pw_hashed (str): The new hash, from :meth:`passwords.PasswordHasher.hash`
+        """
+        with self.__connection.cursor() as cursor:
+            cursor.execute("UPDATE users SET pw_hash = %s WHERE user_no = %s;", (pw_hashed, user_no))
+        self.__connection.commit()
+
+    def create_session(self, user_no, client_info = 'API Client'):
+        """Returns a new session id for a user whose password has already been checked.
+
+        Arguments:
+            user_no (int): The user's number, e.g. from :meth:`get_password_hash`
+            client_info (str): A description of the client
+
+        Returns:
+            (str, datetime): A tuple consisting of a session id, and its associated expiry datetime
+        """
+        session_id = secrets.token_hex(16)
+        expiration_dt = datetime.datetime.now() + SESSION_LENGTH
+        with self.__connection.cursor() as cursor:
             cursor.execute("INSERT INTO sessions (cookie_bytes, user_no, expire_at, client_info) VALUES (%s, %s, %s, %s);",
-                (session_id, user_id, expiration_dt, client_info), 
+                (session_id, user_no, expiration_dt, client_info), 
             )
 
         self.__connection.commit()
@@ -225,151 +458,1256 @@ class MowerDatabase:
         Returns:
             models.User: An associated user model
         """
+        return self.get_session(session_id)[0]
+
+    def get_session(self, session_id):
+        """Like :meth:`authenticate_session`, but also returns when the session expires, so that
+        it can be cached for no longer than that (see :class:`sessions.SessionCache`).
+
+        Arguments:
+            session_id (str): A session id cookie
+
+        Raises:
+            InvalidSessionException: If the session isn't found in the database, or it has expired
+
+        Returns:
+            (models.User, datetime.datetime): The associated user model, and the session's expiry datetime
+        """
         with self.__connection.cursor() as cursor:
             cursor.execute("""
-            SELECT users.user_no, email, fname, sname FROM users WHERE user_no = (
-                SELECT user_no FROM sessions WHERE cookie_bytes = %s
-            );""", (session_id, ))
+            SELECT users.user_no, email, fname, sname, expire_at FROM users
+            INNER JOIN sessions ON sessions.user_no = users.user_no
+            WHERE cookie_bytes = %s AND expire_at > NOW();
+            """, (session_id, ))
             try:
-                id_, email, fname, sname = cursor.fetchone()
+                id_, email, fname, sname, expire_at = cursor.fetchone()
             except:
                 raise InvalidSessionException("The session id '%s' was not found in the database." % session_id)
 
-        return models.User(id_, email, fname, sname)
+        return models.User(id_, email, fname, sname), expire_at
+
+    def revoke_session(self, session_id):
+        """Deletes a session, so that the session id can't be used again. Any :class:`sessions.SessionCache`
+        holding it must be invalidated too.
+
+        Arguments:
+            session_id (str): A session id cookie
+        """
+        with self.__connection.cursor() as cursor:
+            cursor.execute("DELETE FROM sessions WHERE cookie_bytes = %s;", (session_id, ))
+        self.__connection.commit()
+
+    def delete_expired_sessions(self, limit = 500):
+        """Deletes up to ``limit`` expired sessions, oldest first, in its own short transaction.
+        Used by :class:`sessions.SessionSweeper`.
+
+        Arguments:
+            limit (int): The most sessions to delete
+
+        Returns:
+            int: The number of sessions deleted
+        """
+        with self.__connection.cursor() as cursor:
+            deleted = cursor.execute("DELETE FROM sessions WHERE expire_at <= NOW() ORDER BY expire_at LIMIT %s;", (limit, ))
+        self.__connection.commit()
+        return deleted
 
     def create_area(self, area: models.Area):
         """Append a given :class:`models.Area` to the database. A valid :class:`models.User` 
         must be set in the area object
 
+        All the vertices of the area and its no-go zones are written with a fixed number of
+        multi-row ``INSERT`` statements (see :func:`bulk_insert`), rather than two statements
+        per vertex. Everything happens in one transaction, so if anything fails no orphaned
+        ``coords`` rows are left behind.
+
         Arguments:
-            area (models.Area): An area to add
+            area (models.Area): An area to add, its ``id_`` is set once it has been added
+
+        Returns:
+            int: The owner's new area version (see :meth:`get_area_version`)
         """
-        with self.__connection.cursor() as cursor:
-            cursor.execute(
-                "INSERT INTO mower_areas (user_no, area_name, area_notes) VALUES (%s, %s, %s)", 
-                (area.owner.id_, area.name, area.notes)
-            )
-            area_id = cursor.lastrowid
-
-            for x, y, z in area.area_coords:
-                cursor.execute(
-                    """
-                    INSERT INTO coords (x, y, z)
-                    VALUES (%s, %s, %s)
-                    """,
-                    (str(x), str(y), str(z))
-                )
-                coord_id = cursor.lastrowid
-
-                cursor.execute(
-                    "INSERT INTO area_coords VALUES (%s, %s);",
-                    (coord_id, area_id)
-                )
-
-            for nogo_zone in area.nogo_zones:
-
-                cursor.execute(
-                    "INSERT INTO nogo_zones (area_id) VALUES (%s);",
-                    (area_id, )
-                )
-                nogo_id = cursor.lastrowid
-
-                for x, y, z in nogo_zone:
-                    cursor.execute(
-                        """
-                        INSERT INTO coords (x, y, z)
-                        VALUES (%s, %s, %s)
-                        """,
-                        (str(x), str(y), str(z))
-                    )
-                    coord_id = cursor.lastrowid
+        try:
+            with self.__connection.cursor() as cursor:
+                id_step = autoinc_step(cursor)
 
-                    cursor.execute(
-                        "INSERT INTO nogo_coords VALUES (%s, %s);",
-                        (coord_id, nogo_id)
-                    )
+                cursor.execute(INSERT_AREA_SQL, area_row(area))
+                area_id = cursor.lastrowid
+                version = bump_area_version(cursor, area.owner)
 
+                nogo_ids = bulk_insert(cursor, INSERT_NOGO_ZONES_SQL, nogo_zone_rows(area_id, area), id_step)
+                if self.coord_storage == "blob":
+                    inserts = geometry_inserts(area_id, area, nogo_ids)
+                else:
+                    coord_ids = bulk_insert(cursor, INSERT_COORDS_SQL, coord_rows(area), id_step)
+                    inserts = coord_link_inserts(area_id, area, nogo_ids, coord_ids)
+                for statement, rows in inserts:
+                    bulk_insert(cursor, statement, rows)
+        except:
+            self.__connection.rollback()
+            raise
 
         self.__connection.commit()
+        area.id_ = area_id
+        return version
+
+    def get_area_version(self, user: models.User):
+        """Returns a number which changes whenever any of a user's areas change, and when
+        they last changed, so that clients can tell if they are up to date without fetching any
+        coordinates. It is one primary key lookup. Anything that changes areas must call :func:`bump_area_version`.
+
+        Arguments:
+            user (models.User): A user to get the area version for
+
+        Returns:
+            (int, datetime.datetime): The version, and when it last changed, see :func:`area_version_of`. ``(0, None)`` if the user has never had any areas
+        """
+        with self.__connection.cursor() as cursor:
+            cursor.execute(AREA_VERSION_SQL, (user.id_, ))
+            row = cursor.fetchone()
+        return area_version_of(row)
 
     def get_areas(self, user: models.User):
         """Returns a list of all the :class:`models.Area` s associated with a given :class:`models.User`.
 
+        Everything is fetched in three queries however many areas and no-go zones the user has:
+        the areas, then all of their vertices, then all of their no-go zones' vertices. In ``"rows"``
+        storage mode vertices are returned in ``coord_id`` order, which is the order they were
+        inserted in by :meth:`create_area`.
+
         Arguments:
             user (models.User): A user to get the :class:`models.Area` s for
         """
         with self.__connection.cursor() as cursor:
-            cursor.execute("SELECT area_id, area_name, area_notes FROM mower_areas WHERE user_no = %s;", (user.id_, ))
+            cursor.execute("SELECT area_id, area_name, area_notes FROM mower_areas WHERE user_no = %s ORDER BY area_id;", (user.id_, ))
+            area_rows = cursor.fetchall()
+            area_coords, nogo_zones = self.__get_coords(
+                cursor, "mower_areas.user_no = %s", (user.id_, ), [area_id for area_id, _, _ in area_rows]
+            )
 
-            areas = []
-            for area_id, area_name, area_notes in cursor.fetchall():
-                cursor.execute("""
-                SELECT x, y, z FROM area_coords 
-                INNER JOIN coords ON coords.coord_id = area_coords.coord_id 
-                WHERE area_coords.area_id = %s;
-                """, (area_id, ))
-                coords = str_coords_to_float(cursor.fetchall())
-
-                nogo_zones = []
-                cursor.execute("SELECT nogo_id FROM nogo_zones WHERE area_id = %s;", (area_id, ))
-                for nogo_id in [i[0] for i in cursor.fetchall()]:
+        return [
+            models.Area(user, area_name, area_notes, area_coords.get(area_id, []), list(nogo_zones.get(area_id, {}).values()), area_id)
+            for area_id, area_name, area_notes in area_rows
+        ]
+
+    def get_area(self, user: models.User, area_id):
+        """Returns one of a user's areas, with all its coordinates, e.g. after finding it with :meth:`list_areas`.
+
+        Arguments:
+            user (models.User): The owner of the area
+            area_id (int): The area's id
+
+        Raises:
+            AreaNotFoundException: If the area doesn't exist, or belongs to someone else
+
+        Returns:
+            models.Area: The area
+        """
+        with self.__connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT area_name, area_notes FROM mower_areas WHERE area_id = %s AND user_no = %s;", (area_id, user.id_)
+            )
+            row = cursor.fetchone()
+            if row is None:
+                raise AreaNotFoundException("Area %s was not found" % area_id)
+            area_coords, nogo_zones = self.__get_coords(cursor, "mower_areas.area_id = %s", (area_id, ), [area_id])
+
+        return models.Area(user, row[0], row[1], area_coords.get(area_id, []), list(nogo_zones.get(area_id, {}).values()), area_id)
+
+    def list_areas(self, user: models.User, after = None, limit = 100):
+        """Lists a user's areas without any of their coordinates, a page at a time in ``area_id``
+        order. Each page is one query on the ``(user_no, area_id)`` index, however big the areas are,
+        since the vertex counts and bounding boxes are stored alongside each area by :meth:`create_area`.
+
+        Arguments:
+            user (models.User): A user to list the areas of
+            after (int): Only list areas after this one, i.e. the ``next`` cursor from the previous page. ``None`` for the first page
+            limit (int): The most areas to return, up to :data:`MAX_LIST_AREAS`
+
+        Returns:
+            (list, int): :class:`models.AreaSummary` s, and the cursor for the next page or ``None`` if this is the last
+        """
+        limit = max(1, min(limit, MAX_LIST_AREAS))
+        with self.__connection.cursor() as cursor:
+            # one extra row tells us if there is another page
+            cursor.execute("""
+            SELECT area_id, area_name, area_notes, vertex_count, nogo_count, min_x, min_z, max_x, max_z
+            FROM mower_areas WHERE user_no = %s AND area_id > %s
+            ORDER BY area_id LIMIT %s;
+            """, (user.id_, -1 if after is None else after, limit + 1))
+            rows = list(cursor.fetchall())
+
+        more = len(rows) > limit
+        rows = rows[:limit]
+        missing = [row[0] for row in rows if row[3] is None]
+        if missing:
+            summaries = self.__fill_area_summaries(missing)
+            rows = [row[:3] + summaries[row[0]] if row[0] in summaries else row for row in rows]
+
+        return [
+            models.AreaSummary(area_id, area_name, area_notes, vertex_count, nogo_count, None if min_x is None else [min_x, min_z, max_x, max_z])
+            for area_id, area_name, area_notes, vertex_count, nogo_count, min_x, min_z, max_x, max_z in rows
+        ], rows[-1][0] if more else None
+
+    def __fill_area_summaries(self, area_ids):
+        # areas created before mower_areas had summary columns get them filled in the first time they are listed
+        try:
+            with self.__connection.cursor() as cursor:
+                area_coords, nogo_zones = self.__get_coords(cursor, "mower_areas.area_id IN %s", (area_ids, ), area_ids)
+                summaries = {
+                    area_id: area_summary(area_coords.get(area_id, []), list(nogo_zones.get(area_id, {}).values()))
+                    for area_id in area_ids
+                }
+                for area_id, summary in summaries.items():
                     cursor.execute("""
-                    SELECT x, y, z FROM nogo_coords 
-                    INNER JOIN coords ON nogo_coords.coord_id = coords.coord_id 
-                    WHERE nogo_id = %s;
-                    """, (nogo_id, ))
-                    nogo_zones.append(str_coords_to_float(cursor.fetchall()))
+                    UPDATE mower_areas SET vertex_count = %s, nogo_count = %s, min_x = %s, min_z = %s, max_x = %s, max_z = %s
+                    WHERE area_id = %s;
+                    """, summary + (area_id, ))
+        except:
+            self.__connection.rollback()
+            raise
+        self.__connection.commit()
+        return summaries
+
+    def migrate_coords_to_blobs(self, delete_rows = False, batch_size = 100):
+        """Copies the vertices of every area that is still stored as ``coords`` rows into
+        the ``area_geometry`` and ``nogo_geometry`` blob tables, so that it can be read in ``"blob"``
+        storage mode without falling back to the old tables. Each batch of areas is migrated in
+        its own transaction, and it is safe to run again if it is interrupted.
+
+        Arguments:
+            delete_rows (bool): Also delete the migrated ``coords``, ``area_coords`` and ``nogo_coords`` rows
+            batch_size (int): How many areas to migrate per transaction
+
+        Returns:
+            int: The number of areas migrated
+        """
+        with self.__connection.cursor() as cursor:
+            cursor.execute("""
+            SELECT area_id FROM mower_areas
+            WHERE area_id NOT IN (SELECT area_id FROM area_geometry)
+            ORDER BY area_id;
+            """)
+            area_ids = [i[0] for i in cursor.fetchall()]
+
+        for i in range(0, len(area_ids), batch_size):
+            batch = area_ids[i:i + batch_size]
+            try:
+                with self.__connection.cursor() as cursor:
+                    area_coords, nogo_zones = self.__get_coord_rows(cursor, "mower_areas.area_id IN %s", (batch, ))
+                    bulk_insert(
+                        cursor, "INSERT INTO area_geometry (area_id, coords) VALUES",
+                        [(area_id, geometry.pack_coords(area_coords.get(area_id, []))) for area_id in batch]
+                    )
+                    bulk_insert(
+                        cursor, "INSERT INTO nogo_geometry (nogo_id, coords) VALUES",
+                        [(nogo_id, geometry.pack_coords(ring)) for zones in nogo_zones.values() for nogo_id, ring in zones.items()]
+                    )
+
+                    if delete_rows:
+                        cursor.execute("""
+                        SELECT coord_id FROM area_coords WHERE area_id IN %s
+                        UNION ALL
+                        SELECT coord_id FROM nogo_coords
+                        INNER JOIN nogo_zones ON nogo_zones.nogo_id = nogo_coords.nogo_id
+                        WHERE nogo_zones.area_id IN %s;
+                        """, (batch, batch))
+                        coord_ids = [j[0] for j in cursor.fetchall()]
+                        cursor.execute("DELETE FROM area_coords WHERE area_id IN %s;", (batch, ))
+                        cursor.execute("""
+                        DELETE nogo_coords FROM nogo_coords
+                        INNER JOIN nogo_zones ON nogo_zones.nogo_id = nogo_coords.nogo_id
+                        WHERE nogo_zones.area_id IN %s;
+                        """, (batch, ))
+                        for j in range(0, len(coord_ids), BULK_INSERT_ROWS):
+                            cursor.execute("DELETE FROM coords WHERE coord_id IN %s;", (coord_ids[j:j + BULK_INSERT_ROWS], ))
+            except:
+                self.__connection.rollback()
+                raise
+            self.__connection.commit()
+
+        return len(area_ids)
+
+    def __get_coords(self, cursor, where, args, area_ids):
+        # the coordinates of the areas with area_ids, which the WHERE clause selects, however they are stored
+        if self.coord_storage != "blob":
+            return self.__get_coord_rows(cursor, where, args)
+
+        area_coords, nogo_zones = self.__get_coord_blobs(cursor, where, args)
+        # areas written before switching to blob storage, which haven't been migrated yet
+        unmigrated = [area_id for area_id in area_ids if area_id not in area_coords]
+        if unmigrated:
+            old_area_coords, old_nogo_zones = self.__get_coord_rows(cursor, "mower_areas.area_id IN %s", (unmigrated, ))
+            area_coords.update(old_area_coords)
+            nogo_zones.update(old_nogo_zones)
+        return area_coords, nogo_zones
+
+    def __get_coord_rows(self, cursor, where, args):
+        cursor.execute(AREA_COORD_ROWS_SQL % where, args)
+        coord_rows = cursor.fetchall()
+        cursor.execute(NOGO_COORD_ROWS_SQL % where, args)
+        return group_coord_rows(coord_rows, cursor.fetchall())
 
-                areas.append(models.Area(user, area_name, area_notes, coords, nogo_zones))
+    def __get_coord_blobs(self, cursor, where, args):
+        cursor.execute(AREA_COORD_BLOBS_SQL % where, args)
+        blob_rows = cursor.fetchall()
+        cursor.execute(NOGO_COORD_BLOBS_SQL % where, args)
+        return group_coord_blobs(blob_rows, cursor.fetchall())
 
-                # print(area_id, area_name, area_notes)
-                # print(coords)
-                # print(nogo_zones)
+    def iter_areas(self, user: models.User):
+        """Like :meth:`get_areas`, but yields the :class:`models.Area` s one at a time as their vertices
+        are read, using an unbuffered cursor. Only one area's vertices are held in memory at once,
+        however many areas the user has. The areas are yielded in the same order as :meth:`get_areas`,
+        except that in ``"blob"`` storage mode areas which haven't been migrated yet come last.
 
-                # break
-        
-        return areas
+        No other queries can be run on this :class:`MowerDatabase` until the generator is finished or closed.
+
+        Arguments:
+            user (models.User): A user to get the :class:`models.Area` s for
+
+        Yields:
+            models.Area: The user's areas
+        """
+        with self.__connection.cursor() as cursor:
+            cursor.execute("""
+            SELECT mower_areas.area_id, area_name, area_notes, area_geometry.area_id IS NULL FROM mower_areas
+            LEFT JOIN area_geometry ON area_geometry.area_id = mower_areas.area_id
+            WHERE user_no = %s ORDER BY mower_areas.area_id;
+            """, (user.id_, ))
+            area_rows = cursor.fetchall()
+
+        unmigrated = []
+        if self.coord_storage == "blob":
+            unmigrated = [row for row in area_rows if row[3]]
+            area_rows = [row for row in area_rows if not row[3]]
+            # the boundary is ring 0, no-go zones are their nogo_id
+            query = """
+            SELECT area_geometry.area_id, 0 AS ring, coords FROM mower_areas
+            INNER JOIN area_geometry ON area_geometry.area_id = mower_areas.area_id
+            WHERE mower_areas.user_no = %s
+            UNION ALL
+            SELECT nogo_zones.area_id, nogo_zones.nogo_id, coords FROM mower_areas
+            INNER JOIN nogo_zones ON nogo_zones.area_id = mower_areas.area_id
+            INNER JOIN nogo_geometry ON nogo_geometry.nogo_id = nogo_zones.nogo_id
+            WHERE mower_areas.user_no = %s
+            ORDER BY area_id, ring;
+            """
+        else:
+            query = """
+            SELECT area_coords.area_id, 0 AS ring, area_coords.coord_id, x, y, z FROM mower_areas
+            INNER JOIN area_coords ON area_coords.area_id = mower_areas.area_id
+            INNER JOIN coords ON coords.coord_id = area_coords.coord_id
+            WHERE mower_areas.user_no = %s
+            UNION ALL
+            SELECT nogo_zones.area_id, nogo_zones.nogo_id, nogo_coords.coord_id, x, y, z FROM mower_areas
+            INNER JOIN nogo_zones ON nogo_zones.area_id = mower_areas.area_id
+            LEFT JOIN nogo_coords ON nogo_coords.nogo_id = nogo_zones.nogo_id
+            LEFT JOIN coords ON coords.coord_id = nogo_coords.coord_id
+            WHERE mower_areas.user_no = %s
+            ORDER BY area_id, ring, coord_id;
+            """
+
+        areas = iter(area_rows)
+        current, rings = None, {}
+        with self.__connection.cursor(pymysql.cursors.SSCursor) as cursor:
+            cursor.execute(query, (user.id_, user.id_))
+            for row in cursor:
+                area_id, ring = row[0], row[1]
+                if current is None or area_id != current[0]:
+                    if current is not None:
+                        yield self.__ring_area(user, current, rings)
+                    # areas with no vertices at all don't turn up in the query
+                    for current in areas:
+                        if current[0] == area_id:
+                            break
+                        yield self.__ring_area(user, current, {})
+                    rings = {}
+
+                if self.coord_storage == "blob":
+                    rings[ring] = geometry.unpack_coords(row[2])
+                else:
+                    coords = rings.setdefault(ring, [])
+                    if row[3] is not None:
+                        coords.append([float(row[3]), float(row[4]), float(row[5])])
+
+        if current is not None:
+            yield self.__ring_area(user, current, rings)
+        for current in areas:
+            yield self.__ring_area(user, current, {})
+
+        for i in range(0, len(unmigrated), 100):
+            batch = unmigrated[i:i + 100]
+            with self.__connection.cursor() as cursor:
+                area_coords, nogo_zones = self.__get_coord_rows(cursor, "mower_areas.area_id IN %s", ([row[0] for row in batch], ))
+            for area_id, area_name, area_notes, _ in batch:
+                yield models.Area(user, area_name, area_notes, area_coords.get(area_id, []), list(nogo_zones.get(area_id, {}).values()), area_id)
+
+    def __ring_area(self, user, area_row, rings):
+        # builds an area from {0: boundary, nogo_id: no-go zone} rings, as from iter_areas
+        boundary = rings.pop(0, [])
+        return models.Area(user, area_row[1], area_row[2], boundary, [rings[nogo_id] for nogo_id in sorted(rings)], area_row[0])
 
     def append_mowers(self, user: models.User, iqn: str, vpn_ip: str):
         with self.__connection.cursor() as cursor:
             cursor.execute("INSERT INTO mowers VALUES (%s, %s, %s);", (iqn, vpn_ip, user.id_))
         self.__connection.commit()
 
+    def get_mowers(self):
+        """Lists every registered mower and its address on the VPN, e.g. for :mod:`collector` to connect to.
+
+        Returns:
+            list: ``(iqn, vpn_ip)`` tuples
+        """
+        with self.__connection.cursor() as cursor:
+            cursor.execute("SELECT iqn, vpn_ip FROM mowers ORDER BY iqn;")
+            return list(cursor.fetchall())
+
+    def get_mower_owners(self, iqns):
+        """Looks up who owns some mowers.
+
+        Arguments:
+            iqns (list): Mowers' iqns
+
+        Returns:
+            dict: iqn to owner :class:`models.User`, without mowers which aren't in the database
+        """
+        if not iqns:
+            return {}
+        with self.__connection.cursor() as cursor:
+            cursor.execute("""
+            SELECT iqn, users.user_no, email, fname, sname FROM mowers
+            INNER JOIN users ON users.user_no = mowers.owner
+            WHERE iqn IN %s;
+            """, (list(iqns), ))
+            return {iqn: models.User(user_no, email, fname, sname) for iqn, user_no, email, fname, sname in cursor.fetchall()}
+
+    def get_area_versions(self, user_nos):
+        """Like :meth:`get_area_version` for many users at once, e.g. to check if cached areas are out of date.
+
+        Arguments:
+            user_nos (list): Users' numbers
+
+        Returns:
+            dict: User number to area version, ``0`` for users who have never had any areas
+        """
+        if not user_nos:
+            return {}
+        versions = {user_no: 0 for user_no in user_nos}
+        with self.__connection.cursor() as cursor:
+            cursor.execute("SELECT user_no, version FROM area_versions WHERE user_no IN %s;", (list(user_nos), ))
+            versions.update({user_no: int(version) for user_no, version in cursor.fetchall()})
+        return versions
+
+    def append_geofence_violations(self, violations):
+        """Records mowers entering no-go zones, from :class:`geofence.Geofence`. Violations which
+        are already recorded are skipped.
+
+        Arguments:
+            violations (list): A list of ``(iqn, timestamp, area_id, x, y, z)`` tuples
+        """
+        try:
+            with self.__connection.cursor() as cursor:
+                bulk_insert(cursor, "INSERT IGNORE INTO geofence_violations (mower, entered_at, area_id, x, y, z) VALUES", violations)
+        except:
+            self.__connection.rollback()
+            raise
+        self.__connection.commit()
+
     def get_nmea_logfile(self, iqn: str, basedir: str, max_age: int = 60):
+        """Returns the path of a mower's current NMEA log file, which is the most recently updated one if
+        it was updated in the last ``max_age`` seconds. Otherwise a new one is started with :meth:`create_nmea_logfile`.
+
+        The lookup is a range scan on the ``(mower, last_updated)`` index which reads at most one row,
+        so it costs the same however many old log files the mower has.
+
+        Arguments:
+            iqn (str): The mower's iqn
+            basedir (str): The directory to put a new log file in
+            max_age (int): How recently the current log file must have been updated, in seconds
+
+        Returns:
+            str: The path of the log file
+        """
         with self.__connection.cursor() as cursor:
-            cursor.execute("SELECT path FROM nmea_logs WHERE TIMESTAMPDIFF(SECOND, last_updated, NOW()) <= %s;", (max_age, ))
+            cursor.execute("""
+            SELECT path FROM nmea_logs
+            WHERE mower = %s AND last_updated >= NOW() - INTERVAL %s SECOND
+            ORDER BY last_updated DESC LIMIT 1;
+            """, (iqn, max_age))
             o = cursor.fetchone()
             if o is not None:
                 return o[0]
 
+        return self.create_nmea_logfile(iqn, basedir)
+
+    def create_nmea_logfile(self, iqn: str, basedir: str):
+        """Start a new NMEA log file for a mower, and record it in ``nmea_logs``.
+
+        Arguments:
+            iqn (str): The mower's iqn
+            basedir (str): The directory to put the log file in
+
+        Returns:
+            str: The path of the new log file
+        """
+        with self.__connection.cursor() as cursor:
             now = datetime.datetime.now()
             nmea_path = os.path.join(basedir, "%s_%s.nmea" % (iqn, now.isoformat()))
             cursor.execute("INSERT INTO nmea_logs (mower, created_at, path) VALUES (%s, %s, %s);", (iqn, now, nmea_path))
         self.__connection.commit()
         return nmea_path
 
+    def touch_nmea_logfile(self, path: str, last_updated = None):
+        """Set a NMEA log file's ``last_updated``.
+
+        Arguments:
+            path (str): The log file's path, as in ``nmea_logs``
+            last_updated (datetime.datetime): When it was last written to. Defaults to now
+        """
+        with self.__connection.cursor() as cursor:
+            if last_updated is None:
+                cursor.execute("UPDATE nmea_logs SET last_updated = NOW() WHERE path = %s;", (path, ))
+            else:
+                cursor.execute("UPDATE nmea_logs SET last_updated = %s WHERE path = %s;", (last_updated, path))
+        self.__connection.commit()
+
+    def get_nmea_logs(self, iqn: str = None, since = None, until = None):
+        """Lists NMEA log files from ``nmea_logs``, e.g. to parse them back into telemetry with :mod:`backfill`.
+
+        Arguments:
+            iqn (str): Only this mower's log files
+            since (datetime.datetime): Only log files last updated at or after this
+            until (datetime.datetime): Only log files created before this
+
+        Returns:
+            list: ``(iqn, created_at, last_updated, path)`` tuples, oldest first
+        """
+        where, args = [], []
+        if iqn is not None:
+            where.append("mower = %s")
+            args.append(iqn)
+        if since is not None:
+            where.append("last_updated >= %s")
+            args.append(since)
+        if until is not None:
+            where.append("created_at < %s")
+            args.append(until)
+        with self.__connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT mower, created_at, last_updated, path FROM nmea_logs %s ORDER BY created_at, mower;" % (
+                    "WHERE " + " AND ".join(where) if where else ""
+                ), args
+            )
+            return list(cursor.fetchall())
+
+    def get_closed_nmea_logs(self, max_age: int, limit = 100):
+        """Lists NMEA log files which haven't been written to for ``max_age`` seconds, so are
+        finished with, and haven't been compressed yet, e.g. for :class:`logarchive.NMEALogArchiver`.
+
+        Arguments:
+            max_age (int): How long since a log file was last updated, in seconds
+            limit (int): The most log files to return
+
+        Returns:
+            list: ``(iqn, created_at, last_updated, path)`` tuples, oldest first
+        """
+        with self.__connection.cursor() as cursor:
+            cursor.execute("""
+            SELECT mower, created_at, last_updated, path FROM nmea_logs
+            WHERE last_updated < NOW() - INTERVAL %s SECOND AND path NOT LIKE '%%.gz'
+            ORDER BY last_updated LIMIT %s;
+            """, (max_age, limit))
+            return list(cursor.fetchall())
+
+    def set_nmea_logfile_path(self, path: str, new_path: str):
+        """Point a NMEA log file's row in ``nmea_logs`` at a new path, e.g. once it has been compressed.
+
+        Arguments:
+            path (str): The log file's path, as in ``nmea_logs``
+            new_path (str): Its new path
+
+        Returns:
+            bool: ``True`` if the log file was found
+        """
+        with self.__connection.cursor() as cursor:
+            found = cursor.execute("UPDATE nmea_logs SET path = %s WHERE path = %s;", (new_path, path))
+        self.__connection.commit()
+        return found > 0
+
+    def get_telemetry_seconds(self, iqn: str, start, end):
+        """Finds which seconds of a window already have telemetry, e.g. so that :mod:`backfill` only
+        fills in the gaps.
+
+        Arguments:
+            iqn (str): The mower's iqn
+            start (datetime.datetime): The start of the window, inclusive
+            end (datetime.datetime): The end of the window, inclusive
+
+        Returns:
+            set: The ``datetime.datetime`` s, rounded down to whole seconds, of the seconds with at least one fix
+        """
+        with self.__connection.cursor() as cursor:
+            cursor.execute("""
+            SELECT DISTINCT CAST(recv_at AS DATETIME(0)) FROM telemetry_points
+            WHERE mower = %s AND recv_at >= %s AND recv_at <= %s;
+            """, (iqn, start, end))
+            return {row[0] for row in cursor.fetchall()}
+
     def append_nmea_logfile(self, sentence, iqn: str, basedir: str, max_age: int = 60):
         path = self.get_nmea_logfile(iqn, basedir, max_age)
         with open(path, "ab") as f:
             f.write(sentence)
 
+        self.touch_nmea_logfile(path)
+
+    def get_mower(self, user: models.User, iqn: str):
+        """Checks that a mower exists and belongs to a user, e.g. before showing them its telemetry.
+
+        Arguments:
+            user (models.User): The user
+            iqn (str): The mower's iqn
+
+        Raises:
+            MowerNotFoundException: If the mower doesn't exist, or belongs to someone else
+        """
         with self.__connection.cursor() as cursor:
-            cursor.execute("UPDATE nmea_logs SET last_updated = NOW() WHERE path = %s;", (path, ))
-        self.__connection.commit()
+            cursor.execute("SELECT 1 FROM mowers WHERE iqn = %s AND owner = %s;", (iqn, user.id_))
+            if cursor.fetchone() is None:
+                raise MowerNotFoundException("Mower '%s' was not found" % iqn)
+
+    def iter_telemetry(self, iqn: str, start, end, bucket_seconds = 0):
+        """Yields a mower's fixes between two times, oldest first, using an unbuffered cursor so
+        that however long the window is, only one fix is held in memory at once. The window is a
+        range scan of the ``(mower, recv_at)`` primary key, which only touches the partitions of
+        the days in the window.
+
+        Days whose ``telemetry_points`` partition has been dropped (see :class:`retention.TelemetryRetention`)
+        come from ``telemetry_minutes`` instead, so have at most one fix a minute.
+
+        If ``bucket_seconds`` is given, the window is split into buckets that long, and only
+        the first fix in each is returned. The buckets are picked out by the database, from the primary
+        key alone.
+
+        No other queries can be run on this :class:`MowerDatabase` until the generator is finished or closed.
+
+        Arguments:
+            iqn (str): The mower's iqn
+            start (datetime.datetime): The start of the window, inclusive
+            end (datetime.datetime): The end of the window, exclusive
+            bucket_seconds (float): The length of each bucket, in seconds, or ``0`` for every fix
+
+        Yields:
+            (datetime.datetime, float, float, float): When each fix was received, and its x, y and z coordinates
+        """
+        for query, args in telemetry_queries(iqn, start, end, bucket_seconds):
+            with self.__connection.cursor(pymysql.cursors.SSCursor) as cursor:
+                cursor.execute(query, args)
+                for recv_at, x, y, z in cursor:
+                    yield recv_at, x, y, z
 
     def append_telemetry(self, iqn: str, timestamp, x, y, z):
         with self.__connection.cursor() as cursor:
-            cursor.execute(
-                """
-                INSERT INTO coords (x, y, z)
-                VALUES (%s, %s, %s)
-                """,
-                (str(x), str(y), str(z))
-            )
-            coord_id = cursor.lastrowid
+            cursor.execute("INSERT IGNORE INTO telemetry_points VALUES (%s, %s, %s, %s, %s);", (iqn, timestamp, x, y, z))
+        self.__connection.commit()
+
+    def append_telemetry_many(self, fixes):
+        """Like :meth:`append_telemetry`, but writes a whole batch of fixes in one transaction with
+        a fixed number of multi-row statements. Used by :class:`ingest.TelemetryIngestQueue`.
+
+        ``telemetry_points.recv_at`` has millisecond resolution, and only the first fix per mower per
+        millisecond is kept, so writing the same fixes twice is harmless.
+
+        Arguments:
+            fixes (list): A list of ``(iqn, timestamp, x, y, z)`` tuples, in the order they were received
+
+        Returns:
+            int: The number of fixes written
+        """
+        written = 0
+        try:
+            with self.__connection.cursor() as cursor:
+                for query, args, _ in multirow_statements(
+                    "INSERT IGNORE INTO telemetry_points (mower, recv_at, x, y, z) VALUES", list(fixes)
+                ):
+                    written += cursor.execute(query, args)
+        except:
+            self.__connection.rollback()
+            raise
+
+        self.__connection.commit()
+        return written
+
+    def migrate_telemetry(self, batch_size = 5000):
+        """Copies fixes from the old ``telemetry`` table, with its coordinates in ``coords``, into
+        ``telemetry_points``. Each batch is copied in its own transaction, and it is safe to run
+        again if it is interrupted, or while fixes are still being written to the old table.
+
+        Arguments:
+            batch_size (int): How many fixes to copy per transaction
+
+        Returns:
+            int: The number of fixes copied
+        """
+        copied = 0
+        after = ("", datetime.datetime.min)
+        while True:
+            with self.__connection.cursor() as cursor:
+                cursor.execute("""
+                SELECT mower, recv_at, x, y, z FROM telemetry
+                INNER JOIN coords ON coords.coord_id = telemetry.coord
+                WHERE mower > %s OR (mower = %s AND recv_at > %s)
+                ORDER BY mower, recv_at LIMIT %s;
+                """, (after[0], *after, batch_size))
+                rows = cursor.fetchall()
+                if not rows:
+                    break
+                copied += self.append_telemetry_many([(iqn, recv_at, float(x), float(y), float(z)) for iqn, recv_at, x, y, z in rows])
+                after = rows[-1][:2]
+        return copied
+
+    def get_partitions(self, table):
+        """Lists the partitions of one of the tables split up by time, see :data:`PARTITIONED_TABLES`.
+
+        Arguments:
+            table (str): The table
 
-            cursor.execute("INSERT INTO telemetry VALUES (%s, %s, %s);", (iqn, timestamp, coord_id))
+        Returns:
+            list: ``(name, end)`` tuples, oldest first, where each partition holds the rows before its ``end``
+            and after the previous partition's. The last is the catch-all ``pmax`` partition, whose ``end`` is ``None``
+        """
+        check_partitioned(table)
+        with self.__connection.cursor() as cursor:
+            cursor.execute("""
+            SELECT PARTITION_NAME, PARTITION_DESCRIPTION FROM information_schema.PARTITIONS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+            ORDER BY PARTITION_ORDINAL_POSITION;
+            """, (table, ))
+            return [
+                (name, None if description == "MAXVALUE" else datetime.datetime.fromisoformat(description.strip("'")))
+                for name, description in cursor.fetchall()
+            ]
+
+    def add_partitions(self, table, ends):
+        """Splits new partitions off the oldest partition and the catch-all ``pmax`` partition, so
+        that rows are spread between partitions that can be dropped separately. Ends which fall
+        between existing partitions are ignored. Splitting a partition copies its rows, so it is
+        cheapest to add partitions before any rows arrive for them.
+
+        Arguments:
+            table (str): One of :data:`PARTITIONED_TABLES`
+            ends (list): The ``datetime.datetime`` each new partition ends at
+
+        Returns:
+            int: The number of partitions added
+        """
+        partitions = self.get_partitions(table)
+        bounded = [end for _, end in partitions if end is not None]
+        ends = sorted(set(ends))
+        # the first partition holds everything before its end, so older partitions are split off it
+        before = [end for end in ends if bounded and end < bounded[0]]
+        after = [end for end in ends if not bounded or end > bounded[-1]]
+
+        with self.__connection.cursor() as cursor:
+            if before:
+                first, first_end = partitions[0]
+                cursor.execute("ALTER TABLE %s REORGANIZE PARTITION %s INTO (%s);" % (
+                    table, first, partition_definitions(before + [first_end], last = first)
+                ))
+            if after:
+                cursor.execute("ALTER TABLE %s REORGANIZE PARTITION pmax INTO (%s);" % (
+                    table, partition_definitions(after + [None])
+                ))
+        return len(before) + len(after)
+
+    def drop_partitions(self, table, names):
+        """Drops partitions of a table split up by time, and all the rows in them. This takes
+        about as long however many rows they hold.
+
+        Arguments:
+            table (str): One of :data:`PARTITIONED_TABLES`
+            names (list): The partitions' names, from :meth:`get_partitions`
+        """
+        check_partitioned(table)
+        if not names:
+            return
+        if "pmax" in names:
+            raise ValueError("The catch-all partition can't be dropped")
+        with self.__connection.cursor() as cursor:
+            cursor.execute("ALTER TABLE %s DROP PARTITION %s;" % (table, ", ".join(check_partition_name(name) for name in names)))
+
+    def get_oldest(self, table):
+        """When the oldest row in one of the tables split up by time is from.
+
+        Arguments:
+            table (str): One of :data:`PARTITIONED_TABLES`
+
+        Returns:
+            datetime.datetime: The oldest row's time, or ``None`` if the table is empty
+        """
+        with self.__connection.cursor() as cursor:
+            cursor.execute("SELECT MIN(%s) FROM %s;" % (check_partitioned(table), table))
+            return cursor.fetchone()[0]
+
+    def rollup_telemetry(self, partition):
+        """Summarises a partition of ``telemetry_points`` into a row per mower per minute in
+        ``telemetry_minutes``, before the partition is dropped. Safe to run more than once.
+
+        Arguments:
+            partition (str): The partition's name, from :meth:`get_partitions`
+
+        Returns:
+            int: The number of minutes written
+        """
+        partition = check_partition_name(partition)
+        with self.__connection.cursor() as cursor:
+            # no arguments, so the % in the query is left alone
+            written = cursor.execute("""
+            INSERT IGNORE INTO telemetry_minutes (mower, first_at, fixes, x, y, z, min_x, min_z, max_x, max_z)
+            SELECT points.mower, points.recv_at, minutes.fixes, points.x, points.y, points.z,
+                minutes.min_x, minutes.min_z, minutes.max_x, minutes.max_z
+            FROM (
+                SELECT mower, MIN(recv_at) AS first_at, COUNT(*) AS fixes,
+                    MIN(x) AS min_x, MIN(z) AS min_z, MAX(x) AS max_x, MAX(z) AS max_z
+                FROM telemetry_points PARTITION (%s)
+                GROUP BY mower, FLOOR(UNIX_TIMESTAMP(recv_at) / 60)
+            ) AS minutes
+            INNER JOIN telemetry_points PARTITION (%s) AS points
+                ON points.mower = minutes.mower AND points.recv_at = minutes.first_at;
+            """ % (partition, partition))
         self.__connection.commit()
+        return written
+
+class ConnectionPool:
+    """Thread-safe, bounded pool of database connections, which is expected to live for the
+    whole process. Pass it to :class:`MowerDatabase` to borrow a connection for the length of
+    a ``with`` block:
+
+    .. code-block:: python
+
+        pool = database.ConnectionPool(size = 4, host = "db")
+        with database.MowerDatabase(pool = pool) as db:
+            db.authenticate_session(session_id)
+
+    At most ``size`` connections are ever open at once; if they are all checked out,
+    :meth:`acquire` waits up to ``timeout`` seconds for one to be given back. Connections that
+    have been sat idle are pinged on checkout, and connections older than ``recycle`` seconds
+    or that fail the ping are closed and replaced.
+
+    Arguments:
+        size (int): The maximum number of open connections. Should match the number of threads serving requests
+        recycle (int): Maximum age of a connection in seconds before it is replaced
+        timeout (int): How long to wait for a free connection before raising :class:`PoolExhaustedException`
+        ping_after (int): Connections idle for longer than this many seconds are health checked on checkout
+        **kwargs: Passed to :class:`MowerDatabase`, e.g. ``host``
+    """
+    def __init__(self, size = 4, recycle = 3600, timeout = 30, ping_after = 5, **kwargs):
+        self.size = size
+        self.recycle = recycle
+        self.timeout = timeout
+        self.ping_after = ping_after
+
+        self.__factory = MowerDatabase(**kwargs)
+        self.__slots = threading.BoundedSemaphore(size)
+        self.__lock = threading.Lock()
+        # (connection, time given back), most recently used on the right
+        self.__idle = collections.deque()
+        # connection -> time opened
+        self.__opened_at = {}
+
+    def acquire(self):
+        """Check out a connection, opening a new one if there isn't a healthy idle one.
+        Must be given back with :meth:`release`.
+
+        Raises:
+            PoolExhaustedException: If no connection became free within ``timeout`` seconds
+
+        Returns:
+            pymysql.connections.Connection: A connection
+        """
+        if not self.__slots.acquire(timeout = self.timeout):
+            raise PoolExhaustedException("No database connection became free in %d seconds" % self.timeout)
+
+        try:
+            while True:
+                with self.__lock:
+                    if not self.__idle:
+                        break
+                    connection, released_at = self.__idle.pop()
+
+                if self.__is_healthy(connection, released_at):
+                    return connection
+                self.__close(connection)
+
+            connection = self.__factory.connect()
+            with self.__lock:
+                self.__opened_at[connection] = time.monotonic()
+            return connection
+        except:
+            self.__slots.release()
+            raise
+
+    def release(self, connection, discard = False):
+        """Give a connection back to the pool. Any uncommitted transaction is rolled back.
+
+        Arguments:
+            connection (pymysql.connections.Connection): A connection from :meth:`acquire`
+            discard (bool): Close the connection instead of reusing it, e.g. after a connection error
+        """
+        try:
+            if not discard and connection.server_status & SERVER_STATUS.SERVER_STATUS_IN_TRANS:
+                try:
+                    connection.rollback()
+                except Exception:
+                    discard = True
+
+            if discard or not connection.open:
+                self.__close(connection)
+            else:
+                with self.__lock:
+                    self.__idle.append((connection, time.monotonic()))
+        finally:
+            self.__slots.release()
+
+    def close(self):
+        """Close all the idle connections. Checked out connections are closed when they're given back."""
+        with self.__lock:
+            idle = [connection for connection, _ in self.__idle]
+            self.__idle.clear()
+        for connection in idle:
+            self.__close(connection)
+
+    def __is_healthy(self, connection, released_at):
+        now = time.monotonic()
+        if now - self.__opened_at.get(connection, now) > self.recycle:
+            return False
+        if now - released_at > self.ping_after:
+            try:
+                connection.ping(reconnect = False)
+            except Exception:
+                return False
+        return True
+
+    def __close(self, connection):
+        with self.__lock:
+            self.__opened_at.pop(connection, None)
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+def coord_storage_from_env():
+    """The coordinate storage mode set by ``MOWER_COORD_STORAGE`` in ``db.env``, for every process
+    which reads areas, so they all agree on where to find them.
+
+    Returns:
+        str: One of :data:`COORD_STORAGE_MODES`, ``"rows"`` by default
+    """
+    return os.environ.get("MOWER_COORD_STORAGE", "rows")
+
+def bump_area_version(cursor, user):
+    """Changes a user's area version (see :meth:`MowerDatabase.get_area_version`). Must be called in the same
+    transaction as anything that changes one of their areas.
+
+    Arguments:
+        cursor (pymysql.cursors.Cursor): The cursor the area is being changed with
+        user (models.User): The owner of the area
+
+    Returns:
+        int: The new version. The row stays locked until the transaction ends, so no one else can have changed it since
+    """
+    cursor.execute(BUMP_AREA_VERSION_SQL, (user.id_, ))
+    cursor.execute(SELECT_AREA_VERSION_SQL, (user.id_, ))
+    return int(cursor.fetchone()[0])
+
+def area_version_of(row):
+    """The area version and when it changed, from a row of :data:`AREA_VERSION_SQL`. The time is
+    only to the second, so it is left out until that second is over by the database's clock, as
+    until then it can't tell a client which has seen it apart from a later change in the same second.
+
+    Arguments:
+        row (tuple): The row, or ``None`` if there wasn't one
+
+    Returns:
+        (int, datetime.datetime): The version, and when it changed as a UTC datetime or ``None``. ``(0, None)`` if there is no row
+    """
+    if row is None:
+        return 0, None
+    version, updated_at, settled = row
+    return int(version), datetime.datetime.fromtimestamp(int(updated_at), datetime.timezone.utc) if settled else None
+
+def telemetry_queries(iqn, start, end, bucket_seconds = 0):
+    """The queries for :meth:`MowerDatabase.iter_telemetry`, which each select ``recv_at, x, y, z``.
+    The first is of ``telemetry_minutes``, for the time before the mower's oldest fix in ``telemetry_points``,
+    and the second of ``telemetry_points``, so running them in turn gives the fixes in order.
+
+    Returns:
+        list: ``(query, arguments)`` tuples
+    """
+    oldest = "(SELECT COALESCE(MIN(recv_at), '9999-12-31') FROM telemetry_points WHERE mower = %s)"
+    if not bucket_seconds:
+        return [
+            ("""
+            SELECT first_at, x, y, z FROM telemetry_minutes
+            WHERE mower = %%s AND first_at >= %%s AND first_at < LEAST(%%s, %s)
+            ORDER BY first_at;
+            """ % oldest, (iqn, start, end, iqn)),
+            ("""
+            SELECT recv_at, x, y, z FROM telemetry_points
+            WHERE mower = %s AND recv_at >= %s AND recv_at < %s
+            ORDER BY recv_at;
+            """, (iqn, start, end))
+        ]
+
+    # only the first fix in each bucket is joined back to its row
+    return [
+        ("""
+        SELECT first_at, x, y, z FROM telemetry_minutes
+        INNER JOIN (
+            SELECT MIN(first_at) AS bucket_at FROM telemetry_minutes
+            WHERE mower = %%s AND first_at >= %%s AND first_at < LEAST(%%s, %s)
+            GROUP BY FLOOR(UNIX_TIMESTAMP(first_at) / %%s)
+        ) AS buckets ON buckets.bucket_at = telemetry_minutes.first_at
+        WHERE mower = %%s
+        ORDER BY first_at;
+        """ % oldest, (iqn, start, end, iqn, bucket_seconds, iqn)),
+        ("""
+        SELECT recv_at, x, y, z FROM telemetry_points
+        INNER JOIN (
+            SELECT MIN(recv_at) AS bucket_at FROM telemetry_points
+            WHERE mower = %s AND recv_at >= %s AND recv_at < %s
+            GROUP BY FLOOR(UNIX_TIMESTAMP(recv_at) / %s)
+        ) AS buckets ON buckets.bucket_at = telemetry_points.recv_at
+        WHERE mower = %s
+        ORDER BY recv_at;
+        """, (iqn, start, end, bucket_seconds, iqn))
+    ]
+
+def check_partitioned(table):
+    # table names can't be query arguments, so only ever format in known ones
+    if table not in PARTITIONED_TABLES:
+        raise ValueError("%s isn't split into partitions" % table)
+    return PARTITIONED_TABLES[table]
+
+def check_partition_name(name):
+    if not (name == "pmax" or (len(name) == 9 and name[0] == "p" and name[1:].isdigit())):
+        raise ValueError("%s isn't a partition name" % name)
+    return name
+
+def partition_name(end):
+    """The name of the partition holding rows before ``end``, e.g. ``p20230315``."""
+    return end.strftime("p%Y%m%d")
+
+def partition_definitions(ends, last = "pmax"):
+    # the PARTITION clauses for REORGANIZE PARTITION, the last of which takes the name of the
+    # partition being split, as it holds the same rows as the last part of it
+    definitions = []
+    for i, end in enumerate(ends):
+        name = last if i == len(ends) - 1 else partition_name(end)
+        bound = "MAXVALUE" if end is None else "'%s'" % end.strftime("%Y-%m-%d %H:%M:%S")
+        definitions.append("PARTITION %s VALUES LESS THAN (%s)" % (name, bound))
+    return ", ".join(definitions)
+
+def area_summary(area_coords, nogo_zones):
+    """The summary :meth:`MowerDatabase.list_areas` shows of an area, as stored in ``mower_areas``.
+
+    Arguments:
+        area_coords (list): The area's boundary
+        nogo_zones (list): The area's no-go zones
+
+    Returns:
+        tuple: ``(vertex_count, nogo_count, min_x, min_z, max_x, max_z)``
+    """
+    vertex_count = len(area_coords) + sum(len(nogo_zone) for nogo_zone in nogo_zones)
+    return (vertex_count, len(nogo_zones)) + geometry.bounding_box(area_coords)
+
+def area_row(area):
+    """The arguments of :data:`INSERT_AREA_SQL` for an area.
+
+    Arguments:
+        area (models.Area): The area, with its owner set
+
+    Returns:
+        tuple: ``(user_no, area_name, area_notes)`` followed by its :func:`area_summary`
+    """
+    return (area.owner.id_, area.name, area.notes) + area_summary(area.area_coords, area.nogo_zones)
+
+def nogo_zone_rows(area_id, area):
+    """The rows of :data:`INSERT_NOGO_ZONES_SQL` for an area's no-go zones.
+
+    Arguments:
+        area_id (int): The area's new id
+        area (models.Area): The area
+
+    Returns:
+        list: One ``(area_id, )`` row per no-go zone, in order
+    """
+    return [(area_id, ) for _ in area.nogo_zones]
+
+def geometry_inserts(area_id, area, nogo_ids):
+    """The inserts for an area's coordinates in ``"blob"`` storage, once its no-go zones have ids.
+
+    Arguments:
+        area_id (int): The area's new id
+        area (models.Area): The area
+        nogo_ids (list): The new id of each of its no-go zones, in order
+
+    Returns:
+        list: ``(statement, rows)`` pairs for :func:`bulk_insert`
+    """
+    return [
+        ("INSERT INTO area_geometry (area_id, coords) VALUES", [(area_id, geometry.pack_coords(area.area_coords))]),
+        ("INSERT INTO nogo_geometry (nogo_id, coords) VALUES", [(nogo_id, geometry.pack_coords(nogo_zone)) for nogo_id, nogo_zone in zip(nogo_ids, area.nogo_zones)])
+    ]
+
+def coord_rows(area):
+    """The rows of :data:`INSERT_COORDS_SQL` for an area's coordinates in ``"rows"`` storage. The
+    area's vertices come first, then each no-go zone's, so that ``coord_id`` order is also the
+    vertex order.
+
+    Arguments:
+        area (models.Area): The area
+
+    Returns:
+        list: ``(x, y, z)`` rows, as strings for the ``VARCHAR(20)`` columns
+    """
+    rings = [area.area_coords] + list(area.nogo_zones)
+    return [(str(x), str(y), str(z)) for ring in rings for x, y, z in ring]
+
+def coord_link_inserts(area_id, area, nogo_ids, coord_ids):
+    """The inserts linking an area and its no-go zones to their ``coords`` rows, in ``"rows"`` storage.
+
+    Arguments:
+        area_id (int): The area's new id
+        area (models.Area): The area
+        nogo_ids (list): The new id of each of its no-go zones, in order
+        coord_ids (list): The ids of the rows inserted from :func:`coord_rows`, in order
+
+    Returns:
+        list: ``(statement, rows)`` pairs for :func:`bulk_insert`
+    """
+    coord_ids = iter(coord_ids)
+    return [
+        ("INSERT INTO area_coords (coord_id, area_id) VALUES", [(next(coord_ids), area_id) for _ in area.area_coords]),
+        ("INSERT INTO nogo_coords (coord_id, nogo_id) VALUES", [(next(coord_ids), nogo_id) for nogo_id, nogo_zone in zip(nogo_ids, area.nogo_zones) for _ in nogo_zone])
+    ]
+
+def autoinc_step(cursor):
+    """Finds out how the ``AUTO_INCREMENT`` ids of a multi-row ``INSERT`` can be worked out from the
+    first one. They are consecutive (every ``auto_increment_increment``) in the default InnoDB
+    lock modes, but not in 'interleaved' mode (``innodb_autoinc_lock_mode = 2``).
+
+    Arguments:
+        cursor (pymysql.cursors.Cursor): A cursor to run the check on
+
+    Returns:
+        int: The step between ids, or ``0`` if they can't be relied on to be consecutive
+    """
+    cursor.execute(AUTOINC_STEP_SQL)
+    return autoinc_step_of(*cursor.fetchone())
+
+def autoinc_step_of(lock_mode, increment):
+    """The step :func:`autoinc_step` returns, from the result of :data:`AUTOINC_STEP_SQL`.
+
+    Arguments:
+        lock_mode (int): ``@@innodb_autoinc_lock_mode``
+        increment (int): ``@@auto_increment_increment``
+
+    Returns:
+        int: The step between ids, or ``0`` if they can't be relied on to be consecutive
+    """
+    return 0 if int(lock_mode) == 2 else int(increment)
+
+def bulk_insert(cursor, statement, rows, id_step = None, chunk_size = BULK_INSERT_ROWS):
+    """Insert a lot of rows using multi-row ``INSERT`` statements of up to ``chunk_size`` rows each,
+    so a few thousand rows cost a couple of round trips instead of thousands.
+
+    Example usage:
+
+    .. code-block:: python
+
+        step = autoinc_step(cursor)
+        ids = bulk_insert(cursor, "INSERT INTO coords (x, y, z) VALUES", [("1.0", "2.0", "3.0"), ("4.0", "5.0", "6.0")], step)
+
+    Arguments:
+        cursor (pymysql.cursors.Cursor): The cursor to insert with. Nothing is committed
+        statement (str): The ``INSERT ... VALUES`` part of the statement, without any placeholders
+        rows (list): A list of tuples, one per row
+        id_step (int): If the ids of the new rows are wanted, the step from :func:`autoinc_step`. If this is ``0``, the rows are inserted one at a time so their ids are still known
+        chunk_size (int): The maximum number of rows in one statement
+
+    Returns:
+        list: The ``AUTO_INCREMENT`` id of each row in order, if ``id_step`` was given
+    """
+    if id_step == 0:
+        # one row at a time, so that lastrowid is each row's id
+        chunk_size, id_step = 1, 1
+
+    ids = []
+    for query, args, count in multirow_statements(statement, rows, chunk_size):
+        cursor.execute(query, args)
+        if id_step is not None:
+            # for a multi-row insert, lastrowid is the id of the *first* row
+            ids.extend(range(cursor.lastrowid, cursor.lastrowid + count * id_step, id_step))
+    return ids
+
+def multirow_statements(statement, rows, chunk_size = BULK_INSERT_ROWS):
+    """Splits rows into multi-row ``INSERT`` statements, for :func:`bulk_insert`.
+
+    Arguments:
+        statement (str): The ``INSERT ... VALUES`` part of the statement, without any placeholders
+        rows (list): A list of tuples, one per row
+        chunk_size (int): The maximum number of rows in one statement
+
+    Yields:
+        (str, list, int): A statement, its arguments, and the number of rows it inserts
+    """
+    if not rows:
+        return
+    placeholders = "(%s)" % ", ".join(["%s"] * len(rows[0]))
+    for i in range(0, len(rows), chunk_size):
+        chunk = rows[i:i + chunk_size]
+        yield "%s %s;" % (statement, ", ".join([placeholders] * len(chunk))), [value for row in chunk for value in row], len(chunk)
+
+def group_coord_rows(coord_rows, nogo_rows):
+    """Groups the rows from :data:`AREA_COORD_ROWS_SQL` and :data:`NOGO_COORD_ROWS_SQL` by area.
+
+    Arguments:
+        coord_rows (list): ``(area_id, x, y, z)`` rows, in vertex order
+        nogo_rows (list): ``(area_id, nogo_id, x, y, z)`` rows, in vertex order
+
+    Returns:
+        (dict, dict): ``{area_id: [[x, y, z], ...]}``, and ``{area_id: {nogo_id: [[x, y, z], ...]}}``
+    """
+    area_coords = {}
+    for area_id, x, y, z in coord_rows:
+        area_coords.setdefault(area_id, []).append([float(x), float(y), float(z)])
+
+    nogo_zones = {}
+    for area_id, nogo_id, x, y, z in nogo_rows:
+        ring = nogo_zones.setdefault(area_id, {}).setdefault(nogo_id, [])
+        if x is not None:
+            ring.append([float(x), float(y), float(z)])
+
+    return area_coords, nogo_zones
+
+def group_coord_blobs(blob_rows, nogo_rows):
+    """Like :func:`group_coord_rows`, for the rows from :data:`AREA_COORD_BLOBS_SQL` and :data:`NOGO_COORD_BLOBS_SQL`.
+    The coordinates are left as views of the blobs, which :class:`models.Area` copies straight into its array.
+
+    Arguments:
+        blob_rows (list): ``(area_id, coords)`` rows
+        nogo_rows (list): ``(area_id, nogo_id, coords)`` rows
+
+    Returns:
+        (dict, dict): ``{area_id: coords}``, and ``{area_id: {nogo_id: coords}}``, with coords as from :func:`geometry.unpack_coords`
+    """
+    area_coords = {area_id: geometry.unpack_coords(blob) for area_id, blob in blob_rows}
+
+    nogo_zones = {}
+    for area_id, nogo_id, blob in nogo_rows:
+        nogo_zones.setdefault(area_id, {})[nogo_id] = geometry.unpack_coords(blob)
+
+    return area_coords, nogo_zones
 
 def str_coords_to_float(coords):
     return [[float(j) for j in i] for i in coords]
@@ -380,6 +1718,15 @@ class UnauthenticatedUserException(Exception):
 class InvalidSessionException(Exception):
     pass
 
+class AreaNotFoundException(Exception):
+    pass
+
+class MowerNotFoundException(Exception):
+    pass
+
+class PoolExhaustedException(Exception):
+    pass
+
 if __name__ == "__main__":
     import app
     with MowerDatabase(host = "192.168.1.9") as db:
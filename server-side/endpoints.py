@@ -0,0 +1,125 @@
+"""What :mod:`app` and :mod:`asgi_app` share, so that both servers behave the same: parsing
+request parameters, ETags, and the settings of the caches and password hasher which each server
+process makes its own of. Unlike :mod:`app`, importing it doesn't open any connections or start
+any threads.
+"""
+import dataclasses
+import wireformat
+import passwords
+import database
+import sessions
+import simplify
+import spatial
+import models
+import numpy
+import os
+
+# the most points /api/classify takes in one request
+MAX_CLASSIFY_POINTS = 10000
+
+def database_host():
+    """The database server to connect to. Outside docker, the settings in ``../db.env`` are loaded
+    into the environment first.
+
+    Returns:
+        str: The database host
+    """
+    if os.path.exists(".docker"):
+        return "db"
+    print("Not in docker... Using external database server...")
+    import dotenv
+    dotenv.load_dotenv(dotenv_path = os.path.join("..", "db.env"))
+    return "192.168.1.5"
+
+def password_hasher():
+    """A new password hasher, configured by ``MOWER_PW_SCRYPT_N``, ``MOWER_PW_WORKERS`` and ``MOWER_PW_QUEUE``.
+
+    Returns:
+        passwords.PasswordHasher: The hasher
+    """
+    return passwords.PasswordHasher(
+        n = int(os.environ.get("MOWER_PW_SCRYPT_N", 2 ** 14)),
+        workers = int(os.environ.get("MOWER_PW_WORKERS", 1)),
+        max_pending = int(os.environ.get("MOWER_PW_QUEUE", 1))
+    )
+
+def session_cache():
+    """A new cache of authenticated sessions. Each server process has its own, and
+    :meth:`sessions.SessionCache.invalidate` only reaches that one, so a session revoked through
+    one process can still be served from another's cache for up to its ``ttl``.
+
+    Returns:
+        sessions.SessionCache: The cache
+    """
+    return sessions.SessionCache(maxsize = 10000, ttl = 60)
+
+def simplification_cache():
+    """A new cache of simplified areas.
+
+    Returns:
+        simplify.SimplificationCache: The cache
+    """
+    return simplify.SimplificationCache(maxsize = 1000)
+
+def area_index_cache():
+    """A new cache of spatial indexes of users' areas.
+
+    Returns:
+        spatial.AreaIndexCache: The cache
+    """
+    return spatial.AreaIndexCache(maxsize = 100)
+
+def parse_classify_request(req):
+    # the points and optional area_id of an /api/classify request body
+    if not isinstance(req, dict) or not isinstance(req.get("points"), list):
+        raise ValueError("A list of points is required")
+    if len(req["points"]) > MAX_CLASSIFY_POINTS:
+        raise ValueError("At most %d points can be classified at once" % MAX_CLASSIFY_POINTS)
+    try:
+        points = numpy.array(req["points"], dtype = float).reshape(-1, 3)
+    except (TypeError, ValueError):
+        raise ValueError("Points must be [x, y, z] lists of numbers")
+    if len(points) != len(req["points"]):
+        raise ValueError("Points must be [x, y, z] lists of numbers")
+
+    area_id = req.get("area_id")
+    if area_id is not None and not isinstance(area_id, int):
+        raise ValueError("area_id must be an integer")
+    return points, area_id
+
+def parse_list_args(get):
+    # the listareas query parameters, from a function like dict.get
+    after = get("after")
+    after = None if after in (None, "") else int(after)
+    limit = int(get("limit", 100))
+    if limit < 1 or limit > database.MAX_LIST_AREAS:
+        raise ValueError("limit must be between 1 and %d" % database.MAX_LIST_AREAS)
+
+    fields = get("fields")
+    if fields is None:
+        return after, limit, None
+    fields = {i.strip() for i in fields.split(",") if i.strip()}
+    unknown = fields - {f.name for f in dataclasses.fields(models.AreaSummary)}
+    if unknown:
+        raise ValueError("Unknown fields: %s" % ", ".join(sorted(unknown)))
+    return after, limit, fields
+
+def parse_tolerance(get):
+    # the tolerance in metres from the ?tolerance= or ?zoom= query parameters, from a function like dict.get
+    tolerance, zoom = get("tolerance"), get("zoom")
+    if tolerance is not None and zoom is not None:
+        raise ValueError("Only one of tolerance and zoom can be given")
+    if zoom is not None:
+        return simplify.zoom_tolerance(float(zoom))
+    tolerance = 0 if tolerance is None else float(tolerance)
+    if not tolerance >= 0:
+        raise ValueError("tolerance must be a positive number of metres")
+    return tolerance
+
+def representation_etag(etag, media_type, encoding):
+    # each format and compression is a different response, so needs a different ETag
+    if media_type != wireformat.JSON:
+        etag += "-msgpack"
+    if encoding != "identity":
+        etag += "-" + encoding
+    return etag
@@ -0,0 +1,213 @@
+"""Checks telemetry fixes against the no-go zones of the mower's owner as they arrive, so that
+a mower driving into a no-go zone is noticed straight away rather than whenever someone next
+looks at the telemetry.
+"""
+import threading
+import spatial
+import queue
+import time
+
+class Geofence:
+    """Tests fixes against their mower's owner's no-go zones, on the horizontal ``(x, z)`` plane,
+    and records each time a mower enters one in the ``geofence_violations`` table. Usually
+    passed to :class:`ingest.TelemetryIngestQueue`, which calls :meth:`check` for every fix it is given:
+
+    .. code-block:: python
+
+        fence = geofence.Geofence(lambda: database.MowerDatabase(pool = pool), on_violation = print)
+        with ingest.TelemetryIngestQueue(lambda: database.MowerDatabase(pool = pool), geofence = fence) as telemetry:
+            telemetry.submit(iqn, datetime.datetime.now(), x, y, z)
+
+    Each mower's owner and their no-go zones are looked up the first time a fix for the mower
+    arrives, and kept in memory as :class:`spatial.Ring` s. Most fixes are outside the bounding box of
+    every no-go zone, so cost a few comparisons; the rest are tested against the few edges of
+    the zone near them, which takes microseconds. A background thread writes violations
+    to the database as soon as they happen, and every ``refresh_interval`` seconds checks,
+    in two queries for the whole fleet, if any owner's areas or any mower's owner has changed.
+
+    Only entering a no-go zone is a violation, not every fix while the mower stays inside it.
+
+    Arguments:
+        db_factory (callable): Returns a new :class:`database.MowerDatabase`, ideally one using a :class:`database.ConnectionPool`
+        refresh_interval (float): How often to check for changed areas and owners, in seconds
+        on_violation (callable): Called with ``(iqn, timestamp, area_id, x, y, z)`` for each violation, on the thread calling :meth:`check`, so must be quick
+    """
+    def __init__(self, db_factory, refresh_interval = 30, on_violation = None):
+        self.db_factory = db_factory
+        self.refresh_interval = refresh_interval
+        self.on_violation = on_violation
+
+        self.checked = 0
+        self.violations = 0
+        self.load_failures = 0
+
+        self.__lock = threading.Lock()
+        # iqn -> owner user number, or None for unknown mowers
+        self.__owners = {}
+        # owner user number -> (area version, bounding box of all their no-go zones, [(area_id, ring)])
+        self.__fences = {}
+        # iqn -> the area_id of the no-go zone the mower is in, if it is in one
+        self.__inside = {}
+        # iqn -> time.monotonic() before which we won't try loading it again, after failing to
+        self.__retry_at = {}
+
+        self.__violations = queue.Queue()
+        self.__closing = threading.Event()
+        self.__thread = threading.Thread(target = self.__run, name = "geofence", daemon = True)
+        self.__thread.start()
+
+    def check(self, iqn: str, timestamp, x, y, z):
+        """Check a fix, recording a violation if the mower has just entered a no-go zone.
+
+        Arguments:
+            iqn (str): The mower's iqn
+            timestamp (datetime.datetime): When the fix was received
+            x (float): x coordinate
+            y (float): y coordinate
+            z (float): z coordinate
+
+        Returns:
+            bool: ``True`` if the fix is in one of the owner's no-go zones
+        """
+        self.checked += 1
+        if iqn not in self.__owners and not self.__load(iqn):
+            return False
+        fence = self.__fences.get(self.__owners[iqn])
+        if fence is None:
+            return False
+
+        area_id = None
+        min_x, min_z, max_x, max_z = fence[1]
+        if min_x <= x <= max_x and min_z <= z <= max_z:
+            for zone_area_id, ring in fence[2]:
+                if ring.contains_point(x, z):
+                    area_id = zone_area_id
+                    break
+
+        previous = self.__inside.get(iqn)
+        self.__inside[iqn] = area_id
+        if area_id is not None and area_id != previous:
+            violation = (iqn, timestamp, area_id, x, y, z)
+            self.violations += 1
+            self.__violations.put(violation)
+            if self.on_violation is not None:
+                self.on_violation(*violation)
+        return area_id is not None
+
+    def close(self, timeout = None):
+        """Stop, after writing any violations not yet written.
+
+        Arguments:
+            timeout (float): How long to wait, in seconds. Waits forever by default
+        """
+        self.__closing.set()
+        self.__thread.join(timeout)
+
+    def stats(self):
+        """Returns counters, so we can check it is working.
+
+        Returns:
+            dict: JSON-serializable dictionary
+        """
+        return {
+            "checked": self.checked,
+            "violations": self.violations,
+            "mowers": len(self.__owners),
+            "owners": len(self.__fences),
+            "load_failures": self.load_failures
+        }
+
+    def __load(self, iqn):
+        # look up a mower we haven't seen before, on the thread that is checking it
+        if self.__retry_at.get(iqn, 0) > time.monotonic():
+            return False
+        try:
+            with self.db_factory() as db:
+                owner = db.get_mower_owners([iqn]).get(iqn)
+                fence = None
+                if owner is not None and owner.id_ not in self.__fences:
+                    version, _ = db.get_area_version(owner)
+                    fence = build_fence(version, db.get_areas(owner))
+        except Exception as e:
+            print("Failed to load the no-go zones for mower %s: %s" % (iqn, e))
+            self.load_failures += 1
+            self.__retry_at[iqn] = time.monotonic() + self.refresh_interval
+            return False
+
+        with self.__lock:
+            if fence is not None:
+                self.__fences.setdefault(owner.id_, fence)
+            self.__owners[iqn] = None if owner is None else owner.id_
+        return True
+
+    def __run(self):
+        next_refresh = time.monotonic() + self.refresh_interval
+        while not (self.__closing.is_set() and self.__violations.empty()):
+            batch = []
+            try:
+                batch.append(self.__violations.get(timeout = min(0.1, max(0, next_refresh - time.monotonic()))))
+                while True:
+                    batch.append(self.__violations.get_nowait())
+            except queue.Empty:
+                pass
+            if batch:
+                self.__write(batch)
+
+            if time.monotonic() >= next_refresh and not self.__closing.is_set():
+                try:
+                    self.__refresh()
+                except Exception as e:
+                    print("Failed to refresh no-go zones: %s" % e)
+                next_refresh = time.monotonic() + self.refresh_interval
+
+    def __write(self, batch):
+        try:
+            with self.db_factory() as db:
+                db.append_geofence_violations(batch)
+        except Exception as e:
+            print("Failed to record %d geofence violations: %s" % (len(batch), e))
+
+    def __refresh(self):
+        with self.__lock:
+            iqns = list(self.__owners)
+            fences = dict(self.__fences)
+        if not iqns:
+            return
+
+        with self.db_factory() as db:
+            owners = db.get_mower_owners(iqns)
+            owner_ids = {iqn: owner.id_ for iqn, owner in owners.items()}
+            users = {owner.id_: owner for owner in owners.values()}
+            versions = db.get_area_versions(list(users))
+            # rebuild the fences of owners whose areas have changed, or who are new
+            rebuilt = {}
+            for user_no, user in users.items():
+                if user_no not in fences or fences[user_no][0] != versions[user_no]:
+                    rebuilt[user_no] = build_fence(versions[user_no], db.get_areas(user))
+
+        with self.__lock:
+            for iqn in iqns:
+                self.__owners[iqn] = owner_ids.get(iqn)
+            self.__fences.update(rebuilt)
+            # forget owners with no mowers left
+            for user_no in set(self.__fences) - set(owner_ids.values()):
+                del self.__fences[user_no]
+            self.__retry_at.clear()
+
+def build_fence(version, areas):
+    """Prepares an owner's no-go zones for :meth:`Geofence.check`.
+
+    Arguments:
+        version (int): The owner's area version
+        areas (list): The owner's :class:`models.Area` s
+
+    Returns:
+        tuple: ``(version, bounding box of every zone, [(area_id, spatial.Ring)])``
+    """
+    zones = [(area.id_, spatial.Ring(nogo_zone)) for area in areas for nogo_zone in area.nogo_zones if len(nogo_zone) >= 3]
+    if not zones:
+        return version, (float("inf"), float("inf"), float("-inf"), float("-inf")), []
+    bboxes = [ring.bbox for _, ring in zones]
+    return version, (
+        min(b[0] for b in bboxes), min(b[1] for b in bboxes), max(b[2] for b in bboxes), max(b[3] for b in bboxes)
+    ), zones
@@ -0,0 +1,74 @@
+"""Packing of coordinate lists into compact binary blobs, for the ``"blob"`` coordinate storage
+mode of :class:`database.MowerDatabase`. A polygon or no-go ring of ``n`` vertices is stored as
+``n`` little-endian ``float64`` ``(x, y, z)`` triples, 24 bytes per vertex.
+"""
+import array
+import sys
+
+BYTES_PER_VERTEX = 24
+
+def pack_coords(coords):
+    """Packs a list of ``(x, y, z)`` coordinates into bytes.
+
+    Arguments:
+        coords (list): A list of ``(x, y, z)`` tuples or lists, or a contiguous ``(n, 3)`` float64 array, which is copied as it is
+
+    Returns:
+        bytes: ``len(coords) * 24`` bytes of little-endian float64s
+    """
+    try:
+        view = memoryview(coords)
+    except TypeError:
+        view = None
+    if view is not None and view.format == "d" and view.ndim == 2 and view.shape[1] == 3 and view.c_contiguous and sys.byteorder == "little":
+        return view.tobytes()
+
+    buf = array.array("d", [float(i) for coord in coords for i in coord])
+    if len(buf) != len(coords) * 3:
+        raise ValueError("Coordinates must have exactly three dimensions")
+    if sys.byteorder == "big":
+        buf.byteswap()
+    return buf.tobytes()
+
+def unpack_coords(blob):
+    """Unpacks bytes from :func:`pack_coords`. On little-endian machines this doesn't copy the
+    coordinates, the returned view points straight into ``blob``. Use ``.tolist()`` to get a
+    list of ``[x, y, z]`` lists, or wrap it with ``numpy.asarray`` for a ``(n, 3)`` array.
+
+    Arguments:
+        blob (bytes): Packed coordinates
+
+    Returns:
+        memoryview: A ``(n, 3)`` view of float64s, or an empty one dimensional view if there are no coordinates
+    """
+    if len(blob) % BYTES_PER_VERTEX != 0:
+        raise ValueError("Packed coordinates must be a multiple of %d bytes long" % BYTES_PER_VERTEX)
+
+    if sys.byteorder == "big":
+        buf = array.array("d")
+        buf.frombytes(blob)
+        buf.byteswap()
+        blob = buf
+
+    view = memoryview(blob).cast("B")
+    if len(view) == 0:
+        return view.cast("d")
+    return view.cast("d", (len(view) // BYTES_PER_VERTEX, 3))
+
+def bounding_box(coords):
+    """Finds the bounding box of some coordinates on the horizontal ``(x, z)`` plane.
+
+    Arguments:
+        coords (list): A list of ``(x, y, z)`` tuples or lists
+
+    Returns:
+        tuple: ``(min_x, min_z, max_x, max_z)``, or four ``None`` s if there are no coordinates
+    """
+    if len(coords) == 0:
+        return None, None, None, None
+    if isinstance(coords, memoryview):
+        # from unpack_coords, which can't be iterated by vertex
+        coords = coords.tolist()
+    xs = [float(coord[0]) for coord in coords]
+    zs = [float(coord[2]) for coord in coords]
+    return min(xs), min(zs), max(xs), max(zs)
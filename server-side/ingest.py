@@ -0,0 +1,157 @@
+import threading
+import database
+import queue
+import time
+
+class TelemetryIngestQueue:
+    """Collects telemetry fixes in memory and writes them to the database in batches with
+    :meth:`database.MowerDatabase.append_telemetry_many`, on a background thread. This replaces
+    a commit per fix with one commit per batch. Example usage:
+
+    .. code-block:: python
+
+        pool = database.ConnectionPool(size = 2, host = "db")
+        with ingest.TelemetryIngestQueue(lambda: database.MowerDatabase(pool = pool)) as telemetry:
+            telemetry.submit(iqn, datetime.datetime.now(), x, y, z)
+
+    A batch is written when it has ``batch_size`` fixes in it, or when its oldest fix has been
+    waiting for ``flush_interval`` seconds. These bound how much we lose if the process crashes
+    while the database is keeping up. At most ``max_pending`` fixes are ever held in memory, which
+    bounds it if the database falls behind: :meth:`submit` then blocks for up to ``put_timeout``
+    seconds before raising :class:`TelemetryBacklogException`, so the backpressure reaches whatever
+    is producing the fixes. If a write fails because of a connection problem it is retried with
+    exponential backoff. :meth:`close` writes everything still queued.
+
+    If a :class:`geofence.Geofence` is given, every fix is checked against the mower's owner's
+    no-go zones as it is submitted, before it is queued, so violations are noticed without
+    waiting for the batch to be written.
+
+    Arguments:
+        db_factory (callable): Returns a new :class:`database.MowerDatabase` to write a batch with, ideally one using a :class:`database.ConnectionPool`
+        batch_size (int): The most fixes written in one transaction
+        flush_interval (float): The longest a fix waits in memory before being written, in seconds
+        max_pending (int): The most fixes held in memory
+        put_timeout (float): How long :meth:`submit` waits for space when ``max_pending`` fixes are held
+        max_backoff (float): The longest wait between retries of a failed write, in seconds
+        geofence (geofence.Geofence): Checks each fix for no-go zone violations, optional
+    """
+    def __init__(self, db_factory, batch_size = 500, flush_interval = 1.0, max_pending = 20000, put_timeout = 5, max_backoff = 30, geofence = None):
+        self.db_factory = db_factory
+        self.geofence = geofence
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self.max_backoff = max_backoff
+
+        self.submitted = 0
+        self.written = 0
+        self.batches = 0
+        self.failed_batches = 0
+
+        self.__queue = queue.Queue(maxsize = max_pending)
+        self.__closing = threading.Event()
+        self.__thread = threading.Thread(target = self.__run, name = "telemetry-ingest", daemon = True)
+        self.__thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    def submit(self, iqn: str, timestamp, x, y, z):
+        """Queue a fix to be written.
+
+        Arguments:
+            iqn (str): The mower's iqn
+            timestamp (datetime.datetime): When the fix was received
+            x (float): x coordinate
+            y (float): y coordinate
+            z (float): z coordinate
+
+        Raises:
+            TelemetryBacklogException: If the queue stayed full for ``put_timeout`` seconds, or the queue is closed
+        """
+        if self.__closing.is_set():
+            raise TelemetryBacklogException("The telemetry queue has been closed")
+        if self.geofence is not None:
+            try:
+                self.geofence.check(iqn, timestamp, x, y, z)
+            except Exception as e:
+                # a broken geofence mustn't lose telemetry
+                print("Failed to check fix from %s against no-go zones: %s" % (iqn, e))
+        try:
+            self.__queue.put((iqn, timestamp, x, y, z), timeout = self.put_timeout)
+        except queue.Full:
+            raise TelemetryBacklogException("%d telemetry fixes are waiting to be written" % self.__queue.maxsize)
+        self.submitted += 1
+
+    def close(self, timeout = None):
+        """Stop accepting fixes, and wait for everything queued to be written.
+
+        Arguments:
+            timeout (float): How long to wait, in seconds. Waits forever by default
+        """
+        self.__closing.set()
+        self.__thread.join(timeout)
+
+    def stats(self):
+        """Returns counters, so we can check whether the database is keeping up.
+
+        Returns:
+            dict: JSON-serializable dictionary
+        """
+        stats = {
+            "submitted": self.submitted,
+            "written": self.written,
+            "pending": self.__queue.qsize(),
+            "batches": self.batches,
+            "failed_batches": self.failed_batches
+        }
+        if self.geofence is not None:
+            stats["geofence"] = self.geofence.stats()
+        return stats
+
+    def __run(self):
+        while not (self.__closing.is_set() and self.__queue.empty()):
+            batch = self.__next_batch()
+            if batch:
+                self.__write(batch)
+
+    def __next_batch(self):
+        try:
+            batch = [self.__queue.get(timeout = 0.1)]
+        except queue.Empty:
+            return []
+
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if self.__closing.is_set():
+                remaining = 0
+            try:
+                batch.append(self.__queue.get(timeout = remaining) if remaining > 0 else self.__queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def __write(self, batch):
+        backoff = 0.5
+        while True:
+            try:
+                with self.db_factory() as db:
+                    self.written += db.append_telemetry_many(batch)
+                self.batches += 1
+                return
+            except database.CONNECTION_ERRORS + (database.PoolExhaustedException, ) as e:
+                print("Failed to write %d telemetry fixes, retrying in %.1fs: %s" % (len(batch), backoff, e))
+                time.sleep(backoff)
+                backoff = min(backoff * 2, self.max_backoff)
+            except Exception as e:
+                # not something retrying will fix, e.g. bad data
+                print("Dropped %d telemetry fixes: %s" % (len(batch), e))
+                self.failed_batches += 1
+                return
+
+class TelemetryBacklogException(Exception):
+    pass
@@ -0,0 +1,165 @@
+"""Compresses NMEA log files once they are finished with, into seekable compressed log files
+(see :func:`nmealog.compress_log`), which :class:`nmealog.NMEALogReader` and :mod:`backfill`
+read transparently. NMEA text compresses very well, so this saves most of the disk space logs
+take up, and lets them be moved to cheaper, slower storage as they are compressed. Run it where
+the log files are, alongside whatever writes them:
+
+.. code-block:: bash
+
+    python3 logarchive.py --host 192.168.1.9 --archive-dir /mnt/archive/nmea
+"""
+from concurrent.futures import ProcessPoolExecutor
+import threading
+import argparse
+import database
+import nmealog
+import os
+
+# log files are compressed once they haven't been written to for this many seconds past
+# rotation, so a writer which has only just missed the rotation deadline never gets one back
+GRACE_PERIOD = 300
+
+class NMEALogArchiver(threading.Thread):
+    """Background thread which compresses log files from ``nmea_logs`` that haven't been written
+    to for ``max_age`` seconds, so have been rotated (see :class:`nmealog.NMEALogWriter`). Every
+    ``interval`` seconds, for each such log file, it:
+
+    * Compresses it with :func:`nmealog.compress_log`, into ``archive_dir`` if it is set, or next to the original
+    * Points its row in ``nmea_logs`` at the compressed file, with :meth:`database.MowerDatabase.set_nmea_logfile_path`
+    * Deletes the original and its index
+
+    Compression runs in a pool of ``workers`` processes at the lowest CPU priority, so it only
+    uses cores that nothing else wants, and never holds the GIL of the process it runs in.
+    Example usage:
+
+    .. code-block:: python
+
+        archiver = logarchive.NMEALogArchiver(lambda: database.MowerDatabase(pool = pool), archive_dir = "/mnt/archive/nmea")
+        archiver.start()
+
+    Arguments:
+        db_factory (callable): Returns a new :class:`database.MowerDatabase`, ideally one using a :class:`database.ConnectionPool`
+        max_age (int): The writers' ``max_age``, in seconds. Log files are compressed :data:`GRACE_PERIOD` seconds after this
+        archive_dir (str): The directory to put compressed log files in, next to the originals if ``None``
+        workers (int): How many processes to compress with
+        interval (float): Seconds between runs
+        level (int): The gzip compression level
+    """
+    def __init__(self, db_factory, max_age = 60, archive_dir = None, workers = 1, interval = 60, level = 9):
+        super().__init__(name = "nmea-log-archiver", daemon = True)
+        self.db_factory = db_factory
+        self.max_age = max_age
+        self.archive_dir = archive_dir
+        self.workers = workers
+        self.interval = interval
+        self.level = level
+
+        self.files_compressed = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.failures = 0
+        self.__stopping = threading.Event()
+        # log files which couldn't be compressed, so they aren't tried again every run
+        self.__failed = set()
+
+    def run(self):
+        with ProcessPoolExecutor(max_workers = self.workers, initializer = os.nice, initargs = (19, )) as executor:
+            while not self.__stopping.is_set():
+                try:
+                    self.archive(executor)
+                except Exception as e:
+                    print("Failed to archive NMEA log files: %s" % e)
+                self.__stopping.wait(self.interval)
+
+    def archive(self, executor):
+        """Compress every log file which is finished with now.
+
+        Arguments:
+            executor (concurrent.futures.Executor): Where to compress them
+        """
+        while not self.__stopping.is_set():
+            with self.db_factory() as db:
+                logs = [log for log in db.get_closed_nmea_logs(self.max_age + GRACE_PERIOD, limit = 100 + len(self.__failed)) if log[3] not in self.__failed]
+            if not logs:
+                return
+
+            futures = [(path, executor.submit(nmealog.compress_log, path, self.destination(path), level = self.level)) for _, _, _, path in logs]
+            for path, future in futures:
+                try:
+                    compressed, size, compressed_size = future.result()
+                except FileNotFoundError:
+                    # nothing was ever written to it
+                    self.__fail(path, "missing")
+                    continue
+                except Exception as e:
+                    self.__fail(path, e)
+                    continue
+
+                with self.db_factory() as db:
+                    found = db.set_nmea_logfile_path(path, compressed)
+                # only delete the original once nmea_logs points at the compressed file
+                nmealog.remove_log(path if found else compressed)
+                self.files_compressed += 1
+                self.bytes_in += size
+                self.bytes_out += compressed_size
+
+    def destination(self, path):
+        """Where a log file is compressed to.
+
+        Arguments:
+            path (str): The log file
+
+        Returns:
+            str: The compressed log file's path
+        """
+        if self.archive_dir is None:
+            return path + ".gz"
+        return os.path.join(self.archive_dir, os.path.basename(path) + ".gz")
+
+    def __fail(self, path, reason):
+        print("Failed to compress NMEA log file %s: %s" % (path, reason))
+        self.__failed.add(path)
+        self.failures += 1
+
+    def stop(self):
+        """Stop after the log files being compressed, if any."""
+        self.__stopping.set()
+
+    def stats(self):
+        """Returns counters, so we can check it is working.
+
+        Returns:
+            dict: JSON-serializable dictionary
+        """
+        return {
+            "files_compressed": self.files_compressed,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "compression_ratio": self.bytes_in / self.bytes_out if self.bytes_out else None,
+            "failures": self.failures
+        }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = __doc__.split("\n\n")[0])
+    parser.add_argument("--host", default = "db")
+    parser.add_argument("--archive-dir", help = "Directory to put compressed log files in, defaults to next to the originals")
+    parser.add_argument("--max-age", type = int, default = 60, help = "The log writers' rotation max_age, in seconds")
+    parser.add_argument("--workers", type = int, default = 1, help = "Compression processes")
+    parser.add_argument("--interval", type = float, default = 60, help = "Seconds between runs")
+    parser.add_argument("--level", type = int, default = 9, help = "gzip compression level")
+    args = parser.parse_args()
+
+    if not os.path.exists(".docker"):
+        import dotenv
+        dotenv.load_dotenv(dotenv_path = os.path.join("..", "db.env"))
+
+    if args.archive_dir is not None:
+        os.makedirs(args.archive_dir, exist_ok = True)
+    archiver = NMEALogArchiver(
+        lambda: database.MowerDatabase(host = args.host), args.max_age, args.archive_dir, args.workers, args.interval, args.level
+    )
+    try:
+        archiver.run()
+    except KeyboardInterrupt:
+        pass
+    print(archiver.stats())
@@ -0,0 +1,26 @@
+"""Moves area and no-go zone vertices from the old one-row-per-vertex ``coords`` tables into
+the packed ``area_geometry`` and ``nogo_geometry`` blob tables, see :class:`database.MowerDatabase`.
+Safe to run while the API is up and to run more than once. Switch the API over by setting
+``MOWER_COORD_STORAGE=blob`` in ``db.env``; areas that haven't been migrated yet can still be read.
+
+.. code-block:: bash
+
+    python3 migrate_coords.py --host 192.168.1.9 --delete-rows
+"""
+import argparse
+import database
+import os
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = __doc__.split("\n\n")[0])
+    parser.add_argument("--host", default = "db")
+    parser.add_argument("--delete-rows", action = "store_true", help = "Delete the old coords rows once they have been copied")
+    parser.add_argument("--batch-size", type = int, default = 100, help = "Areas migrated per transaction")
+    args = parser.parse_args()
+
+    if not os.path.exists(".docker"):
+        import dotenv
+        dotenv.load_dotenv(dotenv_path = os.path.join("..", "db.env"))
+
+    with database.MowerDatabase(host = args.host) as db:
+        print("Migrated %d areas" % db.migrate_coords_to_blobs(delete_rows = args.delete_rows, batch_size = args.batch_size))
@@ -0,0 +1,26 @@
+"""Copies telemetry from the old ``telemetry`` table, with its coordinates in ``coords``, into the
+partitioned ``telemetry_points`` table which the API now reads and writes, see
+:meth:`database.MowerDatabase.migrate_telemetry`. Safe to run while the API is up and to run more
+than once. The copied fixes are split into a partition per day the next time
+:class:`retention.TelemetryRetention` runs.
+
+.. code-block:: bash
+
+    python3 migrate_telemetry.py --host 192.168.1.9
+"""
+import argparse
+import database
+import os
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = __doc__.split("\n\n")[0])
+    parser.add_argument("--host", default = "db")
+    parser.add_argument("--batch-size", type = int, default = 5000, help = "Fixes copied per transaction")
+    args = parser.parse_args()
+
+    if not os.path.exists(".docker"):
+        import dotenv
+        dotenv.load_dotenv(dotenv_path = os.path.join("..", "db.env"))
+
+    with database.MowerDatabase(host = args.host) as db:
+        print("Copied %d fixes" % db.migrate_telemetry(batch_size = args.batch_size))
@@ -1,180 +1,311 @@
-from dataclasses import dataclass
-import abc
-
-class ModelBase(abc.ABC):
-    """Abstract base class."""
-    
-    def serialize(self):
-        """Serialize an object to JSON, so it can be passed-around in HTTP queries.
-
-        Returns:
-            dict: JSON-serializable dictionary
-        """
-        return self.__dict__
-
-@dataclass
-class User(ModelBase):
-    id_: int
-    email: str
-    fname: str
-    sname: str
-
-@dataclass
-class Area(ModelBase):
-    """Example :class:`Area` usage:
-    
-        .. code-block:: python
-            :linenos:
-
-            area = models.Area(
-                owner = None, 
-                name = "Besides the lake", 
-                notes = "Besides the lake, avoiding the trees, left of the pond", 
-                area_coords = [
-                    (52.619274360887445, 24.0, 1.2393361009732562),
-                    (52.619274360423945, 24.0, 1.2393361009734234),
-                    (52.619272593850345, 24.0, 1.2346346239823423)
-                ], 
-                nogo_zones = [
-                    [
-                        (52.619534542345435, 24.0, 1.2393352345423454),
-                        (52.619272345234545, 24.0, 1.2393234523452345),
-                        (52.623454234523454, 24.0, 1.2334523452345234)
-                    ],
-                    [
-                        (52.619534542345435, 24.0, 1.2393352345423454),
-                        (52.619272345234545, 24.0, 1.2393234523452345),
-                        (52.623454234523454, 24.0, 1.2334523452345234)
-                    ]
-                ]
-            )
-    """
-    owner: User
-    name: str
-    notes: str
-    area_coords: list
-    nogo_zones: list
-
-    def to_keypairs(self):
-        """Alternative serialization method, so that 'true' JSON is returned,
-        that is, key-value pairs only. It is annoying that we have to do this,
-        for example we cannot have bare lists. Serializing loses the ``owner`` attribute.
-
-        This method is currently un-used. If we do need to use it, we should also
-        make a deserialization method too.
-        
-        For example, the example area becomes:
-
-        .. code-block:: json
-            :linenos:
-
-            {
-                "name": "Besides the lake",
-                "notes": "Besides the lake, avoiding the trees, left of the pond",
-                "area_coords": {
-                    "0": {
-                        "x": 52.619274360887445,
-                        "y": 24.0,
-                        "z": 1.2393361009732562
-                    },
-                    "1": {
-                        "x": 52.619274360423944,
-                        "y": 24.0,
-                        "z": 1.2393361009734234
-                    },
-                    "2": {
-                        "x": 52.61927259385035,
-                        "y": 24.0,
-                        "z": 1.2346346239823422
-                    }
-                },
-                "nogo_zones": {
-                    "0": {
-                        "0": {
-                            "x": 52.619534542345434,
-                            "y": 24.0,
-                            "z": 1.2393352345423454
-                        },
-                        "1": {
-                            "x": 52.61927234523454,
-                            "y": 24.0,
-                            "z": 1.2393234523452346
-                        },
-                        "2": {
-                            "x": 52.62345423452346,
-                            "y": 24.0,
-                            "z": 1.2334523452345234
-                        }
-                    },
-                    "1": {
-                        "0": {
-                            "x": 52.619534542345434,
-                            "y": 24.0,
-                            "z": 1.2393352345423454
-                        },
-                        "1": {
-                            "x": 52.61927234523454,
-                            "y": 24.0,
-                            "z": 1.2393234523452346
-                        },
-                        "2": {
-                            "x": 52.62345423452346,
-                            "y": 24.0,
-                            "z": 1.2334523452345234
-                        }
-                    }
-                }
-            }
-
-        
-        """
-        area_coords = self.area_coords
-        nogo_zones = self.nogo_zones
-
-        out = self.__dict__
-        out["area_coords"] = {}
-        del out["owner"]
-             
-        for i, coords in enumerate(area_coords, 0):
-            out["area_coords"][i] = coord_tuple_to_xyz(coords)
-
-        out["nogo_zones"] = {}
-        for i, nogo_zone in enumerate(nogo_zones, 0):
-            out["nogo_zones"][i] = {}
-            for j, coords in enumerate(nogo_zone, 0):
-                out["nogo_zones"][i][j] = coord_tuple_to_xyz(coords)
-
-        return out
-
-    # override
-    def serialize(self):
-        """Serializing a :class:`Area` object makes it lose its :class:`User` attribute."""
-        out = self.__dict__
-        del out["owner"]
-        return out
-
-def deserialize(json_: dict, type_: type, **kwargs):
-    """
-    Deserialize a given JSON dictionary into type ``type_``.
-    If any information was lost in serialization, add it back in ``**kwargs``;
-    for example a :class:`Area` must have its :class:`User` added back- e.g.:
-
-    .. code-block:: python
-        :linenos:
-
-        ser = area.serialize()
-        area_again = models.deserialize(ser, models.Area, owner = None)
-
-    Args:
-        json_ (dict): A :class:`ModelBase` object serialised to JSON
-        type_ (type[ModelBase]): The object to serialize to
-
-    Returns:
-        ``type_``: The type set in the argument
-
-    """
-    json_.update(kwargs)
-    return type_(**json_)
-
-def coord_tuple_to_xyz(coord):
-    return {chr(i): j for i, j in enumerate(coord, 120)}
+from dataclasses import dataclass
+import numpy
+import abc
+
+class ModelBase(abc.ABC):
+    """Abstract base class."""
+    # so that subclasses with __slots__ don't get a __dict__ too
+    __slots__ = ()
+
+    def serialize(self):
+        """Serialize an object to JSON, so it can be passed-around in HTTP queries.
+
+        Returns:
+            dict: JSON-serializable dictionary
+        """
+        return self.__dict__
+
+@dataclass
+class User(ModelBase):
+    id_: int
+    email: str
+    fname: str
+    sname: str
+
+class Area(ModelBase):
+    """Example :class:`Area` usage:
+    
+        .. code-block:: python
+            :linenos:
+
+            area = models.Area(
+                owner = None, 
+                name = "Besides the lake", 
+                notes = "Besides the lake, avoiding the trees, left of the pond", 
+                area_coords = [
+                    (52.619274360887445, 24.0, 1.2393361009732562),
+                    (52.619274360423945, 24.0, 1.2393361009734234),
+                    (52.619272593850345, 24.0, 1.2346346239823423)
+                ], 
+                nogo_zones = [
+                    [
+                        (52.619534542345435, 24.0, 1.2393352345423454),
+                        (52.619272345234545, 24.0, 1.2393234523452345),
+                        (52.623454234523454, 24.0, 1.2334523452345234)
+                    ],
+                    [
+                        (52.619534542345435, 24.0, 1.2393352345423454),
+                        (52.619272345234545, 24.0, 1.2393234523452345),
+                        (52.623454234523454, 24.0, 1.2334523452345234)
+                    ]
+                ]
+            )
+
+    The vertices of the boundary and of every no-go zone are kept together in one contiguous,
+    read-only ``(n, 3)`` array of float64s, :attr:`coords`, the boundary first, with the offset
+    each ring starts at in :attr:`ring_offsets`. This is 24 bytes a vertex, rather than the ~140
+    bytes of a list of lists of floats. :attr:`area_coords` and :attr:`nogo_zones` are
+    ``(n, 3)`` views into it, which index and iterate like the lists they are made from.
+
+    Arguments:
+        owner (User): The area's owner
+        name (str): The area's name
+        notes (str): Notes about the area
+        area_coords (list): The boundary, as ``(x, y, z)`` coordinates, or an ``(n, 3)`` array
+        nogo_zones (list): The no-go zones, each like ``area_coords``
+        id_ (int): Set once the area is in the database, see :meth:`database.MowerDatabase.get_area`
+    """
+    __slots__ = ("owner", "name", "notes", "id_", "coords", "ring_offsets")
+
+    def __init__(self, owner: User, name: str, notes: str, area_coords, nogo_zones, id_: int = None):
+        self.owner = owner
+        self.name = name
+        self.notes = notes
+        self.id_ = id_
+
+        rings = [coord_array(area_coords)] + [coord_array(nogo_zone) for nogo_zone in nogo_zones or ()]
+        offsets = [0]
+        for ring in rings:
+            offsets.append(offsets[-1] + len(ring))
+        self.ring_offsets = tuple(offsets)
+        # a view of a lone boundary, so making it read-only doesn't change the caller's array
+        self.coords = numpy.concatenate(rings) if len(rings) > 1 else rings[0].view()
+        # shared by copies and serializations of the area, so mustn't change
+        self.coords.flags.writeable = False
+
+    def __repr__(self):
+        return "Area(owner=%r, name=%r, notes=%r, vertices=%d, nogo_zones=%d, id_=%r)" % (
+            self.owner, self.name, self.notes, len(self.coords), len(self.ring_offsets) - 2, self.id_
+        )
+
+    def __eq__(self, other):
+        # like the dataclass this used to be, but comparing the arrays' values
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return (
+            (self.owner, self.name, self.notes, self.id_, self.ring_offsets) == (other.owner, other.name, other.notes, other.id_, other.ring_offsets)
+            and numpy.array_equal(self.coords, other.coords)
+        )
+
+    @property
+    def area_coords(self):
+        """numpy.ndarray: The boundary's vertices, an ``(n, 3)`` view of :attr:`coords`"""
+        return self.coords[:self.ring_offsets[1]]
+
+    @property
+    def nogo_zones(self):
+        """list: The no-go zones' vertices, each an ``(n, 3)`` view of :attr:`coords`"""
+        offsets = self.ring_offsets
+        return [self.coords[offsets[i]:offsets[i + 1]] for i in range(1, len(offsets) - 1)]
+
+    def copy(self, owner = None):
+        """A copy of the area with another owner, e.g. to hand out a cached area. The copy shares
+        the coordinates, so it is cheap however many vertices there are.
+
+        Arguments:
+            owner (User): The copy's owner
+
+        Returns:
+            Area: The copy
+        """
+        area = Area.__new__(Area)
+        area.owner, area.name, area.notes, area.id_ = owner, self.name, self.notes, self.id_
+        area.coords, area.ring_offsets = self.coords, self.ring_offsets
+        return area
+
+    def to_keypairs(self):
+        """Alternative serialization method, so that 'true' JSON is returned,
+        that is, key-value pairs only. It is annoying that we have to do this,
+        for example we cannot have bare lists. Serializing loses the ``owner`` attribute.
+
+        This method is currently un-used. If we do need to use it, we should also
+        make a deserialization method too.
+        
+        For example, the example area becomes:
+
+        .. code-block:: json
+            :linenos:
+
+            {
+                "name": "Besides the lake",
+                "notes": "Besides the lake, avoiding the trees, left of the pond",
+                "area_coords": {
+                    "0": {
+                        "x": 52.619274360887445,
+                        "y": 24.0,
+                        "z": 1.2393361009732562
+                    },
+                    "1": {
+                        "x": 52.619274360423944,
+                        "y": 24.0,
+                        "z": 1.2393361009734234
+                    },
+                    "2": {
+                        "x": 52.61927259385035,
+                        "y": 24.0,
+                        "z": 1.2346346239823422
+                    }
+                },
+                "nogo_zones": {
+                    "0": {
+                        "0": {
+                            "x": 52.619534542345434,
+                            "y": 24.0,
+                            "z": 1.2393352345423454
+                        },
+                        "1": {
+                            "x": 52.61927234523454,
+                            "y": 24.0,
+                            "z": 1.2393234523452346
+                        },
+                        "2": {
+                            "x": 52.62345423452346,
+                            "y": 24.0,
+                            "z": 1.2334523452345234
+                        }
+                    },
+                    "1": {
+                        "0": {
+                            "x": 52.619534542345434,
+                            "y": 24.0,
+                            "z": 1.2393352345423454
+                        },
+                        "1": {
+                            "x": 52.61927234523454,
+                            "y": 24.0,
+                            "z": 1.2393234523452346
+                        },
+                        "2": {
+                            "x": 52.62345423452346,
+                            "y": 24.0,
+                            "z": 1.2334523452345234
+                        }
+                    }
+                }
+            }
+
+        
+        """
+        out = {"name": self.name, "notes": self.notes, "area_coords": {}, "nogo_zones": {}, "id_": self.id_}
+
+        for i, coords in enumerate(self.area_coords.tolist(), 0):
+            out["area_coords"][i] = coord_tuple_to_xyz(coords)
+
+        for i, nogo_zone in enumerate(self.nogo_zones, 0):
+            out["nogo_zones"][i] = {}
+            for j, coords in enumerate(nogo_zone.tolist(), 0):
+                out["nogo_zones"][i][j] = coord_tuple_to_xyz(coords)
+
+        return out
+
+    # override
+    def serialize(self):
+        """Serialize to JSON, without the :class:`User` attribute. The area isn't changed, so it
+        can be serialized again.
+
+        Returns:
+            dict: JSON-serializable dictionary, with coordinates as lists of ``[x, y, z]`` lists
+        """
+        out = self.serialize_arrays()
+        out["area_coords"] = out["area_coords"].tolist()
+        out["nogo_zones"] = [nogo_zone.tolist() for nogo_zone in out["nogo_zones"]]
+        return out
+
+    def serialize_arrays(self):
+        """Like :meth:`serialize`, but without copying the coordinates: ``area_coords`` and each
+        no-go zone are read-only ``(n, 3)`` views of :attr:`coords`, e.g. for encoders which
+        write the buffers out as they are, like :func:`wireformat.msgpack_area`. Not JSON-serializable
+        as it is, but :func:`deserialize` accepts it.
+
+        Returns:
+            dict: Dictionary like :meth:`serialize`'s, with ``numpy.ndarray`` coordinates
+        """
+        return {
+            "name": self.name,
+            "notes": self.notes,
+            "area_coords": self.area_coords,
+            "nogo_zones": self.nogo_zones,
+            "id_": self.id_
+        }
+
+@dataclass
+class AreaSummary(ModelBase):
+    """What :meth:`database.MowerDatabase.list_areas` returns about an area, without any of
+    its coordinates. ``vertex_count`` counts the vertices of the area and all its no-go zones.
+    ``bbox`` is the bounding box of the area on the horizontal plane, ``[min_x, min_z, max_x, max_z]``,
+    or ``None`` if it has no vertices.
+    """
+    id_: int
+    name: str
+    notes: str
+    vertex_count: int
+    nogo_count: int
+    bbox: list
+
+    # override
+    def serialize(self, fields = None):
+        """Serialize to JSON, optionally only including some of the fields. ``id_`` is always included.
+
+        Arguments:
+            fields (set): Names of the fields to include, or ``None`` for all of them
+
+        Returns:
+            dict: JSON-serializable dictionary
+        """
+        return {k: v for k, v in self.__dict__.items() if fields is None or k in fields or k == "id_"}
+
+def deserialize(json_: dict, type_: type, **kwargs):
+    """
+    Deserialize a given JSON dictionary into type ``type_``.
+    If any information was lost in serialization, add it back in ``**kwargs``;
+    for example a :class:`Area` must have its :class:`User` added back- e.g.:
+
+    .. code-block:: python
+        :linenos:
+
+        ser = area.serialize()
+        area_again = models.deserialize(ser, models.Area, owner = None)
+
+    Args:
+        json_ (dict): A :class:`ModelBase` object serialised to JSON
+        type_ (type[ModelBase]): The object to serialize to
+
+    Returns:
+        ``type_``: The type set in the argument
+
+    """
+    json_.update(kwargs)
+    return type_(**json_)
+
+def coord_array(coords):
+    """Converts coordinates to the contiguous ``(n, 3)`` float64 array :class:`Area` keeps them in.
+    Doesn't copy them if they already are one.
+
+    Arguments:
+        coords (list): ``(x, y, z)`` coordinates, an ``(n, 3)`` array, or a view from :func:`geometry.unpack_coords`
+
+    Raises:
+        ValueError: If the coordinates aren't all three numbers
+
+    Returns:
+        numpy.ndarray: An ``(n, 3)`` array
+    """
+    array = numpy.ascontiguousarray(coords, dtype = numpy.float64)
+    if array.size == 0:
+        return array.reshape(0, 3)
+    if array.ndim != 2 or array.shape[1] != 3:
+        raise ValueError("Coordinates must have exactly three dimensions")
+    return array
+
+def coord_tuple_to_xyz(coord):
+    return {chr(i): j for i, j in enumerate(coord, 120)}
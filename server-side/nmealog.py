@@ -0,0 +1,549 @@
+import collections
+import threading
+import datetime
+import calendar
+import bisect
+import struct
+import shutil
+import mmap
+import time
+import zlib
+import gzip
+import os
+
+# log files have a sidecar index, with an entry about every this many bytes
+INDEX_BYTES = 64 * 1024
+# each index entry is the unix time (UTC) of a sentence, and the byte offset it starts at
+INDEX_ENTRY = struct.Struct("<dQ")
+# readers only save index entries for log files unchanged for this many seconds, well past any
+# writer's max_age, so they never append to an index a writer is appending to as well
+INDEX_SETTLE_TIME = 600
+# the sentences with a time of day, in their first field
+TIMED_SENTENCES = (b"GGA", b"RMC", b"GNS", b"ZDA")
+SECONDS_PER_DAY = 86400
+# compressed log files are gzip members of about this much text each, see compress_log
+BLOCK_SIZE = 1024 * 1024
+# the block table has the offset of each block in the text and in the compressed file
+BLOCK_ENTRY = struct.Struct("<QQ")
+# decompressed blocks kept in memory per compressed log
+CACHED_BLOCKS = 4
+
+class NMEALogWriter:
+    """Long-lived writer for one mower's NMEA log files. Unlike
+    :meth:`database.MowerDatabase.append_nmea_logfile`, which queries the database and opens the
+    file for every sentence, this keeps the current log file open with a write buffer, and only
+    touches ``nmea_logs`` when a file is started and every ``heartbeat`` seconds. Example usage:
+
+    .. code-block:: python
+
+        pool = database.ConnectionPool(size = 2, host = "db")
+        with nmealog.NMEALogWriter(iqn, "/logs", lambda: database.MowerDatabase(pool = pool)) as writer:
+            for sentence in stream:
+                writer.write(sentence)
+
+    Files are rotated with the same rule as :meth:`database.MowerDatabase.get_nmea_logfile`: if
+    nothing has been written for ``max_age`` seconds, the next sentence starts a new file. When it
+    first opens a file the writer carries on with the mower's current log file if it has one, e.g.
+    after a restart.
+
+    Rotation, flushing and the heartbeat happen when a sentence is written. Callers which may
+    go a long time between sentences should also call :meth:`tick` periodically.
+
+    The writer also keeps the file's sidecar index up to date for :class:`NMEALogReader`, when it
+    starts a new file or carries on one which already has an index, so readers never need to
+    build it themselves.
+
+    Arguments:
+        iqn (str): The mower's iqn
+        basedir (str): The directory to put log files in
+        db_factory (callable): Returns a new :class:`database.MowerDatabase`, ideally one using a :class:`database.ConnectionPool`
+        max_age (int): Seconds without a sentence after which a new file is started
+        heartbeat (float): How often ``nmea_logs.last_updated`` is updated while sentences are arriving, in seconds. Must be less than ``max_age``
+        flush_interval (float): How often the write buffer is flushed to disk, in seconds
+        buffer_size (int): The size of the write buffer, in bytes
+    """
+    def __init__(self, iqn, basedir, db_factory, max_age = 60, heartbeat = None, flush_interval = 1.0, buffer_size = 64 * 1024):
+        self.iqn = iqn
+        self.basedir = basedir
+        self.db_factory = db_factory
+        self.max_age = max_age
+        self.heartbeat = max_age / 2 if heartbeat is None else heartbeat
+        self.flush_interval = flush_interval
+        self.buffer_size = buffer_size
+
+        self.path = None
+        self.__file = None
+        self.__index = None
+        self.__indexed_to = 0
+        self.__lock = threading.Lock()
+        self.__last_write = self.__last_flush = self.__last_heartbeat = 0
+        self.__last_write_at = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    def write(self, sentence: bytes):
+        """Append a sentence to the current log file, starting a new one if needed.
+
+        Arguments:
+            sentence (bytes): A NMEA sentence, including its line ending
+        """
+        with self.__lock:
+            now = time.monotonic()
+            if self.__file is not None and now - self.__last_write > self.max_age:
+                self.__close_file()
+            if self.__file is None:
+                self.__open_file(now)
+
+            if self.__index is not None and self.__file.tell() - self.__indexed_to >= INDEX_BYTES:
+                # indexed by the sentence's own time, like NMEALogReader does, so at the next timed one
+                timed = sentence_time(sentence, time.time())
+                if timed is not None:
+                    self.__indexed_to = self.__file.tell()
+                    self.__index.write(INDEX_ENTRY.pack(timed, self.__indexed_to))
+            self.__file.write(sentence)
+            self.__last_write = now
+            self.__last_write_at = datetime.datetime.now()
+            self.__maintain(now)
+
+    def tick(self):
+        """Flush the write buffer, send a heartbeat and close an idle file, if they are due."""
+        with self.__lock:
+            if self.__file is None:
+                return
+            now = time.monotonic()
+            if now - self.__last_write > self.max_age:
+                self.__close_file()
+            else:
+                self.__maintain(now)
+
+    def close(self):
+        """Flush and close the current log file."""
+        with self.__lock:
+            if self.__file is not None:
+                self.__close_file()
+
+    def __open_file(self, now):
+        with self.db_factory() as db:
+            if self.path is None:
+                self.path = db.get_nmea_logfile(self.iqn, self.basedir, self.max_age)
+            else:
+                self.path = db.create_nmea_logfile(self.iqn, self.basedir)
+        self.__file = open(self.path, "ab", buffering = self.buffer_size)
+        self.__last_flush = self.__last_heartbeat = now
+
+        # only index files from the start, anything else is left to the reader
+        index_path = index_path_for(self.path)
+        if self.__file.tell() == 0 or os.path.exists(index_path):
+            self.__index = open(index_path, "ab")
+            entries = read_index(index_path)
+            self.__indexed_to = entries[-1][1] if entries else -INDEX_BYTES
+
+    def __maintain(self, now):
+        if now - self.__last_flush >= self.flush_interval:
+            # the file first, so the index never points past what is on disk
+            self.__file.flush()
+            if self.__index is not None:
+                self.__index.flush()
+            self.__last_flush = now
+        if now - self.__last_heartbeat >= self.heartbeat:
+            with self.db_factory() as db:
+                db.touch_nmea_logfile(self.path)
+            self.__last_heartbeat = now
+
+    def __close_file(self):
+        self.__file.close()
+        self.__file = None
+        if self.__index is not None:
+            self.__index.close()
+            self.__index = None
+        # bring last_updated up to the time of the last sentence
+        if self.__last_write > self.__last_heartbeat:
+            with self.db_factory() as db:
+                db.touch_nmea_logfile(self.path, self.__last_write_at)
+
+class NMEALogReader:
+    """Random access by time into a NMEA log file, e.g. to replay one minute of a mower's
+    session without reading the whole file first. The file is memory-mapped, and a sparse
+    index of the time of the sentence at about every :data:`INDEX_BYTES` bytes is kept in a
+    sidecar file next to it (see :func:`index_path_for`), so reading a window only reads the
+    window and at most :data:`INDEX_BYTES` before it, however big the file is. Example usage:
+
+    .. code-block:: python
+
+        with nmealog.NMEALogReader(path) as reader:
+            for received_at, sentence in reader.read(datetime.datetime(2023, 3, 14, 9, 30), datetime.datetime(2023, 3, 14, 9, 31)):
+                print(received_at, sentence)
+
+    The index is written by :class:`NMEALogWriter` as the file is written. For files it
+    didn't index, or only partly, the rest of the index is built on first access, by sampling a
+    sentence every :data:`INDEX_BYTES` bytes, which only touches a page of the file each time.
+    That is saved if the directory is writable and the file hasn't changed for
+    :data:`INDEX_SETTLE_TIME` seconds, so no writer still has it open.
+
+    Compressed log files (see :func:`compress_log`) are read the same way, decompressing only
+    the blocks the window is in.
+
+    Sentences are timed by the UTC time of day in ``GGA``, ``RMC``, ``GNS`` and ``ZDA`` sentences,
+    and other sentences take the time of the timed sentence before them. ``RMC`` and ``ZDA``
+    sentences have the date too; other times are taken to be on whichever day puts them
+    nearest the sentence before.
+
+    Arguments:
+        path (str): The log file, as in ``nmea_logs.path``
+        created_at (datetime.datetime): When the file was started, as in ``nmea_logs.created_at``, to date
+            the start of the file if it has no ``RMC`` or ``ZDA`` sentences. Defaults to when the file was last changed
+    """
+    def __init__(self, path, created_at = None):
+        self.path = path
+        self.__map = open_log(path)
+        self.size = self.__map.size
+        self.__anchor = (created_at or datetime.datetime.fromtimestamp(os.path.getmtime(path))).timestamp()
+
+        entries = read_index(index_path_for(path))
+        # ignore entries past the end of the file, e.g. if it was truncated
+        entries = [entry for entry in entries if entry[1] < self.size]
+        self.__times = [t for t, _ in entries]
+        self.__offsets = [offset for _, offset in entries]
+        self.__extend_index()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    def close(self):
+        """Unmap and close the file."""
+        self.__map.close()
+
+    def read(self, start, end):
+        """Reads the sentences in a window of time.
+
+        Arguments:
+            start (datetime.datetime): The start of the window, inclusive. Naive datetimes are in the server's local time, like the database
+            end (datetime.datetime): The end of the window, exclusive
+
+        Yields:
+            (datetime.datetime, bytes): When each sentence is from, in the server's local time, and the sentence with its line ending
+        """
+        start, end = start.timestamp(), end.timestamp()
+        # from the last entry strictly before the window, as an entry timed at its start can be
+        # partway through that second, after other sentences from it
+        i = bisect.bisect_left(self.__times, start) - 1
+        if i >= 0:
+            position, anchor = self.__offsets[i], self.__times[i]
+        else:
+            position, anchor = 0, self.__anchor
+
+        current = when = None
+        while position < self.size:
+            newline = self.__map.find(b"\n", position)
+            if newline == -1:
+                # a sentence still being written
+                break
+            line = self.__map[position:newline + 1]
+            position = newline + 1
+
+            timed = sentence_time(line, anchor)
+            if timed is not None and timed != current:
+                anchor = current = timed
+                when = datetime.datetime.fromtimestamp(current)
+            if current is None or current < start:
+                continue
+            if current >= end:
+                break
+            yield when, line
+
+    def __extend_index(self):
+        # sample a sentence every INDEX_BYTES past the last entry
+        indexed_to = self.__offsets[-1] if self.__offsets else -INDEX_BYTES
+        anchor = self.__times[-1] if self.__times else self.__anchor
+        added = []
+        for sample in range(indexed_to + INDEX_BYTES, self.size, INDEX_BYTES):
+            # the first whole timed sentence at or after the sample
+            position = 0 if sample == 0 else self.__map.find(b"\n", sample - 1) + 1
+            if position == 0 and sample > 0:
+                break
+            while position < self.size:
+                newline = self.__map.find(b"\n", position)
+                if newline == -1 or newline - sample > INDEX_BYTES:
+                    break
+                timed = sentence_time(self.__map[position:newline + 1], anchor)
+                if timed is not None:
+                    # the index must stay in order, so skip the clock going backwards
+                    if not self.__times or timed >= self.__times[-1]:
+                        self.__times.append(timed)
+                        self.__offsets.append(position)
+                        added.append(INDEX_ENTRY.pack(timed, position))
+                    anchor = timed
+                    break
+                position = newline + 1
+
+        if added and self.__settled():
+            try:
+                with open(index_path_for(self.path), "ab") as f:
+                    f.write(b"".join(added))
+            except OSError:
+                # e.g. a read-only volume, the index is just rebuilt next time
+                pass
+
+    def __settled(self):
+        if isinstance(self.__map, CompressedLog):
+            return True
+        try:
+            return time.time() - os.path.getmtime(self.path) >= INDEX_SETTLE_TIME
+        except OSError:
+            return False
+
+class PlainLog:
+    """A memory-mapped, uncompressed log file, for :func:`open_log`. Has the parts of the
+    ``bytes`` interface which :class:`NMEALogReader` uses, ``find`` and slicing.
+
+    Arguments:
+        path (str): The log file
+    """
+    def __init__(self, path):
+        self.__file = open(path, "rb")
+        self.size = os.fstat(self.__file.fileno()).st_size
+        # empty files can't be mapped
+        self.__map = mmap.mmap(self.__file.fileno(), 0, access = mmap.ACCESS_READ) if self.size else b""
+        if hasattr(self.__map, "madvise"):
+            self.__map.madvise(mmap.MADV_RANDOM)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    def __getitem__(self, key):
+        return self.__map[key]
+
+    def find(self, sub, start = 0):
+        return self.__map.find(sub, start)
+
+    def close(self):
+        if self.size:
+            self.__map.close()
+        self.__file.close()
+
+class CompressedLog:
+    """A log file compressed with :func:`compress_log`, with the same interface as :class:`PlainLog`
+    over the uncompressed text. Blocks are decompressed as they are needed, and the last few
+    kept in memory, so reading a small part of a big file only decompresses a block or two.
+    ``find`` only finds single bytes, e.g. line endings, which are never split between blocks.
+
+    Arguments:
+        path (str): The compressed log file
+    """
+    def __init__(self, path):
+        self.__file = open(path, "rb")
+        compressed_size = os.fstat(self.__file.fileno()).st_size
+        self.__map = mmap.mmap(self.__file.fileno(), 0, access = mmap.ACCESS_READ) if compressed_size else b""
+        entries = read_block_table(block_table_path_for(path))
+        # the last entry is the end of the file
+        self.__starts = [start for start, _ in entries]
+        self.__offsets = [offset for _, offset in entries]
+        self.size = self.__starts[-1] if entries else 0
+        self.__cache = collections.OrderedDict()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    def __block(self, i):
+        data = self.__cache.get(i)
+        if data is None:
+            data = zlib.decompress(self.__map[self.__offsets[i]:self.__offsets[i + 1]], wbits = 31)
+            self.__cache[i] = data
+            if len(self.__cache) > CACHED_BLOCKS:
+                self.__cache.popitem(last = False)
+        else:
+            self.__cache.move_to_end(i)
+        return data
+
+    def __getitem__(self, key):
+        start, stop, _ = key.indices(self.size)
+        parts = []
+        i = bisect.bisect_right(self.__starts, start) - 1
+        while start < stop and i < len(self.__starts) - 1:
+            block = self.__block(i)
+            parts.append(block[start - self.__starts[i]:stop - self.__starts[i]])
+            i += 1
+            start = self.__starts[i]
+        return b"".join(parts)
+
+    def find(self, sub, start = 0):
+        i = max(0, bisect.bisect_right(self.__starts, start) - 1)
+        while i < len(self.__starts) - 1:
+            found = self.__block(i).find(sub, max(0, start - self.__starts[i]))
+            if found != -1:
+                return self.__starts[i] + found
+            i += 1
+        return -1
+
+    def close(self):
+        self.__cache.clear()
+        if self.size:
+            self.__map.close()
+        self.__file.close()
+
+def open_log(path):
+    """Opens a log file for random access, decompressing it transparently if it was compressed with :func:`compress_log`.
+
+    Arguments:
+        path (str): The log file, as in ``nmea_logs.path``
+
+    Returns:
+        PlainLog: A :class:`PlainLog` or :class:`CompressedLog`, with a ``size`` in bytes of text
+    """
+    if path.endswith(".gz"):
+        return CompressedLog(path)
+    return PlainLog(path)
+
+def compress_log(path, dest = None, block_size = BLOCK_SIZE, level = 9):
+    """Compresses a log file which is finished with into a seekable compressed log file. The text
+    is split on line endings into blocks of about ``block_size`` bytes, and each is compressed
+    into its own gzip member, so the result is still an ordinary gzip file which ``zcat`` can
+    read, but any block can be decompressed by itself. The offset of each block is stored in
+    a block table file next to it (see :func:`block_table_path_for`), and the log file's sidecar
+    index is copied over as it is, since it indexes the text. The original file isn't changed.
+
+    Arguments:
+        path (str): The log file
+        dest (str): Where to put the compressed log file, which must end in ``.gz``. Defaults to next to the original
+        block_size (int): About how much text to compress per block, in bytes
+        level (int): The gzip compression level
+
+    Returns:
+        (str, int, int): The compressed log file's path, and the sizes of the original and of the compressed file and its block table
+    """
+    dest = dest or path + ".gz"
+    if not dest.endswith(".gz"):
+        raise ValueError("Compressed log files must end in .gz")
+
+    entries = []
+    with open(path, "rb") as f, open(dest + ".tmp", "wb") as out:
+        while True:
+            data = f.read(block_size)
+            if not data:
+                break
+            # blocks always end at the end of a line
+            data += f.readline()
+            entries.append((f.tell() - len(data), out.tell()))
+            # no name or time in the header, so the same log always compresses the same
+            out.write(gzip.compress(data, compresslevel = level, mtime = 0))
+        entries.append((f.tell(), out.tell()))
+        out.flush()
+        os.fsync(out.fileno())
+
+    # the sidecars first, so that if the compressed file exists they do too
+    with open(block_table_path_for(dest), "wb") as f:
+        f.write(b"".join(BLOCK_ENTRY.pack(*entry) for entry in entries))
+    if os.path.exists(index_path_for(path)):
+        shutil.copyfile(index_path_for(path), index_path_for(dest))
+    os.replace(dest + ".tmp", dest)
+    return dest, entries[-1][0], entries[-1][1] + len(entries) * BLOCK_ENTRY.size
+
+def remove_log(path):
+    """Deletes a log file and its sidecar files, e.g. once it has been compressed.
+
+    Arguments:
+        path (str): The log file
+    """
+    for sidecar in (index_path_for(path), block_table_path_for(path), path):
+        try:
+            os.remove(sidecar)
+        except FileNotFoundError:
+            pass
+
+def block_table_path_for(path):
+    """The path of a compressed log file's block table.
+
+    Arguments:
+        path (str): The compressed log file
+
+    Returns:
+        str: The block table's path
+    """
+    return path + ".blocks"
+
+def read_block_table(path):
+    # (offset in the text, offset in the compressed file) of each block, then of the end
+    with open(path, "rb") as f:
+        return list(BLOCK_ENTRY.iter_unpack(f.read()))
+
+def index_path_for(path):
+    """The path of a log file's sidecar index.
+
+    Arguments:
+        path (str): The log file
+
+    Returns:
+        str: The index's path
+    """
+    return path + ".idx"
+
+def read_index(path):
+    """Reads a sidecar index.
+
+    Arguments:
+        path (str): The index's path
+
+    Returns:
+        list: ``(unix time, byte offset)`` tuples, in order of offset with times never going backwards,
+        or an empty list if there is no index
+    """
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except FileNotFoundError:
+        return []
+    # ignore a partly written last entry
+    data = data[:len(data) - len(data) % INDEX_ENTRY.size]
+    # entries are appended in order, but sort and drop duplicates anyway, as bisecting the
+    # index relies on it
+    entries = []
+    for timed, offset in sorted(set(INDEX_ENTRY.iter_unpack(data)), key = lambda entry: (entry[1], entry[0])):
+        if not entries or (offset > entries[-1][1] and timed >= entries[-1][0]):
+            entries.append((timed, offset))
+    return entries
+
+def sentence_time(line, anchor):
+    """The UTC time of a sentence, if it has one.
+
+    Arguments:
+        line (bytes): A NMEA sentence
+        anchor (float): The unix time of a nearby sentence, to date sentences which only have a time of day
+
+    Returns:
+        float: A unix time, or ``None`` if the sentence doesn't have one
+    """
+    kind = line[3:6]
+    if kind not in TIMED_SENTENCES:
+        return None
+    fields = line.split(b",", 10)
+    try:
+        stamp = fields[1]
+        seconds = int(stamp[0:2]) * 3600 + int(stamp[2:4]) * 60 + float(stamp[4:])
+        if kind == b"RMC" and len(fields[9]) == 6:
+            date = fields[9]
+            return calendar.timegm((2000 + int(date[4:6]), int(date[2:4]), int(date[0:2]), 0, 0, 0)) + seconds
+        if kind == b"ZDA":
+            return calendar.timegm((int(fields[4]), int(fields[3]), int(fields[2]), 0, 0, 0)) + seconds
+    except (ValueError, IndexError):
+        return None
+
+    # whichever day puts it nearest the anchor
+    timed = anchor - anchor % SECONDS_PER_DAY + seconds
+    if timed - anchor > SECONDS_PER_DAY / 2:
+        timed -= SECONDS_PER_DAY
+    elif anchor - timed > SECONDS_PER_DAY / 2:
+        timed += SECONDS_PER_DAY
+    return timed
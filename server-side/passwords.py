@@ -0,0 +1,131 @@
+import concurrent.futures
+import threading
+import hashlib
+import secrets
+import hmac
+
+class PasswordHasher:
+    """Hashes and verifies passwords with salted scrypt, on a bounded pool of workers so that
+    a burst of signins can't tie up every thread serving requests. Example usage:
+
+    .. code-block:: python
+
+        hasher = passwords.PasswordHasher(n = 2 ** 14, workers = 2)
+        pw_hash = hasher.hash("password")
+        ok, new_hash = hasher.verify("password", pw_hash)
+
+    Hashes are stored as ``scrypt$n$r$p$salt$hash``. Hashes from before this class existed are a
+    bare, unsalted SHA256 hex digest; :meth:`verify` still accepts them, and returns a new scrypt
+    hash to replace them with. It does the same for scrypt hashes made with a different cost.
+
+    At most ``workers`` hashes are computed at once and ``max_pending`` more wait for a worker. Past
+    that, work is refused with :class:`PasswordHasherBusyException` rather than queued, so the callers
+    waiting on hashes (e.g. waitress threads) are bounded too. ``hashlib.scrypt`` releases the GIL,
+    so threads are enough to use more than one core.
+
+    Arguments:
+        n (int): scrypt CPU/memory cost, a power of two. Doubling it doubles the time per hash
+        r (int): scrypt block size
+        p (int): scrypt parallelism
+        workers (int): How many hashes can be computed at once
+        max_pending (int): How many hashes can wait for a worker
+        wait (float): How long to wait for space in the queue before refusing work, in seconds
+    """
+    def __init__(self, n = 2 ** 14, r = 8, p = 1, workers = 2, max_pending = 2, wait = 0.5):
+        self.n = n
+        self.r = r
+        self.p = p
+        self.wait = wait
+
+        self.__executor = concurrent.futures.ThreadPoolExecutor(workers, thread_name_prefix = "password-hasher")
+        self.__slots = threading.BoundedSemaphore(workers + max_pending)
+
+    def hash(self, password: str):
+        """Hash a new password. Blocks until it's done.
+
+        Arguments:
+            password (str): The plain text password
+
+        Raises:
+            PasswordHasherBusyException: If too many hashes are already being computed
+
+        Returns:
+            str: The hash to store
+        """
+        return self.submit_hash(password).result()
+
+    def verify(self, password: str, pw_hash: str):
+        """Check a password against a stored hash. Blocks until it's done.
+
+        Arguments:
+            password (str): The plain text password
+            pw_hash (str): The stored hash, from :meth:`hash` or a legacy SHA256 hex digest
+
+        Raises:
+            PasswordHasherBusyException: If too many hashes are already being computed
+
+        Returns:
+            (bool, str): Whether the password is right, and if it is and the stored hash is out of date, a new hash to store in its place, else ``None``
+        """
+        return self.submit_verify(password, pw_hash).result()
+
+    def submit_hash(self, password: str, wait = None):
+        """Like :meth:`hash`, but returns a future instead of blocking, e.g. for use with ``asyncio.wrap_future``.
+
+        Arguments:
+            password (str): The plain text password
+            wait (float): Overrides how long to wait for space in the queue. Pass ``0`` from an event loop
+
+        Returns:
+            concurrent.futures.Future: A future for the result of :meth:`hash`
+        """
+        return self.__submit(wait, self.__hash, password)
+
+    def submit_verify(self, password: str, pw_hash: str, wait = None):
+        """Like :meth:`verify`, but returns a future instead of blocking, e.g. for use with ``asyncio.wrap_future``.
+
+        Arguments:
+            password (str): The plain text password
+            pw_hash (str): The stored hash
+            wait (float): Overrides how long to wait for space in the queue. Pass ``0`` from an event loop
+
+        Returns:
+            concurrent.futures.Future: A future for the result of :meth:`verify`
+        """
+        return self.__submit(wait, self.__verify, password, pw_hash)
+
+    def __submit(self, wait, func, *args):
+        if not self.__slots.acquire(timeout = self.wait if wait is None else wait):
+            raise PasswordHasherBusyException("Too many passwords are being hashed, try again later")
+        try:
+            future = self.__executor.submit(func, *args)
+        except:
+            self.__slots.release()
+            raise
+        future.add_done_callback(lambda _: self.__slots.release())
+        return future
+
+    def __scrypt(self, password, salt, n, r, p):
+        # maxmem has to allow for the 128 * n * r bytes scrypt needs, openssl's default is 32MiB
+        return hashlib.scrypt(password.encode(), salt = salt, n = n, r = r, p = p, maxmem = 256 * n * r + 1024 * 1024)
+
+    def __hash(self, password):
+        salt = secrets.token_bytes(16)
+        digest = self.__scrypt(password, salt, self.n, self.r, self.p)
+        return "scrypt$%d$%d$%d$%s$%s" % (self.n, self.r, self.p, salt.hex(), digest.hex())
+
+    def __verify(self, password, pw_hash):
+        if "$" not in pw_hash:
+            # legacy, unsalted SHA256
+            ok = hmac.compare_digest(hashlib.sha256(password.encode()).hexdigest(), pw_hash)
+            return ok, self.__hash(password) if ok else None
+
+        _, n, r, p, salt, digest = pw_hash.split("$")
+        n, r, p = int(n), int(r), int(p)
+        ok = hmac.compare_digest(self.__scrypt(password, bytes.fromhex(salt), n, r, p).hex(), digest)
+        if ok and (n, r, p) != (self.n, self.r, self.p):
+            return ok, self.__hash(password)
+        return ok, None
+
+class PasswordHasherBusyException(Exception):
+    pass
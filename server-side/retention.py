@@ -0,0 +1,120 @@
+"""Keeps the telemetry tables split into partitions by time, and drops old partitions under a
+retention policy, so that the tables don't grow forever, and inserting or querying recent
+telemetry costs the same however much history is kept.
+"""
+import threading
+import datetime
+
+class TelemetryRetention(threading.Thread):
+    """Background thread which looks after the partitions of ``telemetry_points``, one per day,
+    and ``telemetry_minutes``, one per month (see :data:`database.PARTITIONED_TABLES`). Every
+    ``interval`` seconds it:
+
+    * Adds partitions for the next ``days_ahead`` days and the next two months, so new rows never land in the catch-all partition
+    * Rolls each day of ``telemetry_points`` older than ``raw_days`` up into a row per mower per minute in ``telemetry_minutes``, with :meth:`database.MowerDatabase.rollup_telemetry`, then drops its partition
+    * Drops months of ``telemetry_minutes`` older than ``rollup_days``, if it is set
+
+    Dropping a partition takes about as long however many rows it holds, unlike ``DELETE`` ing
+    them. Example usage:
+
+    .. code-block:: python
+
+        telemetry_retention = retention.TelemetryRetention(lambda: database.MowerDatabase(pool = pool), raw_days = 90)
+        telemetry_retention.start()
+
+    Arguments:
+        db_factory (callable): Returns a new :class:`database.MowerDatabase`, ideally one using a :class:`database.ConnectionPool`
+        raw_days (int): How many days to keep every fix for
+        rollup_days (int): How many days to keep the per-minute rollups for, forever if ``None``
+        days_ahead (int): How many days of partitions to add in advance
+        interval (float): Seconds between runs
+    """
+    def __init__(self, db_factory, raw_days = 90, rollup_days = None, days_ahead = 7, interval = 3600):
+        super().__init__(name = "telemetry-retention", daemon = True)
+        self.db_factory = db_factory
+        self.raw_days = raw_days
+        self.rollup_days = rollup_days
+        self.days_ahead = days_ahead
+        self.interval = interval
+
+        self.partitions_added = 0
+        self.partitions_dropped = 0
+        self.minutes_rolled_up = 0
+        self.__stopping = threading.Event()
+
+    def run(self):
+        while not self.__stopping.is_set():
+            try:
+                self.maintain()
+            except Exception as e:
+                print("Failed to maintain the telemetry partitions: %s" % e)
+            self.__stopping.wait(self.interval)
+
+    def maintain(self, now = None):
+        """Add and drop partitions now.
+
+        Arguments:
+            now (datetime.datetime): The time to apply the retention policy at, defaults to now
+        """
+        today = (now or datetime.datetime.now()).replace(hour = 0, minute = 0, second = 0, microsecond = 0)
+        with self.db_factory() as db:
+            # from the oldest fix, so that fixes from before there were partitions, e.g. from
+            # database.MowerDatabase.migrate_telemetry, are split into days too
+            oldest = db.get_oldest("telemetry_points") or today
+            self.partitions_added += db.add_partitions("telemetry_points", days_between(oldest, today + datetime.timedelta(days = self.days_ahead)))
+            oldest = db.get_oldest("telemetry_minutes") or today
+            self.partitions_added += db.add_partitions("telemetry_minutes", months_between(oldest, add_months(today, 2)))
+
+            cutoff = today - datetime.timedelta(days = self.raw_days)
+            for name, end in db.get_partitions("telemetry_points"):
+                if end is None or end > cutoff or self.__stopping.is_set():
+                    break
+                # the rollups are committed first, so if dropping fails they are written again next time
+                self.minutes_rolled_up += db.rollup_telemetry(name)
+                db.drop_partitions("telemetry_points", [name])
+                self.partitions_dropped += 1
+
+            if self.rollup_days is not None:
+                cutoff = today - datetime.timedelta(days = self.rollup_days)
+                expired = [name for name, end in db.get_partitions("telemetry_minutes") if end is not None and end <= cutoff]
+                db.drop_partitions("telemetry_minutes", expired)
+                self.partitions_dropped += len(expired)
+
+    def stop(self):
+        """Stop after the partition being rolled up, if any."""
+        self.__stopping.set()
+
+    def stats(self):
+        """Returns counters, so we can check it is working.
+
+        Returns:
+            dict: JSON-serializable dictionary
+        """
+        return {
+            "partitions_added": self.partitions_added,
+            "partitions_dropped": self.partitions_dropped,
+            "minutes_rolled_up": self.minutes_rolled_up
+        }
+
+def days_between(start, end):
+    # the end of every day from the one containing start up to end
+    day = start.replace(hour = 0, minute = 0, second = 0, microsecond = 0) + datetime.timedelta(days = 1)
+    days = []
+    while day <= end:
+        days.append(day)
+        day += datetime.timedelta(days = 1)
+    return days
+
+def months_between(start, end):
+    # the end of every month from the one containing start up to end
+    month = add_months(start.replace(day = 1, hour = 0, minute = 0, second = 0, microsecond = 0), 1)
+    months = []
+    while month <= end:
+        months.append(month)
+        month = add_months(month, 1)
+    return months
+
+def add_months(date, months):
+    # the first of the month some months after date's
+    month = date.month - 1 + months
+    return date.replace(year = date.year + month // 12, month = month % 12 + 1, day = 1)
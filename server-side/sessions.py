@@ -0,0 +1,154 @@
+import collections
+import threading
+import datetime
+import time
+
+class SessionCache:
+    """Thread-safe, in-process LRU cache from session cookies to :class:`models.User` s, so that
+    authenticating a request doesn't need a database round trip every time. Example usage:
+
+    .. code-block:: python
+
+        cache = sessions.SessionCache(maxsize = 10000, ttl = 60)
+        user = cache.get(session_id)
+        if user is None:
+            with database.MowerDatabase() as db:
+                user, expire_at = db.get_session(session_id)
+            cache.put(session_id, user, expire_at)
+
+    An entry is never served after its session's ``expire_at``, nor for longer than ``ttl``
+    seconds after it was cached. Sessions revoked by this process should be removed with
+    :meth:`invalidate`; ``ttl`` bounds how long a session revoked by another process
+    can still be used.
+
+    Arguments:
+        maxsize (int): The maximum number of cached sessions, the least recently used is dropped first
+        ttl (int): The maximum number of seconds to cache a session for
+    """
+    def __init__(self, maxsize = 10000, ttl = 60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+        self.__lock = threading.Lock()
+        # session id -> (user, time.monotonic() deadline)
+        self.__entries = collections.OrderedDict()
+
+    def get(self, session_id):
+        """Look up a session.
+
+        Arguments:
+            session_id (str): A session id cookie
+
+        Returns:
+            models.User: The associated user, or ``None`` if the session isn't cached or has expired
+        """
+        with self.__lock:
+            entry = self.__entries.get(session_id)
+            if entry is not None:
+                if entry[1] > time.monotonic():
+                    self.__entries.move_to_end(session_id)
+                    self.hits += 1
+                    return entry[0]
+                del self.__entries[session_id]
+            self.misses += 1
+            return None
+
+    def put(self, session_id, user, expire_at):
+        """Cache a session.
+
+        Arguments:
+            session_id (str): A session id cookie
+            user (models.User): The user associated with the session
+            expire_at (datetime.datetime): When the session expires, as stored in the ``sessions`` table
+        """
+        lifetime = min(self.ttl, (expire_at - datetime.datetime.now()).total_seconds())
+        if lifetime <= 0:
+            return
+
+        with self.__lock:
+            self.__entries[session_id] = (user, time.monotonic() + lifetime)
+            self.__entries.move_to_end(session_id)
+            while len(self.__entries) > self.maxsize:
+                self.__entries.popitem(last = False)
+
+    def invalidate(self, session_id):
+        """Remove a session from the cache, e.g. when it is revoked.
+
+        Arguments:
+            session_id (str): A session id cookie
+        """
+        with self.__lock:
+            self.__entries.pop(session_id, None)
+
+    def stats(self):
+        """Returns the hit and miss counters, so we can check the cache is working.
+
+        Returns:
+            dict: JSON-serializable dictionary
+        """
+        with self.__lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else None,
+                "size": len(self.__entries),
+                "maxsize": self.maxsize
+            }
+
+class SessionSweeper(threading.Thread):
+    """Background thread which deletes expired sessions, so the ``sessions`` table doesn't grow
+    forever. Every ``interval`` seconds it deletes expired sessions ``batch_size`` at a time with
+    :meth:`database.MowerDatabase.delete_expired_sessions`, pausing between batches, so it never
+    holds locks on the table for long. Example usage:
+
+    .. code-block:: python
+
+        sweeper = sessions.SessionSweeper(lambda: database.MowerDatabase(pool = pool))
+        sweeper.start()
+
+    Arguments:
+        db_factory (callable): Returns a new :class:`database.MowerDatabase`, ideally one using a :class:`database.ConnectionPool`
+        interval (float): Seconds between sweeps
+        batch_size (int): The most sessions deleted per transaction
+        pause (float): Seconds to wait between batches
+    """
+    def __init__(self, db_factory, interval = 600, batch_size = 500, pause = 0.1):
+        super().__init__(name = "session-sweeper", daemon = True)
+        self.db_factory = db_factory
+        self.interval = interval
+        self.batch_size = batch_size
+        self.pause = pause
+        self.deleted = 0
+        self.__stopping = threading.Event()
+
+    def run(self):
+        while not self.__stopping.wait(self.interval):
+            try:
+                self.sweep()
+            except Exception as e:
+                print("Failed to delete expired sessions: %s" % e)
+
+    def sweep(self):
+        """Delete all the expired sessions now.
+
+        Returns:
+            int: The number of sessions deleted
+        """
+        total = 0
+        while not self.__stopping.is_set():
+            with self.db_factory() as db:
+                deleted = db.delete_expired_sessions(self.batch_size)
+            total += deleted
+            if deleted < self.batch_size:
+                break
+            time.sleep(self.pause)
+
+        self.deleted += total
+        return total
+
+    def stop(self):
+        """Stop the sweeper after the batch it is deleting, if any."""
+        self.__stopping.set()
@@ -0,0 +1,265 @@
+"""Level of detail simplification of area polygons, for clients drawing overview maps which don't
+need every vertex. Rings are simplified with the Douglas-Peucker algorithm on the horizontal
+``(x, z)`` plane, with the distances for each step computed over all the vertices at once with
+NumPy. Tolerances are in metres: coordinates are projected onto a flat plane around the first
+vertex first, which is accurate enough over the size of a field.
+"""
+import collections
+import threading
+import models
+import numpy
+import math
+
+# metres per degree of latitude, and of longitude at the equator
+METRES_PER_DEGREE = 111320.0
+# tolerances are rounded down to a power of two, so that similar tolerances share cache entries
+MIN_TOLERANCE = 2.0 ** -6
+MAX_TOLERANCE = 2.0 ** 12
+# the tolerance which hides detail smaller than a pixel at web map zoom level 0
+ZOOM_0_METRES_PER_PIXEL = 156543.03
+
+def tolerance_bucket(tolerance):
+    """Rounds a tolerance down to the power of two it is cached under, so simplified
+    polygons are never coarser than asked for.
+
+    Arguments:
+        tolerance (float): A tolerance in metres
+
+    Returns:
+        float: The tolerance to simplify with, or ``0`` for no simplification
+    """
+    if tolerance < MIN_TOLERANCE:
+        return 0
+    return 2.0 ** math.floor(math.log2(min(tolerance, MAX_TOLERANCE)))
+
+def zoom_tolerance(zoom):
+    """The tolerance which hides detail smaller than a pixel at a web map zoom level,
+    as used by e.g. Leaflet and Google Maps.
+
+    Arguments:
+        zoom (float): The zoom level, clamped to between 0 and 30
+
+    Returns:
+        float: A tolerance in metres
+    """
+    return ZOOM_0_METRES_PER_PIXEL / 2 ** max(0, min(zoom, 30))
+
+def project(coords):
+    """Projects ``(x, y, z)`` coordinates onto a flat plane in metres, around the first one.
+
+    Arguments:
+        coords (numpy.ndarray): An ``(n, 3)`` array of coordinates
+
+    Returns:
+        numpy.ndarray: An ``(n, 2)`` array of ``(north, east)`` metres
+    """
+    origin = coords[0]
+    points = numpy.empty((len(coords), 2))
+    points[:, 0] = (coords[:, 0] - origin[0]) * METRES_PER_DEGREE
+    points[:, 1] = (coords[:, 2] - origin[2]) * METRES_PER_DEGREE * math.cos(math.radians(origin[0]))
+    return points
+
+def douglas_peucker(points, tolerance):
+    """Simplifies a line with the Douglas-Peucker algorithm.
+
+    Arguments:
+        points (numpy.ndarray): An ``(n, 2)`` array of points
+        tolerance (float): The furthest any removed point may be from the simplified line
+
+    Returns:
+        numpy.ndarray: A boolean mask of the points to keep. The first and last are always kept
+    """
+    keep = numpy.zeros(len(points), dtype = bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        distances = line_distances(points[start + 1:end], points[start], points[end])
+        i = int(numpy.argmax(distances))
+        if distances[i] > tolerance:
+            i += start + 1
+            keep[i] = True
+            stack.append((start, i))
+            stack.append((i, end))
+    return keep
+
+def line_distances(points, a, b):
+    # perpendicular distances of points from the line through a and b
+    direction = b - a
+    length = math.hypot(direction[0], direction[1])
+    offsets = points - a
+    if length == 0:
+        return numpy.hypot(offsets[:, 0], offsets[:, 1])
+    return numpy.abs(direction[0] * offsets[:, 1] - direction[1] * offsets[:, 0]) / length
+
+def simplify_ring(coords, tolerance):
+    """Simplifies a polygon ring. The ring is split in two at the vertex furthest from the
+    first, and each half simplified separately, so that the result is still a closed
+    ring with at least three vertices.
+
+    Arguments:
+        coords (list): A list of ``(x, y, z)`` coordinates, or an ``(n, 3)`` array
+        tolerance (float): The furthest any removed vertex may be from the simplified ring, in metres
+
+    Returns:
+        list: The simplified ring, as ``[x, y, z]`` lists
+    """
+    coords = numpy.asarray(coords, dtype = float).reshape(-1, 3)
+    if len(coords) <= 4 or tolerance <= 0:
+        return coords.tolist()
+
+    points = project(coords)
+    far = int(numpy.argmax(numpy.hypot(points[:, 0], points[:, 1])))
+    if far == 0:
+        # every vertex is in the same place
+        return coords[:1].tolist()
+
+    keep = numpy.zeros(len(coords), dtype = bool)
+    keep[:far + 1] = douglas_peucker(points[:far + 1], tolerance)
+    # the second half runs back round to the first vertex
+    keep[far:] |= douglas_peucker(numpy.concatenate((points[far:], points[:1])), tolerance)[:-1]
+    if (coords[0] == coords[-1]).all():
+        keep[-1] = True
+
+    if keep.sum() < 3:
+        # a sliver, keep its widest point so it is still a polygon
+        distances = line_distances(points, points[0], points[far])
+        keep[int(numpy.argmax(distances))] = True
+    return coords[keep].tolist()
+
+def simplify_line(coords, tolerance):
+    """Simplifies an open line, e.g. a mower's track, keeping its first and last vertices.
+
+    Arguments:
+        coords (list): A list of ``(x, y, z)`` coordinates, or an ``(n, 3)`` array
+        tolerance (float): The furthest any removed vertex may be from the simplified line, in metres
+
+    Returns:
+        numpy.ndarray: A boolean mask of the vertices to keep
+    """
+    coords = numpy.asarray(coords, dtype = float).reshape(-1, 3)
+    if len(coords) <= 2 or tolerance <= 0:
+        return numpy.ones(len(coords), dtype = bool)
+    return douglas_peucker(project(coords), tolerance)
+
+def simplify_area(area: models.Area, tolerance):
+    """Simplifies an area's boundary and no-go zones.
+
+    Arguments:
+        area (models.Area): An area
+        tolerance (float): The furthest any removed vertex may be from the simplified polygons, in metres
+
+    Returns:
+        models.Area: A new, simplified area
+    """
+    return models.Area(
+        area.owner, area.name, area.notes,
+        simplify_ring(area.area_coords, tolerance),
+        [simplify_ring(nogo_zone, tolerance) for nogo_zone in area.nogo_zones],
+        area.id_
+    )
+
+def copy_area(area, owner):
+    # cached areas are shared between users' requests, so each gets a copy with its own owner
+    return area.copy(owner)
+
+class SimplificationCache:
+    """Thread-safe, in-process LRU cache of simplified areas, per area and tolerance bucket (see
+    :func:`tolerance_bucket`). Example usage:
+
+    .. code-block:: python
+
+        cache = simplify.SimplificationCache(maxsize = 1000)
+        with database.MowerDatabase() as db:
+            version, _ = db.get_area_version(user)
+            areas = [cache.simplify(area, 5.0, version) for area in db.get_areas(user)]
+
+    Entries are keyed on the owner and their area version (see :meth:`database.MowerDatabase.get_area_version`)
+    as well as the area, so changing any of a user's areas means none of their old simplified areas
+    are used again, and they soon fall out of the cache. Versions are per user, so the owner is
+    part of the key too: a user asking for someone else's area id never gets the other's area.
+
+    Arguments:
+        maxsize (int): The maximum number of cached simplified areas, the least recently used is dropped first
+    """
+    def __init__(self, maxsize = 1000):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+
+        self.__lock = threading.Lock()
+        # (owner user number, area id, area version, tolerance bucket) -> simplified area
+        self.__entries = collections.OrderedDict()
+
+    def get(self, area_id, version, tolerance, owner):
+        """Look up a simplified area without needing the original, e.g. to avoid loading it at all.
+        Only the owner's own areas are found, so it is safe to call before checking who owns ``area_id``.
+
+        Arguments:
+            area_id (int): The area's id
+            version (int): The owner's area version
+            tolerance (float): The tolerance, in metres
+            owner (models.User): The user asking, who must own the area
+
+        Returns:
+            models.Area: The simplified area, or ``None`` if it isn't cached or isn't the owner's
+        """
+        simplified = self.__lookup((owner.id_, area_id, version, tolerance_bucket(tolerance)))
+        return None if simplified is None else copy_area(simplified, owner)
+
+    def simplify(self, area: models.Area, tolerance, version):
+        """Simplify an area, or get it from the cache if it has been simplified before. Areas
+        without an ``id_`` aren't cached.
+
+        Arguments:
+            area (models.Area): An area from the database
+            tolerance (float): The tolerance, in metres
+            version (int): The owner's area version
+
+        Returns:
+            models.Area: The simplified area. Its coordinates are shared with the cached one, and read-only
+        """
+        bucket = tolerance_bucket(tolerance)
+        if bucket == 0:
+            return area
+        if area.id_ is None:
+            return simplify_area(area, bucket)
+
+        key = (None if area.owner is None else area.owner.id_, area.id_, version, bucket)
+        simplified = self.__lookup(key)
+        if simplified is None:
+            simplified = simplify_area(area, bucket)
+            with self.__lock:
+                self.__entries[key] = simplified
+                self.__entries.move_to_end(key)
+                while len(self.__entries) > self.maxsize:
+                    self.__entries.popitem(last = False)
+        return copy_area(simplified, area.owner)
+
+    def __lookup(self, key):
+        with self.__lock:
+            simplified = self.__entries.get(key)
+            if simplified is None:
+                self.misses += 1
+                return None
+            self.__entries.move_to_end(key)
+            self.hits += 1
+            return simplified
+
+    def stats(self):
+        """Returns the hit and miss counters, so we can check the cache is working.
+
+        Returns:
+            dict: JSON-serializable dictionary
+        """
+        with self.__lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else None,
+                "size": len(self.__entries),
+                "maxsize": self.maxsize
+            }
@@ -0,0 +1,420 @@
+"""In-memory spatial indexes of users' areas, for classifying lots of points at once as inside an
+area, inside one of its no-go zones, or outside everything, on the horizontal ``(x, z)`` plane.
+
+Points are first looked up in an R-tree of the areas' bounding boxes (see :class:`BoxTree`), then
+only the points inside an area's bounding box are tested against its polygon, and only the
+points inside the area are looked up in a tree of its no-go zones' bounding boxes and tested
+against those zones. Point in polygon tests count edge crossings (even-odd rule) for many
+points and many edges at a time with NumPy.
+"""
+import collections
+import threading
+import models
+import numpy
+
+# the most point-edge pairs tested at once, bounds the memory a big polygon needs
+CROSSING_CHUNK = 1 << 20
+# rings are split into about one horizontal band per this many edges
+EDGES_PER_BAND = 16
+MAX_BANDS = 4096
+# the most children of a BoxTree node
+NODE_SIZE = 16
+
+class Ring:
+    """A polygon ring, prepared for fast point in polygon tests. Its edges are split into
+    horizontal bands by ``z``, so a point is only tested against the edges in its band,
+    rather than every edge of the ring.
+
+    Arguments:
+        coords (list): A list of ``(x, y, z)`` coordinates, or an ``(n, 3)`` array
+    """
+    def __init__(self, coords):
+        coords = numpy.asarray(coords, dtype = float).reshape(-1, 3)
+        self.size = len(coords)
+        if self.size < 3:
+            self.bbox = (numpy.inf, numpy.inf, -numpy.inf, -numpy.inf)
+            return
+
+        # each edge runs from vertex i to vertex i + 1, and the last back to the first
+        x1, z1 = coords[:, 0], coords[:, 2]
+        x2, z2 = numpy.roll(x1, -1), numpy.roll(z1, -1)
+        self.bbox = (float(x1.min()), float(z1.min()), float(x1.max()), float(z1.max()))
+        # horizontal edges are never crossed, so their slope doesn't matter
+        slope = numpy.divide(x2 - x1, z2 - z1, out = numpy.zeros(self.size), where = z2 != z1)
+
+        self.__bands = max(1, min(self.size // EDGES_PER_BAND, MAX_BANDS))
+        self.__band_height = (self.bbox[3] - self.bbox[1]) / self.__bands or 1.0
+        low = self.__band(numpy.minimum(z1, z2))
+        high = self.__band(numpy.maximum(z1, z2))
+        # every (band, edge) pair, sorted by band, with where each band starts
+        counts = high - low + 1
+        edges = numpy.repeat(numpy.arange(self.size), counts)
+        bands = numpy.repeat(low, counts) + (numpy.arange(len(edges)) - numpy.repeat(numpy.cumsum(counts) - counts, counts))
+        order = numpy.argsort(bands, kind = "stable")
+        edges = edges[order]
+        self.__starts = numpy.concatenate(([0], numpy.cumsum(numpy.bincount(bands, minlength = self.__bands))))
+        self.__x1, self.__z1, self.__z2, self.__slope = x1[edges], z1[edges], z2[edges], slope[edges]
+
+    def __band(self, z):
+        return numpy.clip(((z - self.bbox[1]) / self.__band_height).astype(numpy.int64), 0, self.__bands - 1)
+
+    def contains_point(self, x, z):
+        """Tests if a single point is inside the ring. Much quicker than :meth:`contains`
+        for one point, as it only looks at the edges in the point's band.
+
+        Arguments:
+            x (float): The point's x coordinate
+            z (float): The point's z coordinate
+
+        Returns:
+            bool: ``True`` if the point is inside the ring
+        """
+        min_x, min_z, max_x, max_z = self.bbox
+        if not (min_x <= x <= max_x and min_z <= z <= max_z):
+            return False
+        band = min(int((z - min_z) / self.__band_height), self.__bands - 1)
+        edges = slice(self.__starts[band], self.__starts[band + 1])
+        z1, z2 = self.__z1[edges], self.__z2[edges]
+        crossings = ((z1 > z) != (z2 > z)) & (x < self.__x1[edges] + (z - z1) * self.__slope[edges])
+        return bool(numpy.count_nonzero(crossings) % 2)
+
+    def contains(self, px, pz):
+        """Tests which points are inside the ring.
+
+        Arguments:
+            px (numpy.ndarray): The points' x coordinates
+            pz (numpy.ndarray): The points' z coordinates
+
+        Returns:
+            numpy.ndarray: A boolean array, ``True`` for points inside the ring
+        """
+        inside = numpy.zeros(len(px), dtype = bool)
+        if self.size < 3:
+            return inside
+
+        min_x, min_z, max_x, max_z = self.bbox
+        candidates = numpy.flatnonzero((px >= min_x) & (px <= max_x) & (pz >= min_z) & (pz <= max_z))
+        if len(candidates) == 0:
+            return inside
+
+        # group the points by band, and test each group against its band's edges
+        bands = self.__band(pz[candidates])
+        order = numpy.argsort(bands, kind = "stable")
+        candidates, bands = candidates[order], bands[order]
+        splits = numpy.flatnonzero(numpy.diff(bands)) + 1
+        for band, group in zip(bands[numpy.concatenate(([0], splits))], numpy.split(candidates, splits)):
+            edges = slice(self.__starts[band], self.__starts[band + 1])
+            x1, z1, z2, slope = self.__x1[edges], self.__z1[edges], self.__z2[edges], self.__slope[edges]
+            step = max(1, CROSSING_CHUNK // max(1, len(x1)))
+            for i in range(0, len(group), step):
+                chunk = group[i:i + step]
+                x, z = px[chunk, None], pz[chunk, None]
+                crossings = ((z1 > z) != (z2 > z)) & (x < x1 + (z - z1) * slope)
+                inside[chunk] = numpy.count_nonzero(crossings, axis = 1) % 2 == 1
+        return inside
+
+class BoxTree:
+    """A static R-tree of bounding boxes on the horizontal plane, packed with the Sort-Tile-Recursive
+    algorithm, for finding which boxes each of many points is in. Looking up ``P`` points among
+    ``B`` boxes takes about ``O(P log B)`` plus the number of matches, rather than the ``O(P·B)``
+    of testing every point against every box. The tree is searched a level at a time for all the
+    points at once, with NumPy. It can't be changed once it is built, so build another instead.
+
+    Arguments:
+        bboxes (numpy.ndarray): An ``(n, 4)`` array of ``(min_x, min_z, max_x, max_z)`` boxes
+        node_size (int): The most children of a node
+    """
+    def __init__(self, bboxes, node_size = NODE_SIZE):
+        bboxes = numpy.asarray(bboxes, dtype = float).reshape(-1, 4)
+        self.size = len(bboxes)
+        # which box each leaf entry is
+        self.__order = str_order(bboxes, node_size)
+        # from the leaves up, each level's boxes, and the range of entries in the level below
+        # which are each entry's children
+        self.__levels = [(bboxes[self.__order], None, None)]
+        while len(self.__levels[-1][0]) > node_size:
+            below = self.__levels[-1][0]
+            lo = numpy.arange(0, len(below), node_size)
+            hi = numpy.minimum(lo + node_size, len(below))
+            boxes = numpy.column_stack((
+                numpy.minimum.reduceat(below[:, 0], lo), numpy.minimum.reduceat(below[:, 1], lo),
+                numpy.maximum.reduceat(below[:, 2], lo), numpy.maximum.reduceat(below[:, 3], lo)
+            ))
+            order = str_order(boxes, node_size)
+            self.__levels.append((boxes[order], lo[order], hi[order]))
+
+    def __len__(self):
+        return self.size
+
+    def query(self, px, pz):
+        """Finds which boxes each point is in.
+
+        Arguments:
+            px (numpy.ndarray): The points' x coordinates
+            pz (numpy.ndarray): The points' z coordinates
+
+        Returns:
+            (numpy.ndarray, numpy.ndarray): The index of the point and of the box of every match, sorted by box then point
+        """
+        level = len(self.__levels) - 1
+        # every point against the top level at once, giving pairs in order of point
+        boxes = self.__levels[level][0]
+        points, entries = numpy.nonzero(
+            (px[:, None] >= boxes[:, 0]) & (pz[:, None] >= boxes[:, 1]) & (px[:, None] <= boxes[:, 2]) & (pz[:, None] <= boxes[:, 3])
+        )
+        while level > 0:
+            # every (point, child) pair of the entries the points are in, still in order of point
+            _, lo, hi = self.__levels[level]
+            counts = hi[entries] - lo[entries]
+            points = numpy.repeat(points, counts)
+            entries = numpy.repeat(lo[entries], counts) + (numpy.arange(counts.sum()) - numpy.repeat(numpy.cumsum(counts) - counts, counts))
+            level -= 1
+
+            boxes = self.__levels[level][0]
+            x, z = px[points], pz[points]
+            keep = (x >= boxes[entries, 0]) & (z >= boxes[entries, 1]) & (x <= boxes[entries, 2]) & (z <= boxes[entries, 3])
+            points, entries = points[keep], entries[keep]
+
+        found = self.__order[entries]
+        order = numpy.argsort(found, kind = "stable")
+        return points[order], found[order]
+
+class AreaIndex:
+    """A spatial index of one user's areas and their no-go zones. Areas can be added to it
+    while other threads are classifying points with it. Example usage:
+
+    .. code-block:: python
+
+        index = spatial.AreaIndex(db.get_areas(user))
+        area_ids, in_nogo = index.classify([(52.6192, 24.0, 1.2393), (52.6195, 24.0, 1.2393)])
+
+    Arguments:
+        areas (list): :class:`models.Area` s to start with, with ``id_`` s set
+    """
+    def __init__(self, areas = ()):
+        self.__lock = threading.Lock()
+        # the areas and a tree of their bounding boxes, replaced together, never changed, so
+        # that classify can read them without the lock
+        self.__state = self.__build([self.__entry(area) for area in areas])
+
+    def __len__(self):
+        return len(self.__state[0])
+
+    def add(self, area: models.Area):
+        """Adds an area to the index. The tree of bounding boxes is built again, which takes
+        ``O(A log A)`` for ``A`` areas.
+
+        Arguments:
+            area (models.Area): An area, with its ``id_`` set
+        """
+        entry = self.__entry(area)
+        with self.__lock:
+            self.__state = self.__build(self.__state[0] + [entry])
+
+    @staticmethod
+    def __entry(area):
+        nogo_zones = [Ring(nogo_zone) for nogo_zone in area.nogo_zones]
+        # a tree of one node would only be a slower way of checking every zone's bounding box
+        nogo_tree = BoxTree([zone.bbox for zone in nogo_zones]) if len(nogo_zones) > NODE_SIZE else None
+        return area.id_, Ring(area.area_coords), nogo_zones, nogo_tree
+
+    @staticmethod
+    def __build(areas):
+        return areas, BoxTree([boundary.bbox for _, boundary, _, _ in areas])
+
+    def classify(self, points, area_id = None):
+        """Finds which area each point is in, and whether it is in one of that area's no-go zones.
+        Where areas overlap, a point is counted as in the one added first.
+
+        Arguments:
+            points (list): ``(x, y, z)`` coordinates, or an ``(n, 3)`` array
+            area_id (int): Only check this area, rather than all of them
+
+        Returns:
+            (list, list): For each point, the ``id_`` of the area it is in or ``None``, and whether it is in a no-go zone
+        """
+        areas, tree = self.__state
+        points = numpy.asarray(points, dtype = float).reshape(-1, 3)
+        px, pz = points[:, 0], points[:, 2]
+
+        found = numpy.full(len(points), -1, dtype = numpy.int64)
+        in_nogo = numpy.zeros(len(points), dtype = bool)
+        if area_id is not None:
+            # the area's own bounding box check is enough for one area
+            candidates = [(i, numpy.arange(len(points))) for i, entry in enumerate(areas) if entry[0] == area_id]
+        else:
+            # in the order the areas were added, as the first one a point is in wins
+            point_ids, area_indexes = tree.query(px, pz)
+            candidates = group_sorted(area_indexes, point_ids)
+
+        for i, points_in_bbox in candidates:
+            id_, boundary, nogo_zones, nogo_tree = areas[i]
+            points_in_bbox = points_in_bbox[found[points_in_bbox] == -1]
+            if len(points_in_bbox) == 0:
+                continue
+
+            inside = points_in_bbox[boundary.contains(px[points_in_bbox], pz[points_in_bbox])]
+            found[inside] = id_
+            if len(inside) == 0 or not nogo_zones:
+                continue
+            if nogo_tree is None:
+                # few enough that the zones' own bounding box checks are quicker
+                for nogo_zone in nogo_zones:
+                    in_nogo[inside] |= nogo_zone.contains(px[inside], pz[inside])
+                continue
+            point_ids, zone_indexes = nogo_tree.query(px[inside], pz[inside])
+            for zone, in_zone_bbox in group_sorted(zone_indexes, inside[point_ids]):
+                in_nogo[in_zone_bbox] |= nogo_zones[zone].contains(px[in_zone_bbox], pz[in_zone_bbox])
+
+        return [None if i == -1 else int(i) for i in found], in_nogo.tolist()
+
+def str_order(bboxes, node_size):
+    """The Sort-Tile-Recursive order of boxes, for packing them into the nodes of a :class:`BoxTree`:
+    sorted by the x of their centres into about ``sqrt(n / node_size)`` vertical slices, then each
+    slice by the z of their centres, so consecutive runs of ``node_size`` boxes are close together.
+
+    Arguments:
+        bboxes (numpy.ndarray): An ``(n, 4)`` array of ``(min_x, min_z, max_x, max_z)`` boxes
+        node_size (int): The most children of a node
+
+    Returns:
+        numpy.ndarray: The indexes of the boxes, in order
+    """
+    count = len(bboxes)
+    slices = max(1, int(numpy.ceil(numpy.sqrt(-(-count // node_size)))))
+    # empty rings have infinite boxes, with no centre
+    with numpy.errstate(invalid = "ignore"):
+        cx = (bboxes[:, 0] + bboxes[:, 2]) / 2
+        cz = (bboxes[:, 1] + bboxes[:, 3]) / 2
+    slice_of = numpy.empty(count, dtype = numpy.int64)
+    slice_of[numpy.argsort(cx, kind = "stable")] = numpy.arange(count) // (slices * node_size)
+    return numpy.lexsort((cz, slice_of))
+
+def group_sorted(keys, values):
+    # (key, values) for each run of equal keys, which must be sorted
+    if len(keys) == 0:
+        return []
+    splits = numpy.flatnonzero(numpy.diff(keys)) + 1
+    return zip(keys[numpy.concatenate(([0], splits))].tolist(), numpy.split(values, splits))
+
+class AreaIndexCache:
+    """Thread-safe, in-process LRU cache of :class:`AreaIndex` es, one per user. Example usage:
+
+    .. code-block:: python
+
+        indexes = spatial.AreaIndexCache(maxsize = 100)
+        with database.MowerDatabase() as db:
+            version, _ = db.get_area_version(user)
+            index = indexes.get(user, version, lambda: db.get_areas(user))
+
+            version = db.create_area(area)
+        indexes.add_area(area, version)
+
+    Each index is kept with the owner's area version (see :meth:`database.MowerDatabase.get_area_version`)
+    it is up to date with. :meth:`add_area` adds a new area to the index in place, rather than
+    building it again; if areas were added some other way, e.g. by another process, the version
+    won't match and the index is built again from the database.
+
+    Arguments:
+        maxsize (int): The maximum number of users to keep indexes for, the least recently used is dropped first
+    """
+    def __init__(self, maxsize = 100):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+
+        self.__lock = threading.Lock()
+        # user number -> (area version, index)
+        self.__entries = collections.OrderedDict()
+
+    def get(self, user: models.User, version, load_areas):
+        """Get a user's index, building it if it isn't cached or is out of date.
+
+        Arguments:
+            user (models.User): The user
+            version (int): The user's current area version
+            load_areas (callable): Returns all the user's :class:`models.Area` s, if the index needs building
+
+        Returns:
+            AreaIndex: The user's index
+        """
+        index = self.lookup(user, version)
+        if index is None:
+            index = self.build(user, version, load_areas())
+        return index
+
+    def lookup(self, user: models.User, version):
+        """Get a user's index if it is cached and up to date, e.g. to fetch the areas for
+        :meth:`build` asynchronously if it isn't.
+
+        Arguments:
+            user (models.User): The user
+            version (int): The user's current area version
+
+        Returns:
+            AreaIndex: The user's index, or ``None``
+        """
+        with self.__lock:
+            entry = self.__entries.get(user.id_)
+            if entry is not None and entry[0] == version:
+                self.__entries.move_to_end(user.id_)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            return None
+
+    def build(self, user: models.User, version, areas):
+        """Build and cache a user's index.
+
+        Arguments:
+            user (models.User): The user
+            version (int): The user's area version when the areas were read
+            areas (list): All the user's :class:`models.Area` s
+
+        Returns:
+            AreaIndex: The user's index
+        """
+        index = AreaIndex(areas)
+        with self.__lock:
+            # don't replace a newer index built meanwhile
+            entry = self.__entries.get(user.id_)
+            if entry is None or entry[0] <= version:
+                self.__entries[user.id_] = (version, index)
+                self.__entries.move_to_end(user.id_)
+            while len(self.__entries) > self.maxsize:
+                self.__entries.popitem(last = False)
+        return index
+
+    def add_area(self, area: models.Area, version):
+        """Update the owner's index, if it is cached, with an area that has just been added.
+
+        Arguments:
+            area (models.Area): The new area, with its ``id_`` and ``owner`` set
+            version (int): The owner's area version after adding it, from :meth:`database.MowerDatabase.create_area`
+        """
+        with self.__lock:
+            entry = self.__entries.get(area.owner.id_)
+            if entry is None:
+                return
+            if entry[0] != version - 1:
+                # missed a change, so the index will have to be built again
+                del self.__entries[area.owner.id_]
+                return
+            entry[1].add(area)
+            self.__entries[area.owner.id_] = (version, entry[1])
+
+    def stats(self):
+        """Returns the hit and miss counters, so we can check the cache is working.
+
+        Returns:
+            dict: JSON-serializable dictionary
+        """
+        with self.__lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else None,
+                "size": len(self.__entries),
+                "maxsize": self.maxsize
+            }
@@ -0,0 +1,95 @@
+"""Downsampling of mowers' telemetry tracks, so that a window of any length comes back as a
+bounded number of points. The window is split into equal time buckets and only the first fix in
+each is kept, which the database does itself (see :meth:`database.MowerDatabase.iter_telemetry`),
+so a day of several fixes a second never leaves the database. Optionally, the bucketed track can then
+be simplified with the Douglas-Peucker algorithm (see :func:`simplify.simplify_line`), which keeps
+the fixes where the mower turns and drops the ones along straight runs.
+"""
+import datetime
+import simplify
+import math
+
+# the most points a track can be downsampled to
+MAX_POINTS = 10000
+DEFAULT_POINTS = 2000
+# the window fetched if no start is given
+DEFAULT_WINDOW = datetime.timedelta(days = 1)
+
+def parse_time(value):
+    """Parses an ISO 8601 time, e.g. ``2023-03-14T09:30:00`` or ``2023-03-14T09:30:00+00:00``.
+
+    Arguments:
+        value (str): The time. Times without a timezone are taken to be in the server's local time, like the database
+
+    Returns:
+        datetime.datetime: A naive datetime, in the server's local time
+    """
+    try:
+        parsed = datetime.datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise ValueError("Times must be ISO 8601, e.g. 2023-03-14T09:30:00")
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone().replace(tzinfo = None)
+    return parsed
+
+def parse_window(get):
+    """Parses the ``start``, ``end`` and ``max_points`` query parameters of a track request.
+
+    Arguments:
+        get (callable): A function like ``dict.get`` for the query parameters
+
+    Returns:
+        (datetime.datetime, datetime.datetime, int): The start and end of the window, and the most points to return
+    """
+    end = datetime.datetime.now() if get("end") is None else parse_time(get("end"))
+    start = end - DEFAULT_WINDOW if get("start") is None else parse_time(get("start"))
+    if start >= end:
+        raise ValueError("start must be before end")
+    max_points = int(get("max_points", DEFAULT_POINTS))
+    if max_points < 2 or max_points > MAX_POINTS:
+        raise ValueError("max_points must be between 2 and %d" % MAX_POINTS)
+    return start, end, max_points
+
+def bucket_seconds(start, end, max_points):
+    """The length of bucket which splits a window into at most ``max_points`` buckets. Buckets
+    are whole milliseconds, like fixes' times, and aligned to the unix epoch, so the window may
+    touch one more bucket than it spans.
+
+    Arguments:
+        start (datetime.datetime): The start of the window
+        end (datetime.datetime): The end of the window
+        max_points (int): The most points to return, at least 2
+
+    Returns:
+        float: The bucket length, in seconds
+    """
+    return max(1, math.ceil((end - start) / datetime.timedelta(milliseconds = 1) / (max_points - 1))) / 1000
+
+def serialize_fix(recv_at, x, y, z):
+    """A fix as it is sent to clients.
+
+    Arguments:
+        recv_at (datetime.datetime): When the fix was received, in the server's local time
+        x (float): x coordinate
+        y (float): y coordinate
+        z (float): z coordinate
+
+    Returns:
+        list: ``[unix time, x, y, z]``
+    """
+    return [recv_at.timestamp(), x, y, z]
+
+def decimate(fixes, tolerance):
+    """Simplifies a track, keeping its shape to within a tolerance.
+
+    Arguments:
+        fixes (list): ``(recv_at, x, y, z)`` tuples, oldest first
+        tolerance (float): The furthest any removed fix may be from the simplified track, in metres
+
+    Returns:
+        list: The fixes kept
+    """
+    if tolerance <= 0 or len(fixes) <= 2:
+        return fixes
+    keep = simplify.simplify_line([fix[1:] for fix in fixes], tolerance)
+    return [fix for fix, kept in zip(fixes, keep) if kept]
@@ -0,0 +1,225 @@
+"""Content negotiation and encoding of areas on the wire, for :func:`app.getareas` and :func:`app.addarea`.
+
+JSON is the default. Clients which send ``Accept: application/msgpack`` (or ``Content-Type: application/msgpack``
+when adding an area) get MessagePack instead, with each polygon and no-go ring as a single MessagePack ``bin`` of
+packed little-endian ``float64`` ``(x, y, z)`` triples, the same layout as :func:`geometry.pack_coords`. This is
+24 bytes a vertex, rather than the ~60 bytes of decimal text JSON needs, and encoding and decoding it doesn't
+format or parse any floats. For example, an area in MessagePack is:
+
+.. code-block:: python
+
+    {
+        "id_": 12,
+        "name": "Besides the lake",
+        "notes": "Besides the lake, avoiding the trees, left of the pond",
+        "area_coords": geometry.pack_coords(area_coords),
+        "nogo_zones": [geometry.pack_coords(nogo_zone) for nogo_zone in nogo_zones]
+    }
+
+Either format can also be compressed with ``gzip`` or ``deflate``, as negotiated with ``Accept-Encoding`` for
+responses and given by ``Content-Encoding`` for requests.
+"""
+import geometry
+import msgpack
+import json
+import zlib
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+MEDIA_TYPES = (JSON, MSGPACK)
+
+ENCODINGS = ("gzip", "deflate", "identity")
+# smaller responses fit in a packet or two anyway, so aren't worth the CPU
+MIN_COMPRESS_SIZE = 1024
+COMPRESS_LEVEL = 6
+# the most a compressed request body may expand to, so a tiny body can't use up all our memory
+MAX_DECOMPRESSED_SIZE = 64 * 1024 * 1024
+
+def negotiate(header, offers):
+    """Picks what to send from an ``Accept`` or ``Accept-Encoding`` header, preferring
+    earlier offers when the client likes several equally.
+
+    Arguments:
+        header (str): The header value, or ``None`` if it wasn't sent
+        offers (list): Media types or content codings which can be sent, most preferred first
+
+    Returns:
+        str: One of ``offers``, or ``None`` if the client accepts none of them
+    """
+    if header is None or not header.strip():
+        return offers[0]
+
+    qualities = {}
+    for item in header.split(","):
+        value, *params = [i.strip() for i in item.split(";")]
+        q = 1.0
+        for param in params:
+            name, _, arg = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(arg)
+                except ValueError:
+                    q = 0.0
+        qualities[value.lower()] = q
+
+    def quality(offer):
+        if offer in qualities:
+            return qualities[offer]
+        if "/" in offer and offer.split("/")[0] + "/*" in qualities:
+            return qualities[offer.split("/")[0] + "/*"]
+        if "*/*" in qualities:
+            return qualities["*/*"]
+        if "*" in qualities:
+            return qualities["*"]
+        # identity is acceptable unless it is refused outright
+        return 1.0 if offer == "identity" else 0.0
+
+    best = max(offers, key = lambda offer: (quality(offer), -offers.index(offer)))
+    return best if quality(best) > 0 else None
+
+def negotiate_encoding(header):
+    """Picks a content coding from an ``Accept-Encoding`` header. Clients which don't send
+    one get ``identity``, as they may not be able to decompress anything.
+
+    Arguments:
+        header (str): The header value, or ``None`` if it wasn't sent
+
+    Returns:
+        str: One of :data:`ENCODINGS`
+    """
+    if header is None:
+        return "identity"
+    return negotiate(header, ENCODINGS) or "identity"
+
+def encode_areas(areas, media_type = JSON):
+    """Encodes a list of areas as the body of a :func:`app.getareas` response.
+
+    Arguments:
+        areas (list): :class:`models.Area` s
+        media_type (str): One of :data:`MEDIA_TYPES`
+
+    Returns:
+        bytes: The encoded body
+    """
+    if media_type == MSGPACK:
+        return msgpack.packb({"areas": [msgpack_area(area) for area in areas]})
+    return json.dumps({"areas": [area.serialize() for area in areas]}).encode()
+
+def encode_area(area, media_type = JSON):
+    """Encodes one area as the body of a :func:`app.getarea` response.
+
+    Arguments:
+        area (models.Area): An area
+        media_type (str): One of :data:`MEDIA_TYPES`
+
+    Returns:
+        bytes: The encoded body
+    """
+    if media_type == MSGPACK:
+        return msgpack.packb(msgpack_area(area))
+    return json.dumps(area.serialize()).encode()
+
+def msgpack_area(area):
+    # the coordinate arrays' buffers are copied out as they are, see geometry.pack_coords
+    out = area.serialize_arrays()
+    out["area_coords"] = geometry.pack_coords(out["area_coords"])
+    out["nogo_zones"] = [geometry.pack_coords(nogo_zone) for nogo_zone in out["nogo_zones"]]
+    return out
+
+def decode_area(body, media_type = JSON):
+    """Decodes the body of a :func:`app.addarea` request into a dictionary for :func:`models.deserialize`.
+
+    Arguments:
+        body (bytes): The request body, already decompressed
+        media_type (str): One of :data:`MEDIA_TYPES`
+
+    Raises:
+        ValueError: If the body isn't a valid area
+
+    Returns:
+        dict: The area, with coordinates as lists of ``[x, y, z]`` lists, or for MessagePack as views from :func:`geometry.unpack_coords`
+    """
+    if media_type != MSGPACK:
+        return json.loads(body)
+
+    try:
+        area = msgpack.unpackb(body)
+    except Exception as e:
+        raise ValueError("Invalid MessagePack: %s" % e)
+    if not isinstance(area, dict):
+        raise ValueError("The area must be a map")
+    if isinstance(area.get("area_coords"), bytes):
+        area["area_coords"] = geometry.unpack_coords(area["area_coords"])
+    if isinstance(area.get("nogo_zones"), list):
+        area["nogo_zones"] = [
+            geometry.unpack_coords(ring) if isinstance(ring, bytes) else ring for ring in area["nogo_zones"]
+        ]
+    return area
+
+def compressor(encoding):
+    """Returns a ``zlib`` compressor for a content coding, or ``None`` for ``identity``."""
+    if encoding == "gzip":
+        return zlib.compressobj(COMPRESS_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    if encoding == "deflate":
+        return zlib.compressobj(COMPRESS_LEVEL, zlib.DEFLATED, zlib.MAX_WBITS)
+    return None
+
+def compress(body, encoding):
+    """Compresses a response body.
+
+    Arguments:
+        body (bytes): The body
+        encoding (str): One of :data:`ENCODINGS`
+
+    Returns:
+        bytes: The compressed body
+    """
+    c = compressor(encoding)
+    return body if c is None else c.compress(body) + c.flush()
+
+def compress_iter(chunks, encoding):
+    """Compresses a streamed response body, flushing after each chunk so the client
+    can still decode each one as it arrives.
+
+    Arguments:
+        chunks (iterable): ``str`` or ``bytes`` chunks of the body
+        encoding (str): One of :data:`ENCODINGS`
+
+    Yields:
+        bytes: Compressed chunks
+    """
+    c = compressor(encoding)
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode()
+        yield chunk if c is None else c.compress(chunk) + c.flush(zlib.Z_SYNC_FLUSH)
+    if c is not None:
+        yield c.flush()
+
+def decompress(body, encoding):
+    """Decompresses a request body.
+
+    Arguments:
+        body (bytes): The body
+        encoding (str): The ``Content-Encoding`` header, or ``None``
+
+    Raises:
+        ValueError: If the encoding isn't supported, or the body is corrupt or too big
+
+    Returns:
+        bytes: The decompressed body
+    """
+    encoding = (encoding or "identity").strip().lower()
+    if encoding not in ENCODINGS:
+        raise ValueError("Unsupported Content-Encoding '%s'" % encoding)
+    if encoding == "identity":
+        return body
+    # 32 + MAX_WBITS detects gzip or zlib headers
+    d = zlib.decompressobj(32 + zlib.MAX_WBITS)
+    try:
+        out = d.decompress(body, MAX_DECOMPRESSED_SIZE)
+    except zlib.error as e:
+        raise ValueError("Invalid %s body: %s" % (encoding, e))
+    if d.unconsumed_tail:
+        raise ValueError("The body is bigger than %d bytes decompressed" % MAX_DECOMPRESSED_SIZE)
+    return out